@@ -0,0 +1,213 @@
+"""
+Runner for the asv style benchmark suite (the suite_*.py modules in this directory) that does not need asv.
+
+Every time_* method of every benchmark class is run for each combination of its params, timed as the best of a
+few repeats (the code returned by the timeraw_* methods is timed in a fresh interpreter each time, like asv
+does), and the results are stored as JSON in benchmarks/results along with the commit and the versions they
+were measured with. Each run is compared against the previous stored run (or the file given with --compare), and
+any benchmark that got slower by more than the threshold is reported as a regression, with an exit status of 1.
+
+Run with
+    python benchmarks/run_suite.py [-b REGEX] [--quick] [--max-points N] [--compare FILE] [--threshold 0.2]
+from the repository root with dpg11_pylib installed or on the PYTHONPATH. With asv installed, asv run uses the
+same suite through asv.conf.json.
+"""
+import argparse
+import datetime
+import glob
+import importlib.util
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Directory of the suite and of the stored results
+SUITE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIRECTORY = os.path.dirname(SUITE_DIRECTORY)
+RESULTS_DIRECTORY = os.path.join(SUITE_DIRECTORY, 'results')
+# Each timing sample runs the benchmark enough times to take at least this long
+MIN_SAMPLE_TIME = 0.01
+# Number of timing samples of each benchmark, and the time after which no more samples are taken
+NUM_REPEATS = 5
+MAX_BENCHMARK_TIME = 10.0
+
+
+def load_suite():
+    # Import every suite_*.py module of the directory
+    modules = []
+    for path in sorted(glob.glob(os.path.join(SUITE_DIRECTORY, 'suite_*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered like a normal import, so the process pool of a benchmark can pickle its functions
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        modules.append(module)
+    return modules
+
+
+def param_combinations(benchmark_class):
+    # asv params are a single list of values, or a list of lists for several parameters
+    params = getattr(benchmark_class, 'params', [])
+    if not params:
+        return [()]
+    if all(isinstance(values, list) for values in params):
+        return list(itertools.product(*params))
+    return [(value,) for value in params]
+
+
+def iter_benchmarks(modules):
+    # Yield (name, class, method name, params) of every benchmark
+    for module in modules:
+        for class_name, benchmark_class in inspect.getmembers(module, inspect.isclass):
+            if benchmark_class.__module__ != module.__name__:
+                continue
+            methods = [name for name in dir(benchmark_class) if name.startswith(('time_', 'timeraw_'))]
+            for method_name in sorted(methods):
+                for params in param_combinations(benchmark_class):
+                    name = f'{module.__name__}.{class_name}.{method_name}'
+                    if params:
+                        name += '(' + ', '.join(repr(param) for param in params) + ')'
+                    yield name, benchmark_class, method_name, params
+
+
+def time_raw(code, quick=False):
+    # Best time in seconds of running the code in a fresh interpreter, leaving out the interpreter startup
+    timer = (f'import time\nstart = time.perf_counter()\nexec({code!r})\n'
+             f'print(repr(time.perf_counter() - start))')
+    samples = []
+    for _ in range(1 if quick else NUM_REPEATS):
+        result = subprocess.run([sys.executable, '-c', timer], cwd=REPOSITORY_DIRECTORY, capture_output=True,
+                                text=True, check=True)
+        samples.append(float(result.stdout.split()[-1]))
+    return min(samples)
+
+
+def time_benchmark(benchmark_class, method_name, params, quick=False):
+    # Best time per call in seconds, from NUM_REPEATS samples of enough calls to take MIN_SAMPLE_TIME each
+    benchmark = benchmark_class()
+    if hasattr(benchmark, 'setup'):
+        benchmark.setup(*params)
+    try:
+        method = getattr(benchmark, method_name)
+        if method_name.startswith('timeraw_'):
+            return time_raw(method(*params), quick=quick)
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                method(*params)
+            elapsed = time.perf_counter() - start
+            if quick or elapsed >= MIN_SAMPLE_TIME:
+                break
+            number *= 10
+        samples = [elapsed / number]
+        total = elapsed
+        while not quick and len(samples) < NUM_REPEATS and total < MAX_BENCHMARK_TIME:
+            start = time.perf_counter()
+            for _ in range(number):
+                method(*params)
+            elapsed = time.perf_counter() - start
+            samples.append(elapsed / number)
+            total += elapsed
+        return min(samples)
+    finally:
+        if hasattr(benchmark, 'teardown'):
+            benchmark.teardown(*params)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SUITE_DIRECTORY, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_time(seconds):
+    for unit, scale in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+        if seconds >= scale:
+            return f'{seconds / scale:.3f} {unit}'
+    return f'{seconds / 1e-9:.1f} ns'
+
+
+def latest_results():
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIRECTORY, '*.json')))
+    return paths[-1] if paths else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the dpg11_pylib benchmark suite and compare against a '
+                                                 'previous run.')
+    parser.add_argument('-b', '--bench', default=None, help='only run the benchmarks whose name matches this regex')
+    parser.add_argument('--quick', action='store_true', help='time every benchmark once, like asv --quick')
+    parser.add_argument('--max-points', type=int, default=None,
+                        help='skip the benchmarks with a num_points parameter over this')
+    parser.add_argument('--compare', default=None, help='results file to compare against, default is the last run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as a regression, default is 0.2')
+    parser.add_argument('--no-save', action='store_true', help='do not store the results')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, benchmark_class, method_name, params in iter_benchmarks(load_suite()):
+        if args.bench is not None and not re.search(args.bench, name):
+            continue
+        param_names = getattr(benchmark_class, 'param_names', [])
+        if args.max_points is not None and 'num_points' in param_names:
+            if params[param_names.index('num_points')] > args.max_points:
+                continue
+        results[name] = time_benchmark(benchmark_class, method_name, params, quick=args.quick)
+        print(f'{name:<72} {format_time(results[name]):>12}', flush=True)
+
+    run = {'commit': git_commit(),
+           'date': datetime.datetime.now().isoformat(timespec='seconds'),
+           'python': platform.python_version(),
+           'numpy': np.__version__,
+           'machine': platform.machine(),
+           'quick': args.quick,
+           'results': results}
+
+    compare_path = args.compare or latest_results()
+    previous = None
+    if compare_path is not None:
+        with open(compare_path) as f:
+            previous = json.load(f)
+    if not args.no_save:
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+        saved_path = os.path.join(RESULTS_DIRECTORY, f'{stamp}_{(run["commit"] or "unknown")[:8]}.json')
+        with open(saved_path, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'\nResults stored in {saved_path}')
+
+    if previous is None:
+        return 0
+    print(f'\nCompared against {compare_path} (commit {previous.get("commit")})')
+    regressions = 0
+    for name, seconds in results.items():
+        if name not in previous['results']:
+            continue
+        ratio = seconds / previous['results'][name]
+        if ratio > 1 + args.threshold:
+            regressions += 1
+            flag = 'REGRESSION'
+        elif ratio < 1 / (1 + args.threshold):
+            flag = 'faster'
+        else:
+            continue
+        print(f'{name:<72} {format_time(previous["results"][name]):>12} -> {format_time(seconds):>12} '
+              f'{ratio:>6.2f}x {flag}')
+    print(f'{regressions} regressions')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+asv style benchmarks of the DPG11Device encoders and of a whole reconfiguration, from the 64 sample minimum up to
+the 8e6 sample memory limit. The files are written into a temporary driver directory, and the benchmarks that
+send scripts hand them to a DAXGUIEmulator watching it.
+
+Run with
+    asv run
+from the repository root, or without asv with
+    python benchmarks/run_suite.py
+which stores the results in benchmarks/results and compares them against the previous run.
+"""
+import functools
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.emulator import DAXGUIEmulator
+from dpg11_pylib.driver.multi_card import CHANNELS_PER_CARD, MultiCardDevice
+from dpg11_pylib.driver.sweep import precompile_sweep
+from dpg11_pylib.driver.transport import MemoryTransport
+from dpg11_pylib.driver.validation import set_validation
+from dpg11_pylib.instrumentation.recorder import Recorder
+from dpg11_pylib.waveforms.waveforms import off_on_array
+
+# Waveform lengths of the suite, all modulo 64
+SIZES = [64, 65536, 1048576, 8000000]
+TIMEOUT = 600
+# Seconds to wait for the emulated GUI to consume a script
+SCRIPT_TIMEOUT = 60
+
+
+def build_wave_dict(pulse_samples, num_points):
+    # A pulse train with a clock and a trigger, like the cwodmr waveforms
+    samples = np.arange(num_points)
+    return {1: samples % (2 * pulse_samples) < pulse_samples,
+            3: samples % 2,
+            4: samples < 64}
+
+
+class DriverDirectory:
+    """
+    Temporary driver directory with a DPG11Device, for the benchmarks that write files.
+    """
+    timeout = TIMEOUT
+
+    def setup(self, *params):
+        self.directory = tempfile.mkdtemp()
+        open(os.path.join(self.directory, 'dax22000_GUI_64.exe'), 'w').close()
+        self.device = DPG11Device(self.directory)
+
+    def teardown(self, *params):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class EmulatedGUI(DriverDirectory):
+    """
+    Temporary driver directory watched by a DAXGUIEmulator, for the benchmarks that send scripts.
+    """
+
+    def setup(self, *params):
+        super().setup(*params)
+        self.gui = DAXGUIEmulator(self.directory)
+        self.gui.start()
+
+    def teardown(self, *params):
+        self.gui.stop()
+        super().teardown(*params)
+
+
+class TimeCreateDecimalArray(DriverDirectory):
+    """
+    create_decimal_array of a random stack of 11 bits per sample.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.stack_arr = np.random.default_rng(0).integers(0, 2, (num_points, 11))
+
+    def time_create_decimal_array(self, num_points):
+        self.device.create_decimal_array(self.stack_arr)
+
+
+class TimeCreateWaveFile(DriverDirectory):
+    """
+    create_wave_file of an rf pulse train, a clock and a trigger, like the cwodmr waveforms.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.wave_dict = build_wave_dict(2048, num_points)
+
+    def time_create_wave_file(self, num_points):
+        self.device.create_wave_file('suite', self.wave_dict)
+
+
+class TimeTransportCycle(DriverDirectory):
+    """
+    create_wave_file and run_single_wave through the file transport or the in-memory transport. The difference
+    is the time spent on file I/O.
+    """
+    params = [SIZES, ['file', 'memory']]
+    param_names = ['num_points', 'transport']
+
+    def setup(self, num_points, transport):
+        super().setup(num_points, transport)
+        if transport == 'memory':
+            self.device = DPG11Device(self.directory, transport=MemoryTransport())
+        self.wave_dict = build_wave_dict(64, num_points)
+
+    def time_create_and_run(self, num_points, transport):
+        self.device.run_single_wave(self.device.create_wave_file('suite', self.wave_dict), clock_rate=1e9)
+
+
+class TimeReconfigure(EmulatedGUI):
+    """
+    A whole reconfiguration: create_wave_file, run_single_wave and waiting for the emulated GUI to load it.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.device = DPG11Device(self.directory, script_timeout=SCRIPT_TIMEOUT)
+        self.wave_dict = build_wave_dict(64, num_points)
+
+    def time_reconfigure(self, num_points):
+        self.device.run_single_wave(self.device.create_wave_file('suite', self.wave_dict), clock_rate=1e9)
+        self.device.wait_for_script(SCRIPT_TIMEOUT)
+
+
+class TimeMultiCard(EmulatedGUI):
+    """
+    Reconfiguring two cards as two independent devices, each with its own script, or as one MultiCardDevice.
+    """
+    params = [SIZES, ['devices', 'multi_card']]
+    param_names = ['num_points', 'cards']
+
+    def setup(self, num_points, cards):
+        super().setup(num_points, cards)
+        samples = np.arange(num_points)
+        self.wave_dict = {1: samples % 4096 < 2048,
+                          2: samples % 2,
+                          CHANNELS_PER_CARD + 1: samples < 64,
+                          CHANNELS_PER_CARD + 3: samples % 8192 >= 4096}
+        self.cards = MultiCardDevice(self.directory, card_numbers=[1, 2], script_timeout=SCRIPT_TIMEOUT)
+
+    def time_reconfigure(self, num_points, cards):
+        if cards == 'multi_card':
+            self.cards.run_wave_dict('suite', self.wave_dict, clock_rate=1e9)
+            self.cards[1].wait_for_script(SCRIPT_TIMEOUT)
+            return
+        for card_number, card_dict in self.cards.split_channels(self.wave_dict).items():
+            device = self.cards[card_number]
+            device.run_single_wave(device.create_wave_file(f'suite_card{card_number}', card_dict), clock_rate=1e9)
+            device.wait_for_script(SCRIPT_TIMEOUT)
+
+
+class TimeSweep(DriverDirectory):
+    """
+    The wavefiles of an 8 point pulse width sweep, written one by one with create_wave_file or by
+    precompile_sweep across a process pool.
+    """
+    params = [[65536, 1048576], ['serial', 'pool']]
+    param_names = ['num_points', 'method']
+
+    def setup(self, num_points, method):
+        super().setup(num_points, method)
+        self.builder = functools.partial(build_wave_dict, num_points=num_points)
+        self.points = [64 * i for i in range(1, 9)]
+
+    def time_sweep(self, num_points, method):
+        if method == 'pool':
+            precompile_sweep(self.device, self.builder, self.points)
+            return
+        for point in self.points:
+            self.device.create_wave_file(f'sweep_{point}', self.builder(point))
+
+
+class TimePlanSegments(DriverDirectory):
+    """
+    plan_segments of a random waveform. The largest one is over the memory limit and is rejected before anything
+    is written.
+    """
+    params = SIZES + [9000064]
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.wave_dict = {1: np.random.default_rng(0).integers(0, 2, num_points), 3: np.arange(num_points) % 2}
+
+    def time_plan_segments(self, num_points):
+        self.device.plan_segments(self.wave_dict)
+
+
+class TimeCreatePlannedSegments(DriverDirectory):
+    """
+    create_planned_segments of a periodic waveform.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.wave_dict = {1: np.arange(num_points) % 4096 < 1024}
+
+    def time_create_planned_segments(self, num_points):
+        self.device.create_planned_segments('suite', self.wave_dict, num_loops=1)
+
+
+class TimeCommandValidation:
+    """
+    Building the commands of one sweep point, with the argument type checks on or off.
+    """
+    params = [True, False]
+    param_names = ['validation']
+
+    def setup(self, validation):
+        self.device = DPG11Device('dry_run', transport=MemoryTransport())
+        set_validation(validation)
+
+    def teardown(self, validation):
+        set_validation(True)
+
+    def time_commands(self, validation):
+        self.device.set_clk_rate(1e9)
+        self.device.create_single_segment('wavefiles/suite_64.txt', num_loops=10)
+        self.device.run(True)
+
+
+class TimeInstrumentation:
+    """
+    The overhead of the instrumented functions with no Recorder active, and while recording.
+    """
+    params = [False, True]
+    param_names = ['recording']
+
+    def setup(self, recording):
+        self.device = DPG11Device('dry_run', transport=MemoryTransport())
+        self.command_list = [self.device.stop(), self.device.set_clk_rate(1e9), self.device.run()]
+        self.recorder = Recorder() if recording else None
+        if self.recorder is not None:
+            self.recorder.start()
+
+    def teardown(self, recording):
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    def time_off_on_array(self, recording):
+        off_on_array(4, 64)
+
+    def time_create_script(self, recording):
+        self.device.create_script(self.command_list, execute_after_creation=True)
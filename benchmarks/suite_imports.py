@@ -0,0 +1,29 @@
+"""
+asv style benchmarks of the import time of the packages, each in a fresh interpreter. Headless control processes
+and the sweep worker processes only import the driver and the waveforms, so these imports are kept cheap.
+tests/test_imports.py checks that none of them load matplotlib or qt3utils.
+
+Run with
+    asv run
+from the repository root, or without asv with
+    python benchmarks/run_suite.py -b suite_imports
+which stores the results in benchmarks/results and compares them against the previous run.
+"""
+
+# Imports of the driver-only path. dpg11 is imported by the sweep worker processes.
+LIGHTWEIGHT_IMPORTS = ['import dpg11_pylib.driver',
+                       'import dpg11_pylib.waveforms',
+                       'import dpg11_pylib.driver, dpg11_pylib.waveforms, dpg11_pylib.instrumentation',
+                       'import dpg11_pylib.visualization',
+                       'import dpg11']
+
+
+class TimeImports:
+    """
+    Import time of the packages in a fresh interpreter.
+    """
+    params = LIGHTWEIGHT_IMPORTS
+    param_names = ['import_statement']
+
+    def timeraw_import(self, import_statement):
+        return import_statement
@@ -0,0 +1,270 @@
+"""
+asv style benchmarks of the waveforms primitives, from the 64 sample minimum up to the 8e6 sample memory limit.
+
+Run with
+    asv run
+from the repository root, or without asv with
+    python benchmarks/run_suite.py
+which stores the results in benchmarks/results and compares them against the previous run.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from dpg11_pylib.waveforms.batch import off_on_arrays, pack_channel_batch, pulse_arrays
+from dpg11_pylib.waveforms.diff import diff_wavefiles
+from dpg11_pylib.waveforms.packing import PackedWaveform, pack_channels
+from dpg11_pylib.waveforms.wavefile import iter_wavefile, read_wavefile, write_wavefile
+from dpg11_pylib.waveforms.waveforms import (dec2bin_array, join_waveforms, off_on_array, on_array, on_off_array,
+                                             pad_waveform, repeat_waveform, wavefile2arrays)
+
+# Waveform lengths of the suite, all modulo 64
+SIZES = [64, 65536, 1048576, 8000000]
+# Seconds before asv gives up on a single benchmark. The original primitives loop over every sample in Python.
+TIMEOUT = 600
+# Number of channels of the dpg11
+NUM_CHANNELS = 11
+
+
+class TemporaryDirectory:
+    """
+    Temporary directory for the benchmarks that write or read wavefiles.
+    """
+    timeout = TIMEOUT
+
+    def setup(self, *params):
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self, *params):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class TimeStepArrays:
+    """
+    on_off_array and off_on_array with steps of 4 samples.
+    """
+    params = SIZES
+    param_names = ['num_points']
+    timeout = TIMEOUT
+
+    def time_on_off_array(self, num_points):
+        on_off_array(size=4, length=num_points)
+
+    def time_off_on_array(self, num_points):
+        off_on_array(size=4, length=num_points)
+
+
+class TimePadWaveform:
+    """
+    pad_waveform of a waveform half as long as the result, on either side.
+    """
+    params = [SIZES, ['right', 'left']]
+    param_names = ['num_points', 'pad_side']
+    timeout = TIMEOUT
+
+    def setup(self, num_points, pad_side):
+        self.waveform = np.ones(num_points // 2)
+
+    def time_pad_waveform(self, num_points, pad_side):
+        pad_waveform(self.waveform, num_points, pad_side=pad_side)
+
+
+class TimeJoinRepeat:
+    """
+    join_waveforms and repeat_waveform building a waveform out of 64 sample blocks.
+    """
+    params = SIZES
+    param_names = ['num_points']
+    timeout = TIMEOUT
+
+    def setup(self, num_points):
+        self.block = np.arange(64) % 2
+        self.blocks = [self.block] * (num_points // 64)
+
+    def time_join_waveforms(self, num_points):
+        join_waveforms(self.blocks)
+
+    def time_repeat_waveform(self, num_points):
+        repeat_waveform(self.block, num_points // 64)
+
+
+class TimeDec2BinArray:
+    """
+    dec2bin_array of a single word, which the original wavefile reader called once per sample.
+    """
+    params = [0, 1365, 2 ** 11 - 1]
+    param_names = ['word']
+
+    def time_dec2bin_array(self, word):
+        dec2bin_array(word)
+
+
+class TimePackChannels:
+    """
+    pack_channels of 4 random channels, the channels of a typical pulse program.
+    """
+    params = SIZES
+    param_names = ['num_points']
+    timeout = TIMEOUT
+
+    def setup(self, num_points):
+        rng = np.random.default_rng(0)
+        self.wave_dict = {channel: rng.integers(0, 2, num_points) for channel in [1, 2, 3, 4]}
+
+    def time_pack_channels(self, num_points):
+        pack_channels(self.wave_dict)
+
+
+class TimeWriteWavefile(TemporaryDirectory):
+    """
+    write_wavefile of a handful of distinct words, like a real pulse program.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.path = os.path.join(self.directory, f'suite_{num_points}.txt')
+        self.words = np.random.default_rng(0).choice(np.array([0, 1, 6, 7, 15], dtype=np.uint16), num_points)
+
+    def time_write_wavefile(self, num_points):
+        write_wavefile(self.path, self.words)
+
+
+class TimeReadWavefile(TemporaryDirectory):
+    """
+    Reading a wavefile of random 11 bit words into channel planes, from the text or from its .npy sidecar.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        self.path = os.path.join(self.directory, f'suite_{num_points}.txt')
+        write_wavefile(self.path, np.random.default_rng(0).integers(0, 2 ** 11, num_points))
+        # The first read with sidecar=True writes the sidecar, the timed ones load it
+        read_wavefile(self.path, sidecar=True)
+
+    def time_read_wavefile(self, num_points):
+        read_wavefile(self.path)
+
+    def time_read_wavefile_sidecar(self, num_points):
+        read_wavefile(self.path, sidecar=True)
+
+    def time_wavefile2arrays(self, num_points):
+        wavefile2arrays(self.path)
+
+
+class TimeIterWavefile(TemporaryDirectory):
+    """
+    Counting the on samples of every channel of a wavefile while streaming it, holding one chunk at a time.
+    """
+    params = [SIZES, [2 ** 16, 2 ** 20]]
+    param_names = ['num_points', 'chunk_size']
+
+    def setup(self, num_points, chunk_size):
+        super().setup(num_points, chunk_size)
+        self.path = os.path.join(self.directory, f'suite_{num_points}.txt')
+        write_wavefile(self.path, np.random.default_rng(0).integers(0, 2 ** 11, num_points))
+
+    def time_iter_wavefile(self, num_points, chunk_size):
+        counts = np.zeros(NUM_CHANNELS, dtype=np.int64)
+        for planes in iter_wavefile(self.path, chunk_size=chunk_size):
+            counts += planes.sum(axis=1)
+
+
+class TimeDiffWavefiles(TemporaryDirectory):
+    """
+    diff_wavefiles of a wavefile against a copy with a few flipped bits, and against its waveform dictionary.
+    """
+    params = SIZES
+    param_names = ['num_points']
+
+    def setup(self, num_points):
+        super().setup(num_points)
+        samples = np.arange(num_points)
+        self.wave_dict = {1: samples % 4096 < 2048,
+                          2: np.ones(num_points, dtype=bool),
+                          3: np.random.default_rng(0).integers(0, 2, num_points),
+                          4: samples < 64}
+        words = pack_channels(self.wave_dict)
+        flipped = words.copy()
+        for sample, channel in [(num_points // 2, 1), (num_points - 1, 3), (1, 11)]:
+            flipped[sample] ^= 1 << (channel - 1)
+        self.path_a = os.path.join(self.directory, f'a_{num_points}.txt')
+        self.path_b = os.path.join(self.directory, f'b_{num_points}.txt')
+        write_wavefile(self.path_a, words)
+        write_wavefile(self.path_b, flipped)
+
+    def time_diff_wavefiles(self, num_points):
+        diff_wavefiles(self.path_a, self.path_b)
+
+    def time_diff_wave_dict(self, num_points):
+        diff_wavefiles(self.path_a, self.wave_dict)
+
+
+class TimeBatchSweep:
+    """
+    The words of a 500 point pulse width sweep, built one waveform at a time or as 2-D batches.
+    """
+    params = [64, 4096, 65536]
+    param_names = ['num_points']
+    timeout = TIMEOUT
+
+    def setup(self, num_points):
+        self.widths = np.linspace(0, num_points // 2, 500).astype(int)
+
+    def time_loop_sweep(self, num_points):
+        np.stack([pack_channels({1: pad_waveform(np.ones(width), num_points),
+                                 3: off_on_array(size=4, length=num_points),
+                                 4: pad_waveform(np.ones(64), num_points)}) for width in self.widths])
+
+    def time_batch_sweep(self, num_points):
+        pack_channel_batch({1: pulse_arrays(self.widths, num_points),
+                            3: off_on_arrays([4], num_points)[0],
+                            4: pulse_arrays([64], num_points)[0]})
+
+
+class TimeBuildProgram:
+    """
+    Building all 11 channels of a program and packing them, as int64 waveforms or as uint8 rows filled in place.
+    """
+    params = [SIZES, ['int64', 'uint8']]
+    param_names = ['num_points', 'dtype']
+    timeout = TIMEOUT
+
+    def time_build_program(self, num_points, dtype):
+        rows = np.empty((NUM_CHANNELS, num_points), dtype=dtype) if dtype == 'uint8' else [None] * NUM_CHANNELS
+        channels = [pad_waveform(on_array(num_points // 2, dtype=dtype), num_points, dtype=dtype, out=rows[0]),
+                    on_array(num_points, dtype=dtype, out=rows[1]),
+                    off_on_array(4, num_points, dtype=dtype, out=rows[2]),
+                    pad_waveform(on_array(64, dtype=dtype), num_points, dtype=dtype, out=rows[3])]
+        channels += [on_off_array(2 ** channel, num_points, dtype=dtype, out=rows[channel])
+                     for channel in range(4, NUM_CHANNELS)]
+        pack_channels(dict(enumerate(channels, start=1)))
+
+
+class TimePackedWaveform:
+    """
+    Reading and setting one channel of an 11 channel PackedWaveform, as a sweep of that channel does.
+    """
+    params = SIZES
+    param_names = ['num_points']
+    timeout = TIMEOUT
+
+    def setup(self, num_points):
+        self.program = PackedWaveform(np.random.default_rng(0).integers(0, 2 ** 11, num_points))
+        self.waveform = np.arange(num_points) % 4096 < 2048
+        self.wave_dict = self.program.to_dict()
+
+    def time_channel(self, num_points):
+        self.program.channel(1)
+
+    def time_set_channel(self, num_points):
+        self.program.set_channel(1, self.waveform)
+
+    def time_pack_channels(self, num_points):
+        # Repacking the whole waveform dictionary, what a sweep point costs without a PackedWaveform
+        pack_channels({**self.wave_dict, 1: self.waveform})
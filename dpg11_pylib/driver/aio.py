@@ -0,0 +1,227 @@
+# Module for controlling the dpg11 from asyncio code
+import asyncio
+import functools
+import itertools
+
+
+class AsyncDPG11Device:
+    """
+    asyncio wrapper around a DPG11Device. Every command coroutine resolves once the GUI has consumed its script from
+    dax_cmd.txt, and the file I/O (wavefiles, scripts) runs in an executor, so an upload never stalls the event loop.
+
+    Scripts are handed off in order by the transport of the device. If the device has a script_timeout, each
+    handoff raises TimeoutError after that many seconds.
+
+    Examples
+    --------
+    >>> pulser = AsyncDPG11Device(DPG11Device(driver_path, script_timeout=5))
+    >>> wave_filename = await pulser.create_wave_file('cwodmr', wave_dict)
+    >>> await pulser.run_single_wave(wave_filename, clock_rate=1e9)
+    """
+
+    def __init__(self,
+                 device,
+                 executor=None):
+        """
+        Parameters
+        ----------
+        device : DPG11Device
+            The device to control.
+        executor : concurrent.futures.Executor, optional
+            Executor for the file I/O. None uses the default executor of the event loop, by default None
+        """
+        self.device = device
+        self.executor = executor
+        # Every script gets its own name, so queued scripts never overwrite each other
+        self.script_counter = itertools.count()
+        # Keeps the scripts in the order the coroutines were called, created on first use inside the event loop
+        self.submit_lock = None
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """
+        Run a blocking function in the executor.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def execute(self,
+                      command_list: list,
+                      script_name: str = None,
+                      save_script: bool = False) -> float:
+        """
+        Create a script from command_list and hand it to the GUI.
+
+        Parameters
+        ----------
+        command_list : list
+            List of command strings, from the command functions of DPG11Device.
+        script_name : str, optional
+            What to name the script .txt file. None uses a unique temporary name, by default None
+        save_script : bool, optional
+            If True, then the script will be saved after execution, by default False
+
+        Returns
+        -------
+        float
+            Handoff latency in seconds, from placing the script to the GUI consuming it. 0.0 if every command was
+            redundant and the device has skip_redundant_commands set.
+        """
+        if script_name is None:
+            script_name = f'temp_async_{next(self.script_counter)}'
+        if self.submit_lock is None:
+            self.submit_lock = asyncio.Lock()
+        # asyncio.Lock is first come first served, so scripts are queued in the order of the calls
+        async with self.submit_lock:
+            # Drop the commands that would not change the state of the device
+            if self.device.skip_redundant_commands:
+                command_list = self.device.state.changed_commands(command_list)
+                if not command_list:
+                    return 0.0
+            script_path = await self.run_in_executor(self.device.create_script,
+                                                     command_list=command_list,
+                                                     script_name=script_name,
+                                                     execute_after_creation=False,
+                                                     overwrite_script=True,
+                                                     save_script=False)
+            future = self.device.transport.submit(script_path,
+                                                  keep_script=save_script,
+                                                  timeout=self.device.script_timeout)
+            # Applied before the handoff finishes, so the next queued script is checked against it
+            self.device.state.apply(command_list)
+        try:
+            return await asyncio.wrap_future(future)
+        except BaseException:
+            self.device.state.reset()
+            raise
+
+    async def open_api(self):
+        """
+        Run the batch file that starts up the API through the transport of the device, in the executor.
+        """
+        await self.run_in_executor(self.device.transport.run_batch_file, self.device.open_api_bat)
+        print('API Opened')
+
+    async def close_api(self):
+        """
+        Run the batch file that closes the API through the transport of the device, in the executor.
+        """
+        await self.run_in_executor(self.device.transport.run_batch_file, self.device.close_api_bat)
+        print('API Closed')
+
+    # Wavefiles
+    async def create_wave_file(self, wave_name: str, wave_dict: dict) -> str:
+        """
+        DPG11Device.create_wave_file in the executor.
+        """
+        return await self.run_in_executor(self.device.create_wave_file, wave_name, wave_dict)
+
+    async def create_multi_wave_file(self, name: str, filename_arr: list, num_loops_arr: list,
+                                     triggered_arr: list) -> str:
+        """
+        DPG11Device.create_multi_wave_file in the executor.
+        """
+        return await self.run_in_executor(self.device.create_multi_wave_file, name, filename_arr, num_loops_arr,
+                                          triggered_arr)
+
+    # Commands
+    async def run(self, soft_trig: bool = True) -> str:
+        """
+        Send the Run command and wait for it to be accepted. See DPG11Device.run.
+        """
+        func_str = self.device.run(soft_trig=soft_trig)
+        await self.execute([func_str])
+        return func_str
+
+    async def stop(self) -> str:
+        """
+        Send the Stop command and wait for it to be accepted. See DPG11Device.stop.
+        """
+        func_str = self.device.stop()
+        await self.execute([func_str])
+        return func_str
+
+    async def set_clk_rate(self, clock_rate: float) -> str:
+        """
+        Send the SetClkRate command and wait for it to be accepted. See DPG11Device.set_clk_rate.
+        """
+        func_str = self.device.set_clk_rate(clock_rate=clock_rate)
+        await self.execute([func_str])
+        return func_str
+
+    async def create_single_segment(self, wave_filename: str, **kwargs) -> str:
+        """
+        Send the CreateSingleSegment command and wait for it to be accepted. The keyword arguments are those of
+        DPG11Device.create_single_segment.
+        """
+        func_str = self.device.create_single_segment(wave_filename=wave_filename, **kwargs)
+        await self.execute([func_str])
+        return func_str
+
+    async def create_multi_segments(self, waves_filename: str, **kwargs) -> str:
+        """
+        Send the CreateSegments command and wait for it to be accepted. The keyword arguments are those of
+        DPG11Device.create_multi_segments.
+        """
+        func_str = self.device.create_multi_segments(waves_filename=waves_filename, **kwargs)
+        await self.execute([func_str])
+        return func_str
+
+    async def run_single_wave(self,
+                              wave_filename: str,
+                              clock_rate: float,
+                              channel_num: int = 1,
+                              num_loops: int = 0,
+                              pad_begin: int = 2047,
+                              pad_end: int = 2047,
+                              triggered: int = 0,
+                              soft_trig: bool = True) -> list:
+        """
+        Stop, set the clock rate, load a single wavefile and run it, as one script. See DPG11Device.run_single_wave.
+
+        Returns
+        -------
+        list
+            The command strings that were sent.
+        """
+        command_list = [
+            self.device.stop(),
+            self.device.set_clk_rate(clock_rate=clock_rate),
+            self.device.create_single_segment(wave_filename=wave_filename,
+                                              channel_num=channel_num,
+                                              num_loops=num_loops,
+                                              pad_begin=pad_begin,
+                                              pad_end=pad_end,
+                                              triggered=triggered),
+            self.device.run(soft_trig)
+        ]
+        await self.execute(command_list)
+        return command_list
+
+    async def run_multi_wave(self,
+                             waves_filename: str,
+                             clock_rate: float,
+                             channel_num: int = 1,
+                             pad_begin: int = 2047,
+                             pad_end: int = 2047,
+                             loop: bool = False,
+                             soft_trig: bool = True) -> list:
+        """
+        Stop, set the clock rate, load a multi-wavefile and run it, as one script. See DPG11Device.run_multi_wave.
+
+        Returns
+        -------
+        list
+            The command strings that were sent.
+        """
+        command_list = [
+            self.device.stop(),
+            self.device.set_clk_rate(clock_rate=clock_rate),
+            self.device.create_multi_segments(waves_filename=waves_filename,
+                                              channel_num=channel_num,
+                                              pad_begin=pad_begin,
+                                              pad_end=pad_end,
+                                              loop=loop),
+            self.device.run(soft_trig)
+        ]
+        await self.execute(command_list)
+        return command_list
@@ -0,0 +1,76 @@
+# Module for merging the commands of a batched dpg11 script
+# Commands that set a value which is only used once the output runs, so a later one replaces an earlier one
+SUPERSEDED_COMMANDS = ['SetClkRate', 'SelExtTrig']
+# Commands that do nothing when sent twice in a row
+IDEMPOTENT_COMMANDS = ['Stop', 'SetClkRate', 'SelExtTrig', 'CreateSingleSegment', 'CreateSegments', 'PWR_DWN']
+
+
+# Function to split a command string into its name and card number
+def parse_command(command: str) -> (str, int, list):
+    """
+    Split a dpg11 command string, such as 'SetClkRate 1 2500000000', into its parts.
+
+    Parameters
+    ----------
+    command : str
+        The command string.
+
+    Returns
+    -------
+    name : str
+        Name of the command, such as 'SetClkRate'.
+    card_number : int
+        Card number the command is sent to.
+    args : list
+        The rest of the arguments as strings.
+    """
+    parts = command.split()
+    if len(parts) < 2:
+        raise ValueError(f'Invalid command string (Received {command})')
+    return parts[0], int(parts[1]), parts[2:]
+
+
+# Function to merge duplicate and cancelling commands
+def merge_commands(command_list: list) -> list:
+    """
+    Merge the commands of a batch so that every command that would not change the result is dropped. For each card:
+
+    * a command identical to the previous one for that card is dropped if it is idempotent, such as a repeated Stop
+    * a SetClkRate or SelExtTrig is dropped if a later one for the same card replaces it before the next Run
+    * a Run that is immediately stopped by the next command for that card is dropped
+
+    Parameters
+    ----------
+    command_list : list
+        List of command strings in the order they would be sent.
+
+    Returns
+    -------
+    list
+        The merged list of command strings, in order.
+    """
+    merged = []
+    for command in command_list:
+        name, card_number, _ = parse_command(command)
+        card_commands = [i for i, previous in enumerate(merged) if parse_command(previous)[1] == card_number]
+
+        # Drop a Run that is stopped straight away
+        if name == 'Stop' and card_commands and parse_command(merged[card_commands[-1]])[0] == 'Run':
+            del merged[card_commands.pop()]
+
+        # Drop repeated commands
+        if card_commands and name in IDEMPOTENT_COMMANDS and merged[card_commands[-1]] == command:
+            continue
+
+        # Drop an earlier setting that this one replaces
+        if name in SUPERSEDED_COMMANDS:
+            for i in reversed(card_commands):
+                previous_name = parse_command(merged[i])[0]
+                if previous_name == 'Run':
+                    break
+                if previous_name == name:
+                    del merged[i]
+                    break
+
+        merged.append(command)
+    return merged
@@ -0,0 +1,278 @@
+# Module for the content addressed cache of the dpg11 wavefiles and multi-wavefiles
+import contextlib
+import hashlib
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+from dpg11_pylib.waveforms.wavefile import sidecar_path
+
+# Number of bytes in the content hash. The hex digest is twice as long.
+DIGEST_SIZE = 8
+# Cached files are named {name}_{digest}_{data}.txt, so get_data_from_fn still finds the data at the end
+CACHED_FILENAME_PATTERN = re.compile(r'^.+_(?P<digest>[0-9a-f]{%d})_\d+\.txt$' % (2 * DIGEST_SIZE))
+
+
+class WavefileCache:
+    """
+    Content addressed cache of the wavefiles and multi-wavefiles saved in the driver directory. Files are keyed
+    by a hash of their contents, so a waveform that is already on disk is never written twice, and the cached
+    files are kept under a byte budget by deleting the least recently used ones.
+
+    Only files that follow the cached naming scheme are managed, any other file in the directories is left alone.
+    The last use of each file is stored as its modification time, so the order survives between sessions.
+    Using a multi-wavefile also uses the wavefiles it lists, so they are never evicted before it, and a
+    multi-wavefile that lists a wavefile that is gone is not returned by lookup.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 max_bytes: int,
+                 subdirectories: tuple = ('wavefiles', 'multi_wavefiles')):
+        """
+        Parameters
+        ----------
+        directory : str
+            The driver directory that the subdirectories are in.
+        max_bytes : int
+            Maximum number of bytes the cached files may use in total.
+        subdirectories : tuple, optional
+            Subdirectories of directory that hold cached files, by default ('wavefiles', 'multi_wavefiles')
+        """
+        if max_bytes <= 0:
+            raise ValueError(f'max_bytes must be positive (Received {max_bytes})')
+
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.subdirectories = subdirectories
+        # digest -> [relative filename, size in bytes], ordered from least to most recently used
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Digests of the files that must not be evicted, only a set while pinned_files() is open
+        self.pinned = None
+
+        self.scan()
+
+    def scan(self):
+        """
+        Rebuild the index from the cached files that are on disk, ordered by their last use.
+        """
+        found = []
+        for subdirectory in self.subdirectories:
+            path = os.path.join(self.directory, subdirectory)
+            if not os.path.isdir(path):
+                continue
+            for entry in os.scandir(path):
+                match = CACHED_FILENAME_PATTERN.match(entry.name)
+                if match and entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, match.group('digest'), f'{subdirectory}/{entry.name}', stat.st_size))
+
+        self.entries.clear()
+        self.total_bytes = 0
+        for _, digest, filename, size in sorted(found):
+            self.entries[digest] = [filename, size]
+            self.total_bytes += size
+
+    @staticmethod
+    def digest(content: np.ndarray or bytes or str,
+               kind: str = 'wavefile') -> str:
+        """
+        Hash the contents of a file.
+
+        Parameters
+        ----------
+        content : np.ndarray | bytes | str
+            Packed words of a wavefile, or the text of a multi-wavefile.
+        kind : str, optional
+            What the content is. Files of different kinds never share a digest, by default 'wavefile'
+
+        Returns
+        -------
+        str
+            Hex digest of the content.
+        """
+        if isinstance(content, str):
+            content = content.encode()
+        elif isinstance(content, np.ndarray):
+            content = np.ascontiguousarray(content, dtype='<u2').tobytes()
+        return hashlib.blake2b(content, digest_size=DIGEST_SIZE, person=kind.encode()[:16]).hexdigest()
+
+    def filename(self,
+                 subdirectory: str,
+                 name: str,
+                 digest: str,
+                 data: int) -> str:
+        """
+        Relative filename of a cached file of the form subdirectory/name_digest_data.txt
+        """
+        return f'{subdirectory}/{name}_{digest}_{data}.txt'
+
+    def member_filenames(self,
+                         filename: str) -> list:
+        """
+        Relative filenames of the wavefiles listed in a multi-wavefile, or an empty list for a wavefile.
+        """
+        if not filename.startswith('multi_wavefiles/'):
+            return []
+        with open(os.path.join(self.directory, filename)) as f:
+            return [line.split()[0] for line in f if line.strip()]
+
+    def member_digests(self,
+                       filename: str) -> list:
+        """
+        Digests of the cached wavefiles listed in a multi-wavefile, or an empty list for a wavefile.
+        """
+        digests = []
+        for member_filename in self.member_filenames(filename):
+            match = CACHED_FILENAME_PATTERN.match(os.path.basename(member_filename))
+            if (match and match.group('digest') in self.entries
+                    and os.path.isfile(os.path.join(self.directory, member_filename))):
+                digests.append(match.group('digest'))
+        return digests
+
+    def use(self,
+            digest: str,
+            filename: str):
+        """
+        Mark a cached file and the wavefiles it lists as the most recently used, and pin them if pinned_files()
+        is open.
+
+        Parameters
+        ----------
+        digest : str
+            Hex digest of the content.
+        filename : str
+            Relative filename of the file.
+        """
+        for member_digest in self.member_digests(filename):
+            self.use(member_digest, self.entries[member_digest][0])
+        self.entries.move_to_end(digest)
+        os.utime(os.path.join(self.directory, filename))
+        if self.pinned is not None:
+            self.pinned.add(digest)
+
+    @contextlib.contextmanager
+    def pinned_files(self):
+        """
+        Keep every file that is looked up or added inside the with block from being evicted until the block exits,
+        so that a program made of several files never evicts its own files while they are written. The cache may
+        go over max_bytes while the block is open, and is brought back under it by the next add.
+        """
+        if self.pinned is not None:
+            yield self
+            return
+        self.pinned = set()
+        try:
+            yield self
+        finally:
+            self.pinned = None
+
+    def lookup(self,
+               digest: str) -> str or None:
+        """
+        Get the filename of the cached file with the given digest, marking it as the most recently used. A
+        multi-wavefile is only returned if every wavefile it lists is still on disk.
+
+        Parameters
+        ----------
+        digest : str
+            Hex digest of the content.
+
+        Returns
+        -------
+        str | None
+            Relative filename of the cached file, or None if it is not on disk.
+        """
+        entry = self.entries.get(digest)
+        if entry is not None:
+            path = os.path.join(self.directory, entry[0])
+            if not os.path.isfile(path):
+                # The file was removed behind our back
+                self.remove(digest, delete_file=False)
+            elif all(os.path.isfile(os.path.join(self.directory, member_filename))
+                     for member_filename in self.member_filenames(entry[0])):
+                self.use(digest, entry[0])
+                self.hits += 1
+                return entry[0]
+            else:
+                # A wavefile it lists was evicted, so the multi-wavefile is rewritten along with it
+                self.remove(digest)
+        self.misses += 1
+        return None
+
+    def add(self,
+            digest: str,
+            filename: str):
+        """
+        Register a file that was just written and evict the least recently used files if over budget. The
+        wavefiles listed by a multi-wavefile are marked as used along with it.
+
+        Parameters
+        ----------
+        digest : str
+            Hex digest of the content.
+        filename : str
+            Relative filename of the file.
+        """
+        if digest in self.entries:
+            self.remove(digest, delete_file=False)
+        size = os.path.getsize(os.path.join(self.directory, filename))
+        self.entries[digest] = [filename, size]
+        self.total_bytes += size
+        self.use(digest, filename)
+        self.evict(keep=digest)
+
+    def remove(self,
+               digest: str,
+               delete_file: bool = True):
+        """
+        Remove a file from the cache.
+
+        Parameters
+        ----------
+        digest : str
+            Hex digest of the content.
+        delete_file : bool, optional
+            If True, the file is deleted from disk too, by default True
+        """
+        filename, size = self.entries.pop(digest)
+        self.total_bytes -= size
+        if delete_file:
+            path = os.path.join(self.directory, filename)
+            # The .npy sidecar of read_wavefile goes with its wavefile
+            for file_path in [path, sidecar_path(path)]:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+    def evict(self,
+              keep: str = None):
+        """
+        Delete the least recently used files until the cache is within max_bytes. Pinned files, and the wavefiles
+        listed by the file that is kept, are not evicted.
+
+        Parameters
+        ----------
+        keep : str, optional
+            Digest of a file that must not be evicted, by default None
+        """
+        keep_digests = set(self.pinned or ())
+        if keep in self.entries:
+            keep_digests.add(keep)
+            keep_digests.update(self.member_digests(self.entries[keep][0]))
+        for digest in list(self.entries.keys()):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if digest not in keep_digests:
+                self.remove(digest)
+
+    def clear(self):
+        """
+        Delete every cached file.
+        """
+        for digest in list(self.entries.keys()):
+            self.remove(digest)
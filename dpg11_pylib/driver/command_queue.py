@@ -0,0 +1,180 @@
+# Module for handing scripts to the dpg11 GUI through dax_cmd.txt in order
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CommandQueue:
+    """
+    Hands scripts to the DPG11 GUI by placing them at dax_cmd.txt, one at a time and in order.
+
+    The GUI deletes dax_cmd.txt once it has read the script, so a missing dax_cmd.txt means the last script was
+    consumed. Waiting for that before placing the next script keeps two scripts from overwriting each other,
+    without fixed sleeps. The time between placing a script and seeing it consumed is recorded as the handoff
+    latency.
+    """
+
+    def __init__(self,
+                 execute_path: str,
+                 poll_interval: float = 1e-3):
+        """
+        Parameters
+        ----------
+        execute_path : str
+            Full path of the dax_cmd.txt file that the GUI reads.
+        poll_interval : float, optional
+            Time in seconds between checks of whether the script was consumed, by default 1e-3
+        """
+        self.execute_path = execute_path
+        self.poll_interval = poll_interval
+        # Held while a script is handed off, so scripts from several threads go out one at a time
+        self.lock = threading.RLock()
+        # Time the last script that is not known to be consumed yet was handed off
+        self.sent_time = None
+        self.num_sent = 0
+        self.latencies = []
+
+        # Worker thread for submit(), started on first use
+        self.submitted = None
+        self.worker = None
+
+    def is_consumed(self) -> bool:
+        """
+        Check whether the GUI has consumed the last script, recording the handoff latency when it has.
+
+        Returns
+        -------
+        bool
+            True if dax_cmd.txt does not exist.
+        """
+        consumed = not os.path.exists(self.execute_path)
+        if consumed and self.sent_time is not None:
+            self.latencies.append(time.perf_counter() - self.sent_time)
+            self.sent_time = None
+        return consumed
+
+    def wait_for_consumption(self,
+                             timeout: float = None) -> bool:
+        """
+        Block until the GUI has consumed the last script.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds. None waits forever, by default None
+
+        Returns
+        -------
+        bool
+            True if the script was consumed, False if the timeout was reached first.
+        """
+        start = time.perf_counter()
+        while not self.is_consumed():
+            if timeout is not None and time.perf_counter() - start >= timeout:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def send(self,
+             script_path: str,
+             keep_script: bool = True,
+             timeout: float = None,
+             wait_for_previous: bool = True):
+        """
+        Hand a script to the GUI. The script is renamed onto dax_cmd.txt, so the GUI never reads a partly
+        copied script.
+
+        Parameters
+        ----------
+        script_path : str
+            Full path of the script .txt file.
+        keep_script : bool, optional
+            If True, the script is copied and kept. If False, it is moved, by default True
+        timeout : float, optional
+            Maximum time in seconds to wait for the previous script to be consumed. None waits forever,
+            by default None
+        wait_for_previous : bool, optional
+            If False, the script is placed without waiting, overwriting any script the GUI has not read yet,
+            by default True
+        """
+        with self.lock:
+            if wait_for_previous and not self.wait_for_consumption(timeout):
+                raise TimeoutError(f'The previous script was not consumed from {self.execute_path} '
+                                   f'within {timeout} s')
+            if keep_script:
+                temp_path = self.execute_path + '.tmp'
+                shutil.copyfile(src=script_path, dst=temp_path)
+                os.replace(temp_path, self.execute_path)
+            else:
+                os.replace(script_path, self.execute_path)
+            self.sent_time = time.perf_counter()
+            self.num_sent += 1
+
+    def submit(self,
+               script_path: str,
+               keep_script: bool = True,
+               timeout: float = None) -> Future:
+        """
+        Queue a script to be handed to the GUI by a background thread, in the order of submission.
+
+        Parameters
+        ----------
+        script_path : str
+            Full path of the script .txt file.
+        keep_script : bool, optional
+            If True, the script is copied and kept. If False, it is moved, by default True
+        timeout : float, optional
+            Maximum time in seconds to wait for each step of the handoff. None waits forever, by default None
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the handoff latency in seconds once the GUI has consumed the script, or raises
+            TimeoutError.
+        """
+        with self.lock:
+            if self.worker is None:
+                self.submitted = queue.Queue()
+                self.worker = threading.Thread(target=self.run_worker, name='dpg11-command-queue', daemon=True)
+                self.worker.start()
+        future = Future()
+        self.submitted.put((future, script_path, keep_script, timeout))
+        return future
+
+    def run_worker(self):
+        """
+        Hand off the submitted scripts in order. Runs in the worker thread.
+        """
+        while True:
+            future, script_path, keep_script, timeout = self.submitted.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with self.lock:
+                    self.send(script_path, keep_script=keep_script, timeout=timeout)
+                    if not self.wait_for_consumption(timeout):
+                        raise TimeoutError(f'The script was not consumed from {self.execute_path} within {timeout} s')
+                    latency = self.latencies[-1]
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(latency)
+
+    def latency_stats(self) -> dict:
+        """
+        Summary of the measured handoff latencies.
+
+        Returns
+        -------
+        dict
+            Number of scripts sent and the number, mean, min and max of the measured latencies in seconds.
+        """
+        stats = {'num_sent': self.num_sent, 'num_measured': len(self.latencies)}
+        if self.latencies:
+            stats.update(mean=sum(self.latencies) / len(self.latencies),
+                         min=min(self.latencies),
+                         max=max(self.latencies))
+        return stats
@@ -0,0 +1,194 @@
+# Module for compressing repeated blocks of a dpg11 waveform into looped segments
+import numpy as np
+
+# Every segment of the dpg11 must be a multiple of this many samples
+BLOCK_MULTIPLE = 64
+
+
+# Function to get the block sizes that evenly split a waveform
+def candidate_block_sizes(num_points: int,
+                          block_multiple: int = BLOCK_MULTIPLE) -> list:
+    """
+    Get every block size that is a multiple of block_multiple and evenly divides num_points, smallest first.
+
+    Parameters
+    ----------
+    num_points : int
+        Number of points in the waveform. Must be a multiple of block_multiple.
+    block_multiple : int, optional
+        Block sizes must be a multiple of this, by default 64
+
+    Returns
+    -------
+    list
+        The block sizes in increasing order.
+    """
+    if num_points % block_multiple != 0:
+        raise ValueError(f'Length of the waveform must be modulo {block_multiple}')
+    num_blocks = num_points // block_multiple
+    divisors = set()
+    for i in range(1, int(np.sqrt(num_blocks)) + 1):
+        if num_blocks % i == 0:
+            divisors.update((i, num_blocks // i))
+    return [block_multiple * d for d in sorted(divisors)]
+
+
+# Function to find the period of a waveform
+def find_period(words: np.ndarray,
+                block_multiple: int = BLOCK_MULTIPLE) -> int:
+    """
+    Find the shortest block, a multiple of block_multiple long, that the waveform is made of repeated copies of.
+
+    Parameters
+    ----------
+    words : np.ndarray
+        Packed words of the waveform.
+    block_multiple : int, optional
+        The period must be a multiple of this, by default 64
+
+    Returns
+    -------
+    int
+        Length of the period. This is len(words) if the waveform does not repeat.
+    """
+    words = np.asarray(words)
+    for period in candidate_block_sizes(len(words), block_multiple):
+        if period == len(words) or np.array_equal(words[period:], words[:-period]):
+            return period
+    return len(words)
+
+
+# Function to split a waveform into runs of repeated blocks
+def find_repeated_blocks(words: np.ndarray,
+                         block_size: int) -> list:
+    """
+    Split a waveform into blocks of block_size samples and group consecutive identical blocks. Neighbouring blocks
+    that are not repeated are merged into one longer block.
+
+    Parameters
+    ----------
+    words : np.ndarray
+        Packed words of the waveform. The length must be a multiple of block_size.
+    block_size : int
+        Number of samples in each block.
+
+    Returns
+    -------
+    list
+        List of (start, length, count) tuples, meaning words[start:start + length] is played count times in a row.
+    """
+    words = np.asarray(words)
+    rows = words.reshape(-1, block_size)
+    # Index of the first block of each run of identical blocks
+    is_new = np.ones(len(rows), dtype=bool)
+    is_new[1:] = np.any(rows[1:] != rows[:-1], axis=1)
+    run_starts = np.flatnonzero(is_new)
+    run_counts = np.diff(np.append(run_starts, len(rows)))
+
+    segments = []
+    for start, count in zip(run_starts.tolist(), run_counts.tolist()):
+        if count == 1 and segments and segments[-1][2] == 1:
+            # Merge into the previous block that is also only played once
+            previous_start, previous_length, _ = segments[-1]
+            segments[-1] = (previous_start, previous_length + block_size, 1)
+        else:
+            segments.append((start * block_size, block_size, count))
+    return segments
+
+
+# Function to split loop counts that are over the limit of the device
+def split_loops(segments: list,
+                max_loops: int) -> list:
+    """
+    Split any segment that is looped more than max_loops times into several segments.
+
+    Parameters
+    ----------
+    segments : list
+        List of (start, length, count) tuples.
+    max_loops : int
+        Maximum number of loops of a single segment.
+
+    Returns
+    -------
+    list
+        List of (start, length, count) tuples with every count at most max_loops.
+    """
+    split = []
+    for start, length, count in segments:
+        while count > max_loops:
+            split.append((start, length, max_loops))
+            count -= max_loops
+        split.append((start, length, count))
+    return split
+
+
+# Function to compress a waveform into looped segments
+def compress_repetitions(words: np.ndarray,
+                         num_loops: int = 0,
+                         max_loops: int = 2 ** 16 - 2,
+                         max_segments: int = 60,
+                         block_multiple: int = BLOCK_MULTIPLE) -> (list, bool):
+    """
+    Compress a waveform that is made of repeated blocks into a short list of looped segments.
+
+    If the waveform is one block repeated, it becomes a single segment looped that many times (or looped
+    continuously if num_loops is 0). Otherwise the block size that stores the fewest samples while staying within
+    max_segments is used, and the waveform becomes one segment per run of identical blocks.
+
+    Parameters
+    ----------
+    words : np.ndarray
+        Packed words of the waveform.
+    num_loops : int, optional
+        Number of times the whole waveform is played. 0 plays it continuously, by default 0
+    max_loops : int, optional
+        Maximum number of loops of a single segment, by default 65534
+    max_segments : int, optional
+        Maximum number of segments in a sequence, by default 60
+    block_multiple : int, optional
+        Every segment must be a multiple of this many samples, by default 64
+
+    Returns
+    -------
+    segments : list
+        List of (start, length, loops) tuples to be played in order, meaning words[start:start + length] is played
+        loops times. loops is 0 for a single segment that is played continuously. The same block may appear more
+        than once.
+    loop_sequence : bool
+        If True, the whole list of segments has to be looped continuously (only for more than one segment).
+    """
+    words = np.asarray(words)
+    num_points = len(words)
+
+    # A single block repeated is a single looped segment, split into several segments of the same block if the
+    # loop count is over max_loops
+    period = find_period(words, block_multiple)
+    repeats = num_points // period
+    best = None
+    if num_loops == 0:
+        best = (period, [(0, period, 0)], False)
+    else:
+        segments = split_loops([(0, period, repeats * num_loops)], max_loops)
+        if len(segments) <= max_segments:
+            best = (period, segments, False)
+
+    # Otherwise try splitting either one period or the whole waveform into blocks of every size, for the one that
+    # stores the fewest samples in at most max_segments segments. The whole sequence can only be looped
+    # continuously, so a finite number of plays of the period or the waveform is unrolled.
+    for length, plays in [(period, repeats * num_loops), (num_points, num_loops)]:
+        for block_size in candidate_block_sizes(length, block_multiple):
+            segments = split_loops(find_repeated_blocks(words[:length], block_size), max_loops)
+            if len(segments) * max(plays, 1) > max_segments:
+                continue
+            stored = sum(block_length for _, block_length, _ in segments)
+            if best is None or stored < best[0]:
+                best = (stored, segments * max(plays, 1), num_loops == 0)
+        if period == num_points:
+            break
+
+    if best is None:
+        raise ValueError(f'The waveform played {num_loops} times cannot be split into at most {max_segments} segments')
+
+    _, segments, loop_sequence = best
+    return segments, loop_sequence
@@ -3,14 +3,22 @@
 
 # TODO: Update the info for when this file was created
 
+import contextlib
 import os
-import shutil
-import subprocess
 import time
 
 import numpy as np
 
-import inspect
+from dpg11_pylib.driver.batching import merge_commands
+from dpg11_pylib.driver.cache import WavefileCache
+from dpg11_pylib.driver.compress import compress_repetitions
+from dpg11_pylib.driver.planner import ProgramPlan, split_segments
+from dpg11_pylib.driver.sequence import compile_sequence
+from dpg11_pylib.driver.state import DeviceState
+from dpg11_pylib.driver.transport import FileTransport
+from dpg11_pylib.driver.validation import validate_arguments
+from dpg11_pylib.instrumentation.recorder import Stage, instrumented
+from dpg11_pylib.waveforms.packing import channel_dict_length, pack_channels, pack_stacked_bits
 
 
 # TODO: Organize the workspace
@@ -35,11 +43,16 @@ class DPG11Device:
 
     clock_rate = 0  # This is a placeholder that will update once you set the clock frequency
 
+    @validate_arguments
     def __init__(self,
                  driver_path: str,
                  card_number: int = 1,
                  open_api_on_initialization: bool = False,
-                 clock_rate=None):
+                 clock_rate=None,
+                 wavefile_cache_size=None,
+                 script_timeout=None,
+                 transport=None,
+                 skip_redundant_commands=False):
         """
         Initialize DPG11 script method library for controlling the DPG11. This script method is functional but does not return
         the outputs of each command. This is not ideal for troubleshooting or reading out the actual clock frequency of the DPG11
@@ -59,6 +72,23 @@ class DPG11Device:
             opened with open_api() before calling any functions to execute scripts, by default True
         clock_rate
             If not set to None, the clock rate of the data generator will be set to the input value.
+        wavefile_cache_size
+            If not set to None, wavefiles and multi-wavefiles are cached by their contents and the cached files are
+            kept under this many bytes by deleting the least recently used ones. A file that is already on disk is
+            then reused instead of being written again. By default None, which rewrites the file on every call.
+        script_timeout
+            If not set to None, every script waits for the GUI to consume the previous one from dax_cmd.txt before
+            it is handed off, for up to this many seconds before raising a TimeoutError. By default None, which
+            hands off scripts right away and may overwrite a script the GUI has not read yet.
+        transport
+            Where the scripts, wavefiles and multi-wavefiles go. None uses a FileTransport, which writes them into
+            driver_path for the GUI. A MemoryTransport keeps them in memory and logs the commands instead, for
+            dry runs without the driver, in which case driver_path is only used to name the files and does not
+            need to exist. By default None
+        skip_redundant_commands
+            If True, commands that would not change the last state handed to the device (see DeviceState), such
+            as setting the same clock rate or reloading a wavefile with the same contents, are dropped before a
+            script is created, and no script is sent if every command is dropped. By default False
         """
         
         # Remove this later, just so the class works for now
@@ -66,34 +96,32 @@ class DPG11Device:
         
         # init the driver path
         self.directory = driver_path
-        # check that the driver is in the path provided
-        if not os.path.exists(os.path.join(self.directory, 'dax22000_GUI_64.exe')):
-            raise ValueError('No driver was found in the path provided. Please input a valid path.')
+        # The file transport checks for the driver and creates the script, wave, and multi-wave folders
+        if transport is None:
+            transport = FileTransport(self.directory)
+        self.transport = transport
         # save the scripts, wavefiles, and multi-wavefiles paths
         self.scripts_path = os.path.join(self.directory, 'scripts')
         self.wavefiles_path = os.path.join(self.directory, 'wavefiles')
         self.multi_wavefiles_path = os.path.join(self.directory, 'multi_wavefiles')
-        # create the script, wave, and multi-wave folders if they don't exist
-        try:
-            if not os.path.exists(self.scripts_path):
-                os.makedirs(self.scripts_path)
-            if not os.path.exists(self.wavefiles_path):
-                os.makedirs(self.wavefiles_path)
-            if not os.path.exists(self.multi_wavefiles_path):
-                os.makedirs(self.multi_wavefiles_path)
-        except:
-            raise ValueError('The driver path is not valid or there was an issue. Please input a valid path.')
-            
-        
 
-        # Check for TypeErrors
-        annotations = inspect.getfullargspec(self.__init__).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
+
 
         self.card_number = card_number
+        # Time to wait for the GUI to consume each script, None to not wait
+        self.script_timeout = script_timeout
+        # Shadow copy of the state handed to the device
+        self.state = DeviceState()
+        self.skip_redundant_commands = skip_redundant_commands
+        # Commands collected by batch(), None when not batching
+        self.batch_commands = None
+        self.batch_depth = 0
+        # Content addressed cache of the wavefiles, only used if a size was given
+        self.wavefile_cache = None
+        if wavefile_cache_size is not None:
+            if not isinstance(self.transport, FileTransport):
+                raise ValueError('wavefile_cache_size can only be used with a FileTransport')
+            self.wavefile_cache = WavefileCache(self.directory, wavefile_cache_size)
         self.open_api_bat = 'Script_API_Test\\dpg11_open_api'
         self.close_api_bat = 'Script_API_Test\\dpg11_close_api'
 
@@ -112,7 +140,7 @@ class DPG11Device:
         Opens the batch file to start up the API.
         \n self.open_api_bat must be the correct name and in the correct location.
         """
-        subprocess.call([r'{0}\\{1}.bat'.format(self.directory, self.open_api_bat)])
+        self.transport.run_batch_file(self.open_api_bat)
 
         print('API Opened')
 
@@ -121,10 +149,12 @@ class DPG11Device:
         Opens the batch file to close the API and kill the .exe.
         \n self.close_api_bat must be the correct name and in the correct location.
         """
-        subprocess.call([r'{0}\\{1}.bat'.format(self.directory, self.close_api_bat)])
+        self.transport.run_batch_file(self.close_api_bat)
 
         print('API Closed')
 
+    @instrumented('create_script')
+    @validate_arguments
     def create_script(self,
                       command_list: list,
                       script_name: str = 'temp_script',
@@ -156,7 +186,8 @@ class DPG11Device:
         -------
         str or int
             Returns the .txt filename str of the script if execute_after_script = False or if execute_after_script = True and save_script = True.
-            Returns 0 if execute_after_script = True and save_script = False
+            Returns 0 if execute_after_script = True and save_script = False, or if every command was redundant
+            and skip_redundant_commands is set
         
         Allowable Functions in command_list
         -----------------------------------
@@ -175,12 +206,6 @@ class DPG11Device:
             print(command_list)
             print('\nscript_path: ' + script_path)
 
-        # Check for TypeErrors
-        annotations = inspect.getfullargspec(self.create_script).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
 
         # Ensure that all elements in command_list
         if not all(isinstance(elem, str) for elem in command_list):
@@ -201,7 +226,7 @@ class DPG11Device:
             )
 
         # Check if script_name already exists
-        if not overwrite_script and os.path.isfile(path=script_path):
+        if not overwrite_script and self.transport.exists(script_path):
             if script_name == 'temp_script':
                 return ValueError(
                     'Previous temporary file with name temp_script was not properly deleted. Please delete this file'
@@ -211,6 +236,21 @@ class DPG11Device:
                     'overwrite_script is set to False but script_name already exists. Change script_name or set overwrite_script to True'
                 )
 
+        # Collect the commands instead of executing them when inside batch()
+        if execute_after_creation and self.batch_commands is not None:
+            self.batch_commands.extend(command_list)
+            if self.verbose > 2:
+                print('Commands added to the batch')
+            return 0
+
+        # Drop the commands that would not change the state of the device
+        if execute_after_creation and self.skip_redundant_commands:
+            command_list = self.state.changed_commands(command_list)
+            if not command_list:
+                if self.verbose > 2:
+                    print('Every command was redundant, no script was sent')
+                return 0
+
         # Format command list for input into .txt file
         script_str = "\n".join(command_list)
 
@@ -219,21 +259,21 @@ class DPG11Device:
 
         # create the script name
         # Create the file, write the script into it, and save it
-        f = open(script_path, "w")
-        f.write(script_str)
-        f.close()
+        self.transport.write_script(script_path, script_str)
 
         # Execute script if true
         if execute_after_creation:
-            return self.execute_script(script_txt=script_path, save_script=save_script)
+            return self.execute_script(script_txt=script_path, save_script=save_script, command_list=command_list)
         else:
             if self.verbose > 1:
                 print('Script saved as ' + script_path + ' and not executed')
             return script_path
 
+    @instrumented('execute_script')
     def execute_script(self,
                        script_txt: str,
-                       save_script: bool = True):
+                       save_script: bool = True,
+                       command_list: list = None):
         """
         This function copies an existing script for the DPG11 to run over to the dax_cmd.txt file to be executed by the API
 
@@ -243,6 +283,9 @@ class DPG11Device:
             Full name of the .txt file containing your script
         save_script : bool, optional
             If False, then the script_txt will be deleted after it is executed by the API, by default True
+        command_list : list, optional
+            The commands of the script, used to update the shadow state of the device. If None, the state is
+            reset to unknown, by default None
         """
         # Type Errors
         if not isinstance(script_txt, str):
@@ -265,27 +308,113 @@ class DPG11Device:
                 f'script_txt must be a .txt file (Recieved {script_txt.split(".")[1]})'
             )
 
-        # Directory Paths
-        temp_path = os.path.join(self.directory, script_txt)
-        execute_path = os.path.join(self.directory, "dax_cmd.txt")
+        # Directory Paths. Scripts from create_script already include the driver path
+        if script_txt.startswith(self.scripts_path):
+            temp_path = script_txt
+        else:
+            temp_path = os.path.join(self.directory, script_txt)
 
         if self.verbose > 3:
             print('Script path: ' + temp_path)
-            print('Execution path: ' + execute_path)
+            print('Transport: ' + type(self.transport).__name__)
+
+        # Hand the script to the GUI, waiting for the previous one to be consumed if script_timeout is set
+        try:
+            self.transport.send(temp_path,
+                                keep_script=save_script,
+                                timeout=self.script_timeout,
+                                wait_for_previous=self.script_timeout is not None)
+        except BaseException:
+            self.state.reset()
+            raise
+
+        # Update the shadow state with the commands that were handed off
+        if command_list is None:
+            self.state.reset()
+        else:
+            self.state.apply(command_list)
 
         # Save or delete the script
         if save_script:
-            # Rename file to dax_cmd.txt
-            shutil.copyfile(src=temp_path, dst=execute_path)
             if self.verbose > 1:
                 print('Script saved as ' + script_txt)
             return script_txt
         else:
-            shutil.move(temp_path, execute_path)
             if self.verbose > 1:
                 print('Script deleted')
             return 0
 
+    # Function to wait for the GUI to consume the last script
+    def wait_for_script(self,
+                        timeout=None) -> bool:
+        """
+        Block until the GUI has consumed the last script from dax_cmd.txt.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait in seconds. None waits forever, by default None
+
+        Returns
+        -------
+        bool
+            True if the script was consumed, False if the timeout was reached first.
+        """
+        return self.transport.wait_for_consumption(timeout)
+
+    # Context manager to send many commands as a single script
+    @contextlib.contextmanager
+    def batch(self,
+              script_name: str = 'temp_batch',
+              save_script: bool = False):
+        """
+        Collect every command that would be executed inside the with block, and send them all as a single script
+        when the block exits. Duplicate and cancelling commands, such as a repeated Stop or a SetClkRate that is
+        replaced by a later one, are merged first (see merge_commands). Nested batches are sent by the outermost one.
+        If the block raises an error, none of the collected commands are sent.
+
+        Note that wavefiles are still written when they are created, so a wavefile that is overwritten inside the
+        block is loaded with its final contents by every command that uses it.
+
+        Parameters
+        ----------
+        script_name : str, optional
+            What to name the script .txt file, by default 'temp_batch'
+        save_script : bool, optional
+            If True, then the script will be saved after execution, by default False
+
+        Examples
+        --------
+        >>> with device.batch():
+        ...     device.stop(execute=True)
+        ...     device.set_clk_rate(1e9, execute=True)
+        ...     device.create_single_segment(wave_filename, execute=True)
+        ...     device.run(execute=True)
+        """
+        self.batch_depth += 1
+        if self.batch_depth == 1:
+            self.batch_commands = []
+        try:
+            yield self
+        except BaseException:
+            if self.batch_depth == 1:
+                self.batch_commands = None
+            raise
+        finally:
+            self.batch_depth -= 1
+
+        if self.batch_depth == 0:
+            command_list = merge_commands(self.batch_commands)
+            self.batch_commands = None
+            if self.verbose > 2:
+                print('Batched commands: ' + str(command_list))
+            if command_list:
+                self.create_script(command_list=command_list,
+                                   script_name=script_name,
+                                   execute_after_creation=True,
+                                   overwrite_script=True,
+                                   save_script=save_script)
+
     # Function to stop the output
     def stop_ouput(self):
         """
@@ -330,7 +459,11 @@ class DPG11Device:
                             self.pwr_dwn()],
                            execute_after_creation=True,
                            )
-        time.sleep(2)
+        # Wait for the GUI to read the script before closing it
+        if self.script_timeout is not None:
+            self.wait_for_script(self.script_timeout)
+        else:
+            time.sleep(self.transport.close_delay)
         self.close_api()
 
         if self.verbose > 2:
@@ -395,6 +528,7 @@ class DPG11Device:
         '''
         return int(''.join(str(bit) for bit in bin_arr), 2)
     
+    @instrumented('create_decimal_array')
     def create_decimal_array(self,
                              stack_arr) -> np.ndarray:
         '''
@@ -410,8 +544,10 @@ class DPG11Device:
         np.ndarray
             Decimal array of the binary array
         '''
-        return np.apply_along_axis(self.bin_array_to_decimal, 1, stack_arr).astype(int)
+        return pack_stacked_bits(stack_arr).astype(int, copy=False)
 
+    @instrumented('create_wave_file')
+    @validate_arguments
     def create_wave_file(self,
                          wave_name: str,
                          wave_dict: dict) -> str:
@@ -421,12 +557,15 @@ class DPG11Device:
         Parameters
         ----------
         wave_name : str
-            What to name the wavefile. Do not include .txt. The final file name will be wave_name_{num_points}.txt
+            What to name the wavefile. Do not include .txt. The final file name will be wave_name_{num_points}.txt,
+            or wave_name_{digest}_{num_points}.txt if the wavefile cache is used
         wave_dict : dict
             Waveform array dictionary of the form {1: 'ch1_waveform_array',
                                                    3: 'ch3_waveform_array'}
             and so on and so forth, where channel 1 array is the array of 1's and 0 of whether the channel is on or off.
-            Note that you do not need to fill any of the off channels.
+            Note that you do not need to fill any of the off channels. The arrays may also be RunLengthWaveform,
+            which are packed from their edges without being expanded to samples. A PackedWaveform may be given
+            instead of the dictionary, and its words are written as they are.
 
         Returns
         -------
@@ -434,26 +573,6 @@ class DPG11Device:
             Name of the saved wavefile
         """
 
-        num_points = len(wave_dict[list(wave_dict.keys())[0]])
-        
-        # print('Number of Points: ', num_points)
-        # Eventual name for the wave file to be saved as
-        wave_filename = f'wavefiles/{wave_name}_{num_points}.txt'
-        wave_filepath = self.directory + '/' + wave_filename
-        # Creating the null array of zeros to be filled to off channels
-        null_array = np.zeros(num_points, dtype=int)
-        
-        # Stacked matrix with each column array with the binary of which channel should be on each cycle
-        stacked_arr = np.stack([wave_dict[num] if num in wave_dict.keys() else null_array for num in range(16, 0, -1)], axis=1)
-        
-        decimal_arr = self.create_decimal_array(stacked_arr)
-        
-        # Check for correct inputs
-        annotations = inspect.getfullargspec(self.create_wave_file).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
 
         # Check if the name is correct
         if ' ' in wave_name:
@@ -461,24 +580,78 @@ class DPG11Device:
                 'wave_name cannot include any spaces (Recieved ' + wave_name
             )
 
+        num_points = channel_dict_length(wave_dict)
+
         if num_points % 64 != 0:
             raise ValueError('Length of waveform_array must be modulo 64')
-        # Open/create the file. Length of the waveform will be in the file name
-        temp = open(wave_filepath, 'w')
 
-        # Add waveform array to the new file
-        for i, point in enumerate(decimal_arr):
-            if i + 1 < len(decimal_arr):
-                temp.write("%d\n" % point)
-            else:
-                temp.write(str(point))
+        # Pack the channels straight into the 16 bit words, only touching the channels that are used
+        decimal_arr = pack_channels(wave_dict, num_points)
+
+        return self.create_wave_file_from_words(wave_name, decimal_arr)
+
+    def create_wave_file_from_words(self,
+                                    wave_name: str,
+                                    words) -> str:
+        """
+        This function creates a .txt wavefile from an array of already packed 16 bit words, where bit n - 1 of
+        each word is channel n, such as the output of pack_channels.
+
+        Parameters
+        ----------
+        wave_name : str
+            What to name the wavefile. Do not include .txt. The final file name will be wave_name_{num_points}.txt,
+            or wave_name_{digest}_{num_points}.txt if the wavefile cache is used
+        words : np.ndarray
+            Array of the packed words of the waveform.
+
+        Returns
+        -------
+        str
+            Name of the saved wavefile
+        """
+        if ' ' in wave_name:
+            raise ValueError(
+                'wave_name cannot include any spaces (Recieved ' + wave_name
+            )
+
+        decimal_arr = np.asarray(words)
+        num_points = len(decimal_arr)
+
+        if num_points % 64 != 0:
+            raise ValueError('Length of waveform_array must be modulo 64')
+
+        # The contents are only hashed if the cache or the shadow state uses the digest
+        digest = None
+        if self.wavefile_cache is not None or self.skip_redundant_commands:
+            digest = WavefileCache.digest(decimal_arr)
+
+        # Eventual name for the wave file to be saved as
+        if self.wavefile_cache is None:
+            wave_filename = f'wavefiles/{wave_name}_{num_points}.txt'
+        else:
+            # Return the existing file if these words are already on disk
+            cached_filename = self.wavefile_cache.lookup(digest)
+            if cached_filename is not None:
+                self.state.file_written(cached_filename, digest)
+                return cached_filename
+            wave_filename = self.wavefile_cache.filename('wavefiles', wave_name, digest, num_points)
+        wave_filepath = self.directory + '/' + wave_filename
+
+        # Write the whole file in one pass to a temporary file that is then renamed into wavefiles/,
+        # so the GUI never sees a half written file. Length of the waveform will be in the file name
+        with Stage('create_wave_file.write'):
+            self.transport.write_wavefile(wave_filepath, decimal_arr)
+        self.state.file_written(wave_filename, digest)
+
+        if self.wavefile_cache is not None:
+            self.wavefile_cache.add(digest, wave_filename)
 
-        # Close the new file
-        temp.close()
-        
         return wave_filename
 
     # Function to create the .txt file that includes the individual waveforms for the create_segments function
+    @instrumented('create_multi_wave_file')
+    @validate_arguments
     def create_multi_wave_file(self,
                                name: str,
                                filename_arr: list,
@@ -491,7 +664,8 @@ class DPG11Device:
         Parameters
         ----------
         name : str
-            What to name multi-wave file. Do not include the .txt. The final filename should be of the form name_{num_waves}.txt
+            What to name multi-wave file. Do not include the .txt. The final filename should be of the form name_{num_waves}.txt,
+            or name_{digest}_{num_waves}.txt if the wavefile cache is used
         filename_arr : list
             List of the filenames of the wavefiles to be used in the multi-wave file
         num_loops_arr : list
@@ -504,12 +678,6 @@ class DPG11Device:
         str
             The filename of the multi-wave txt file that is saved.
         """
-        # Check input types
-        annotations = inspect.getfullargspec(self.create_multi_wave_file).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
 
         # Get the number of segments to be saved in the filename, and initialize string list
         num_waves = len(filename_arr)
@@ -527,13 +695,6 @@ class DPG11Device:
             print('num_loops array: ' + str(num_loops_arr))
             print('triggered array: ' + str(triggered_arr))
 
-        # Format the filename for how it should be saved, where the number is the number of waves in the multi_wave_file
-        filename = f'multi_wavefiles/{name}_{num_waves}.txt'
-        full_path = self.directory + '/' + filename
-
-        if self.verbose > 1:
-            print('Multi-wave filename: ' + filename)
-
         # Populate the str_list with the entry for each waveform in the dataframe
         for i in range(num_waves):
             str_list.append(f'{filename_arr[i]} {num_points[i]} {num_loops_arr[i]} {triggered_arr[i]}')
@@ -544,15 +705,34 @@ class DPG11Device:
         if self.verbose > 1:
             print('String to write to text file: ' + str_to_write)
 
+        # Format the filename for how it should be saved, where the number is the number of waves in the multi_wave_file
+        digest = WavefileCache.digest(str_to_write, kind='multi_wavefile')
+        if self.wavefile_cache is None:
+            filename = f'multi_wavefiles/{name}_{num_waves}.txt'
+        else:
+            # Return the existing file if this multi-wavefile is already on disk
+            cached_filename = self.wavefile_cache.lookup(digest)
+            if cached_filename is not None:
+                self.state.file_written(cached_filename, digest, members=filename_arr)
+                return cached_filename
+            filename = self.wavefile_cache.filename('multi_wavefiles', name, digest, num_waves)
+        full_path = self.directory + '/' + filename
+
+        if self.verbose > 1:
+            print('Multi-wave filename: ' + filename)
+
         # Create and write to the file
-        f = open(full_path, "w")
-        f.write(str_to_write)
-        f.close()
+        self.transport.write_text(full_path, str_to_write)
+        self.state.file_written(filename, digest, members=filename_arr)
+
+        if self.wavefile_cache is not None:
+            self.wavefile_cache.add(digest, filename)
 
         return filename
 
     # All of the functions to be sent to the DPG11 that will output strings for our case
     # Function to run the waveforms 
+    @validate_arguments
     def run(self,
             soft_trig: bool = True,
             execute: bool = False) -> str:
@@ -571,12 +751,6 @@ class DPG11Device:
         str
             Run command string
         """
-        # Check for input type errors
-        annotations = inspect.getfullargspec(self.run).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
 
                 # make bool lower
         soft_trig_lower = str(soft_trig).lower()
@@ -618,6 +792,7 @@ class DPG11Device:
         return func_str
 
     # Function to set the clock frequency
+    @validate_arguments
     def set_clk_rate(self,
                      clock_rate: float or int,
                      execute: bool = False) -> str:
@@ -636,17 +811,8 @@ class DPG11Device:
         str
             SetClkRate command string
         """
-        # Check for input type errors     
-        annotations = inspect.getfullargspec(self.set_clk_rate).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
         
-        if not isinstance(clock_rate, (float, int)):
-            raise TypeError("clock_rate must be of type float or int")
-
-                # Check range of set frequency
+        # Check range of set frequency
         if not (self.internal_clock_rate_limits_in_hz[0] <= clock_rate <=
                 self.internal_clock_rate_limits_in_hz[1]):
             raise ValueError('Data Generator internal frequency input should be between 50e6 Hz and 2.5e9 Hz')
@@ -698,6 +864,7 @@ class DPG11Device:
             return func_str
 
     # Function to create a single segment
+    @validate_arguments
     def create_single_segment(self,
                               wave_filename: str,
                               channel_num: int = 1,
@@ -736,12 +903,6 @@ class DPG11Device:
         # Get the number of points from the file name
         num_points = self.get_data_from_fn(wave_filename)
 
-        # Check input types
-        annotations = inspect.getfullargspec(self.create_single_segment).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
 
         # Check fto ensure we input a .txt file
         if wave_filename.split('.')[-1] != 'txt':
@@ -772,9 +933,10 @@ class DPG11Device:
                                execute_after_creation=True,
                                overwrite_script=True,
                                save_script=True)
-        func_str
+        return func_str
 
     # Function to create multiple segments
+    @validate_arguments
     def create_multi_segments(self,
                               waves_filename: str,
                               channel_num: int = 1,
@@ -806,12 +968,6 @@ class DPG11Device:
         str
             CreateSegments command string
         """
-        # Check input types
-        annotations = inspect.getfullargspec(self.create_multi_segments).annotations
-        for i in annotations.keys():
-            if type(locals()[i]) != annotations[i]:
-                raise TypeError(
-                    f'{i} must be of type {annotations[i]} (Received input of type {type(locals()[i])})')
 
         # Check input range errors
         if channel_num not in self.device_output_channels:
@@ -835,7 +991,371 @@ class DPG11Device:
                                execute_after_creation=True,
                                overwrite_script=True,
                                save_script=True)
-        func_str
+        return func_str
+
+    # Function to write the blocks of a program and create its segment command
+    def create_segments_from_words(self,
+                                   name: str,
+                                   words: np.ndarray,
+                                   segments: list,
+                                   loop_sequence: bool = False,
+                                   channel_num: int = 1,
+                                   pad_begin: int = 2047,
+                                   pad_end: int = 2047,
+                                   execute: bool = False) -> str:
+        """
+        Write every distinct block of a program once and create the segment command that plays them: a
+        CreateSingleSegment for a single segment, or a multi-wavefile and CreateSegments otherwise. This is the
+        shared end of create_compressed_segments, create_sequence and create_planned_segments.
+
+        Parameters
+        ----------
+        name : str
+            What to name the wavefiles. Do not include .txt. Blocks are saved as name_{index}_{num_points}.txt and
+            the multi-wavefile as name_{num_waves}.txt, or name_{num_points}.txt for a single segment
+        words : np.ndarray
+            Packed words that the blocks are slices of.
+        segments : list
+            List of (start, length, loops, triggered) tuples to be played in order, meaning
+            words[start:start + length] is played loops times. Segments with the same start and length share a
+            wavefile.
+        loop_sequence : bool, optional
+            If true, then the full multi-segment will loop, by default False
+        channel_num : int, optional
+            CHANNEL NUMBER WILL ALWAYS BE 1 FOR THE DPG11, by default 1
+        pad_begin : int, optional
+            Vertical value that the waveform will begin at, by default 2047
+        pad_end : int, optional
+            Vertical value that the waveform will end at, by default 2047
+        execute : bool, optional
+            If true, creates an executes a single-line script with the segment command, by default False
+
+        Returns
+        -------
+        str
+            CreateSingleSegment or CreateSegments command string
+        """
+        # Check the memory before writing anything
+        blocks = list(dict.fromkeys((start, length) for start, length, _, _ in segments))
+        stored_points = sum(length for _, length in blocks)
+        if stored_points > self.memory_limits[1]:
+            raise ValueError(f'The program needs {stored_points} samples, more than the memory limit '
+                             f'of {int(self.memory_limits[1])}')
+
+        # Write every distinct block once. The blocks are pinned in the wavefile cache until the multi-wavefile
+        # that lists them is written, so writing one block never evicts another
+        block_filenames = {}
+        pinned = contextlib.nullcontext() if self.wavefile_cache is None else self.wavefile_cache.pinned_files()
+        with pinned:
+            for start, length in blocks:
+                block_name = f'{name}_{len(block_filenames)}' if len(segments) > 1 else name
+                block_filenames[(start, length)] = self.create_wave_file_from_words(block_name,
+                                                                                    words[start:start + length])
+            if len(segments) > 1:
+                waves_filename = self.create_multi_wave_file(
+                    name=name,
+                    filename_arr=[block_filenames[(start, length)] for start, length, _, _ in segments],
+                    num_loops_arr=[int(loops) for _, _, loops, _ in segments],
+                    triggered_arr=[int(triggered) for _, _, _, triggered in segments])
+
+        if len(segments) == 1:
+            start, length, loops, triggered = segments[0]
+            return self.create_single_segment(wave_filename=block_filenames[(start, length)],
+                                              channel_num=channel_num,
+                                              num_loops=int(loops),
+                                              pad_begin=pad_begin,
+                                              pad_end=pad_end,
+                                              triggered=int(triggered),
+                                              execute=execute)
+
+        return self.create_multi_segments(waves_filename=waves_filename,
+                                          channel_num=channel_num,
+                                          pad_begin=pad_begin,
+                                          pad_end=pad_end,
+                                          loop=loop_sequence,
+                                          execute=execute)
+
+    # Function to compress repeated blocks of a waveform into looped segments
+    def create_compressed_segments(self,
+                                   wave_name: str,
+                                   wave_dict: dict,
+                                   num_loops: int = 0,
+                                   channel_num: int = 1,
+                                   pad_begin: int = 2047,
+                                   pad_end: int = 2047,
+                                   triggered: int = 1,
+                                   execute: bool = False) -> str:
+        """
+        Compile a waveform into the shortest program that plays it, instead of uploading every sample. If the
+        waveform is one block repeated (such as a clock train), only the block is written and it is looped with
+        CreateSingleSegment. If it is made of several distinct repeated blocks, each block is written once and
+        they are sequenced with a multi-wavefile and CreateSegments. The loops_limits, sequence_limit and
+        modulo 64 rules of the device are respected.
+
+        Parameters
+        ----------
+        wave_name : str
+            What to name the wavefiles. Do not include .txt. Blocks are saved as wave_name_{index}_{num_points}.txt
+            and the multi-wavefile as wave_name_{num_waves}.txt
+        wave_dict : dict
+            Waveform array dictionary of the form {1: 'ch1_waveform_array', 3: 'ch3_waveform_array'}, like
+            create_wave_file.
+        num_loops : int, optional
+            Number of times to play the whole waveform. Set to 0 for continuous looping, by default 0
+        channel_num : int, optional
+            CHANNEL NUMBER WILL ALWAYS BE 1 FOR THE DPG11, by default 1
+        pad_begin : int, optional
+            Vertical value that the waveform will begin at, by default 2047
+        pad_end : int, optional
+            Vertical value that the waveform will end at, by default 2047
+        triggered : int, optional
+            Triggered value of the single segment, or of the first segment of a multi-segment program. The other
+            segments follow on without a trigger, by default 1
+        execute : bool, optional
+            If true, creates an executes a single-line script with the segment command, by default False
+
+        Returns
+        -------
+        str
+            CreateSingleSegment or CreateSegments command string
+        """
+        if not (self.loops_limits[0] <= num_loops <= self.loops_limits[1]):
+            raise ValueError(f'num_loops is out of range ({self.loops_limits[0]} - {self.loops_limits[1]})')
+
+        words = pack_channels(wave_dict)
+        segments, loop_sequence = compress_repetitions(words,
+                                                       num_loops=num_loops,
+                                                       max_loops=self.loops_limits[1],
+                                                       max_segments=self.sequence_limit)
+
+        # Only the first segment waits for the trigger, the others follow on
+        return self.create_segments_from_words(wave_name,
+                                               words,
+                                               [(start, length, loops, triggered if i == 0 else 0)
+                                                for i, (start, length, loops) in enumerate(segments)],
+                                               loop_sequence=loop_sequence,
+                                               channel_num=channel_num,
+                                               pad_begin=pad_begin,
+                                               pad_end=pad_end,
+                                               execute=execute)
+
+    # Function to compile a nested sequence of blocks and repeats into segments
+    def create_sequence(self,
+                        name: str,
+                        sequence,
+                        channel_num: int = 1,
+                        pad_begin: int = 2047,
+                        pad_end: int = 2047,
+                        execute: bool = False) -> str:
+        """
+        Compile a nested sequence of Block and Repeat (from dpg11_pylib.driver.sequence) into segments and create
+        the wavefiles, the multi-wavefile if needed, and the segment command. Repeats of one segment become loop
+        counts and repeats of several segments are unrolled, so every Block is only written once. Repeats are
+        only expanded into samples when the program would not fit in sequence_limit segments otherwise.
+
+        Parameters
+        ----------
+        name : str
+            What to name the wavefiles. Do not include .txt. Blocks are saved as name_{index}_{num_points}.txt and
+            the multi-wavefile as name_{num_waves}.txt
+        sequence : Block | Repeat
+            The sequence to play, for example Repeat(10000, pulse, wait, Repeat(50, clock)). An outermost
+            Repeat with a count of 0 plays continuously.
+        channel_num : int, optional
+            CHANNEL NUMBER WILL ALWAYS BE 1 FOR THE DPG11, by default 1
+        pad_begin : int, optional
+            Vertical value that the waveform will begin at, by default 2047
+        pad_end : int, optional
+            Vertical value that the waveform will end at, by default 2047
+        execute : bool, optional
+            If true, creates an executes a single-line script with the segment command, by default False
+
+        Returns
+        -------
+        str
+            CreateSingleSegment or CreateSegments command string
+        """
+        segments, loop_sequence = compile_sequence(sequence,
+                                                   max_loops=self.loops_limits[1],
+                                                   max_segments=self.sequence_limit)
+
+        # Lay the distinct leaves out one after the other, so every leaf is a slice of the same words
+        leaf_starts = {}
+        leaves = []
+        num_points = 0
+        for leaf, _ in segments:
+            if id(leaf) not in leaf_starts:
+                leaf_starts[id(leaf)] = num_points
+                leaves.append(leaf)
+                num_points += len(leaf.words)
+        words = np.concatenate([leaf.words for leaf in leaves])
+
+        return self.create_segments_from_words(name,
+                                               words,
+                                               [(leaf_starts[id(leaf)], len(leaf.words), loops, leaf.triggered)
+                                                for leaf, loops in segments],
+                                               loop_sequence=loop_sequence,
+                                               channel_num=channel_num,
+                                               pad_begin=pad_begin,
+                                               pad_end=pad_end,
+                                               execute=execute)
+
+    # Function to check a multi-segment program against the limits of the device
+    def plan_program(self,
+                     filename_arr: list,
+                     num_loops_arr: list,
+                     triggered_arr: list,
+                     pad_begin: int = 2047,
+                     pad_end: int = 2047,
+                     loop: bool = False) -> ProgramPlan:
+        """
+        Check a program against the memory, segment, loop and pad limits of the device without writing anything.
+        The number of samples of each wavefile is read from its name, so the wavefiles do not need to exist yet.
+
+        Parameters
+        ----------
+        filename_arr : list
+            List of the wavefile names of the segments, one segment for a single segment program
+        num_loops_arr : list
+            List of the number of loops of each segment
+        triggered_arr : list
+            List of the triggered values of each segment
+        pad_begin : int, optional
+            Vertical value that the waveform will begin at, by default 2047
+        pad_end : int, optional
+            Vertical value that the waveform will end at, by default 2047
+        loop : bool, optional
+            If true, then the full multi-segment will loop, by default False
+
+        Returns
+        -------
+        ProgramPlan
+            What the program uses of each limit, see ProgramPlan.usage and ProgramPlan.problems
+        """
+        return ProgramPlan.from_files(filename_arr, num_loops_arr, triggered_arr,
+                                      loop_sequence=loop,
+                                      pad_begin=pad_begin,
+                                      pad_end=pad_end,
+                                      memory_limits=self.memory_limits,
+                                      loops_limits=self.loops_limits,
+                                      pad_limits=self.pad_limits,
+                                      sequence_limit=self.sequence_limit)
+
+    # Function to plan how a waveform is split into segments
+    def plan_segments(self,
+                      wave_dict: dict or np.ndarray,
+                      num_loops: int = 0,
+                      triggered: int = 1,
+                      pad_begin: int = 2047,
+                      pad_end: int = 2047,
+                      max_segment_points: int = None) -> ProgramPlan:
+        """
+        Plan the program that plays a waveform, split into several segments if it is longer than a segment can
+        hold (see split_segments), without writing anything.
+
+        Parameters
+        ----------
+        wave_dict : dict | np.ndarray
+            Waveform array dictionary like create_wave_file, or the already packed words.
+        num_loops : int, optional
+            Number of times to play the whole waveform. Set to 0 for continuous looping, by default 0
+        triggered : int, optional
+            Triggered value of the first segment. The other segments follow on without a trigger, by default 1
+        pad_begin : int, optional
+            Vertical value that the waveform will begin at, by default 2047
+        pad_end : int, optional
+            Vertical value that the waveform will end at, by default 2047
+        max_segment_points : int, optional
+            Maximum samples of a single segment. None uses the memory limit, by default None
+
+        Returns
+        -------
+        ProgramPlan
+            The plan, with the segments keyed by (start, length) of the slice of the packed words they play
+        """
+        words = pack_channels(wave_dict) if isinstance(wave_dict, dict) else np.asarray(wave_dict)
+        if max_segment_points is None:
+            max_segment_points = int(self.memory_limits[1])
+
+        segments, loop_sequence = split_segments(words,
+                                                 num_loops=num_loops,
+                                                 max_segment_points=max_segment_points,
+                                                 max_loops=self.loops_limits[1],
+                                                 max_segments=self.sequence_limit)
+        return ProgramPlan([((start, length), length, loops, triggered if i == 0 else 0)
+                            for i, (start, length, loops) in enumerate(segments)],
+                           loop_sequence=loop_sequence,
+                           pad_begin=pad_begin,
+                           pad_end=pad_end,
+                           memory_limits=self.memory_limits,
+                           loops_limits=self.loops_limits,
+                           pad_limits=self.pad_limits,
+                           sequence_limit=self.sequence_limit,
+                           max_segment_points=max_segment_points)
+
+    # Function to write a waveform as planned segments
+    def create_planned_segments(self,
+                                wave_name: str,
+                                wave_dict: dict,
+                                num_loops: int = 0,
+                                channel_num: int = 1,
+                                pad_begin: int = 2047,
+                                pad_end: int = 2047,
+                                triggered: int = 1,
+                                max_segment_points: int = None,
+                                execute: bool = False) -> str:
+        """
+        Plan the program of a waveform with plan_segments and, only if it fits on the device, write the wavefiles,
+        the multi-wavefile if needed, and create the segment command. A waveform longer than a segment can hold
+        is split into a CreateSegments program, and a program that does not fit raises a ValueError listing the
+        broken limits before any file is written.
+
+        Parameters
+        ----------
+        wave_name : str
+            What to name the wavefiles. Do not include .txt. Blocks are saved as wave_name_{index}_{num_points}.txt
+            and the multi-wavefile as wave_name_{num_waves}.txt
+        wave_dict : dict
+            Waveform array dictionary of the form {1: 'ch1_waveform_array', 3: 'ch3_waveform_array'}, like
+            create_wave_file.
+        num_loops : int, optional
+            Number of times to play the whole waveform. Set to 0 for continuous looping, by default 0
+        channel_num : int, optional
+            CHANNEL NUMBER WILL ALWAYS BE 1 FOR THE DPG11, by default 1
+        pad_begin : int, optional
+            Vertical value that the waveform will begin at, by default 2047
+        pad_end : int, optional
+            Vertical value that the waveform will end at, by default 2047
+        triggered : int, optional
+            Triggered value of the first segment, by default 1
+        max_segment_points : int, optional
+            Maximum samples of a single segment. None uses the memory limit, by default None
+        execute : bool, optional
+            If true, creates an executes a single-line script with the segment command, by default False
+
+        Returns
+        -------
+        str
+            CreateSingleSegment or CreateSegments command string
+        """
+        words = pack_channels(wave_dict)
+        plan = self.plan_segments(words,
+                                  num_loops=num_loops,
+                                  triggered=triggered,
+                                  pad_begin=pad_begin,
+                                  pad_end=pad_end,
+                                  max_segment_points=max_segment_points)
+        plan.check()
+
+        return self.create_segments_from_words(wave_name,
+                                               words,
+                                               [(start, length, loops, segment_triggered)
+                                                for (start, length), _, loops, segment_triggered in plan.segments],
+                                               loop_sequence=plan.loop_sequence,
+                                               channel_num=channel_num,
+                                               pad_begin=pad_begin,
+                                               pad_end=pad_end,
+                                               execute=execute)
 
     # Function to power down
     def pwr_dwn(self,
@@ -890,7 +1410,7 @@ class DPG11Device:
                                execute_after_creation=True,
                                overwrite_script=True,
                                save_script=False)
-        func_str
+        return func_str
 
     # Just for getting what the clock rate was last set to
     def get_clock_rate(self) -> float or int:
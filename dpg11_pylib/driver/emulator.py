@@ -0,0 +1,353 @@
+# Module for a local stand-in of the dax22000_GUI_64.exe that runs the dpg11 scripts
+import os
+import threading
+import time
+
+import numpy as np
+
+from dpg11_pylib.driver.batching import parse_command
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.waveforms.wavefile import read_wavefile_words
+
+
+class CardState:
+    """
+    State of a single emulated card, as set by the commands it received.
+    """
+
+    def __init__(self):
+        self.clock_rate = None
+        self.running = False
+        self.soft_trig = None
+        self.external_trigger = False
+        self.powered = True
+        self.channel_num = None
+        self.pad_begin = None
+        self.pad_end = None
+        # List of (wave_filename, words, num_loops, triggered) of the loaded segments
+        self.segments = []
+        # True if the loaded multi-segment program loops continuously
+        self.loop_sequence = False
+
+    def __repr__(self) -> str:
+        return (f'CardState(clock_rate={self.clock_rate}, running={self.running}, '
+                f'external_trigger={self.external_trigger}, powered={self.powered}, '
+                f'segments={[(segment[0], segment[2]) for segment in self.segments]})')
+
+
+class DAXGUIEmulator:
+    """
+    Pure Python stand-in for dax22000_GUI_64.exe, for benchmarking and testing without the hardware.
+
+    It watches the driver directory for dax_cmd.txt the same way the GUI does and, after a configurable latency,
+    runs the commands and consumes (deletes) the script. The commands are Run, Stop, SetClkRate,
+    CreateSingleSegment, CreateSegments, SelExtTrig and PWR_DWN. The wavefiles and multi-wavefiles are loaded and
+    checked against the limits of DPG11Device. Commands that the hardware would reject are recorded in errors
+    instead of changing the state.
+
+    Examples
+    --------
+    >>> with DAXGUIEmulator(driver_path, latency=0.01) as gui:
+    ...     device = DPG11Device(driver_path, script_timeout=1)
+    ...     device.run_single_wave(wave_filename, clock_rate=1e9)
+    ...     device.wait_for_script(1)
+    >>> gui.cards[1].running
+    True
+    """
+
+    def __init__(self,
+                 directory: str,
+                 latency: float = 0.0,
+                 poll_interval: float = 1e-3,
+                 create_executable: bool = True):
+        """
+        Parameters
+        ----------
+        directory : str
+            The driver directory to watch, the same as the driver_path of DPG11Device.
+        latency : float, optional
+            Time in seconds between seeing dax_cmd.txt and consuming it, by default 0.0
+        poll_interval : float, optional
+            Time in seconds between checks for dax_cmd.txt, by default 1e-3
+        create_executable : bool, optional
+            If True, an empty dax22000_GUI_64.exe is created in directory so DPG11Device accepts it, by default True
+        """
+        self.directory = directory
+        self.execute_path = os.path.join(directory, 'dax_cmd.txt')
+        self.latency = latency
+        self.poll_interval = poll_interval
+
+        if create_executable:
+            os.makedirs(directory, exist_ok=True)
+            executable_path = os.path.join(directory, 'dax22000_GUI_64.exe')
+            if not os.path.exists(executable_path):
+                open(executable_path, 'w').close()
+
+        self.cards = {}
+        # List of (time, command) of every command that was run
+        self.log = []
+        # List of (command, message) of every command that was rejected
+        self.errors = []
+        self.num_scripts = 0
+
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    # Watching the directory
+    def start(self):
+        """
+        Start watching the directory in a background thread.
+        """
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.watch, name='dax-gui-emulator', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop watching the directory.
+        """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def watch(self):
+        """
+        Consume scripts until stop() is called. Runs in the background thread.
+        """
+        while not self.stop_event.is_set():
+            if not self.process_pending():
+                time.sleep(self.poll_interval)
+
+    def process_pending(self) -> bool:
+        """
+        Consume and run dax_cmd.txt if it exists.
+
+        Returns
+        -------
+        bool
+            True if a script was run.
+        """
+        if not os.path.exists(self.execute_path):
+            return False
+        if self.latency:
+            time.sleep(self.latency)
+        with open(self.execute_path) as f:
+            script = f.read()
+        # The script is only removed once it has run, so a consumed script means the state is up to date
+        self.run_script(script)
+        os.remove(self.execute_path)
+        return True
+
+    # Running the commands
+    def card(self,
+             card_number: int) -> CardState:
+        """
+        Get the state of a card, creating it on first use.
+        """
+        if card_number not in self.cards:
+            self.cards[card_number] = CardState()
+        return self.cards[card_number]
+
+    def run_script(self,
+                   script: str):
+        """
+        Run every command of a script, in order.
+
+        Parameters
+        ----------
+        script : str
+            Text of the script, one command per line.
+        """
+        with self.lock:
+            self.num_scripts += 1
+            for command in script.splitlines():
+                if command.strip():
+                    self.run_command(command.strip())
+
+    def run_command(self,
+                    command: str):
+        """
+        Run a single command, recording it in the log, or in errors if it is rejected.
+
+        Parameters
+        ----------
+        command : str
+            The command string.
+        """
+        self.log.append((time.perf_counter(), command))
+        try:
+            name, card_number, args = parse_command(command)
+            handler = {'Run': self.command_run,
+                       'Stop': self.command_stop,
+                       'SetClkRate': self.command_set_clk_rate,
+                       'SelExtTrig': self.command_sel_ext_trig,
+                       'CreateSingleSegment': self.command_create_single_segment,
+                       'CreateSegments': self.command_create_segments,
+                       'PWR_DWN': self.command_pwr_dwn}.get(name)
+            if handler is None:
+                raise ValueError(f'Unknown command {name}')
+            handler(self.card(card_number), *args)
+        except (ValueError, TypeError, OSError) as error:
+            self.errors.append((command, str(error)))
+
+    def command_run(self, card, soft_trig):
+        if not card.segments:
+            raise ValueError('Run without any segments loaded')
+        card.running = True
+        card.soft_trig = parse_bool(soft_trig)
+
+    def command_stop(self, card):
+        card.running = False
+
+    def command_set_clk_rate(self, card, clock_rate):
+        clock_rate = int(clock_rate)
+        limits = DPG11Device.internal_clock_rate_limits_in_hz
+        if not limits[0] <= clock_rate <= limits[1]:
+            raise ValueError(f'Clock rate {clock_rate} is out of range ({limits[0]} - {limits[1]})')
+        card.clock_rate = clock_rate
+
+    def command_sel_ext_trig(self, card, trigger):
+        card.external_trigger = parse_bool(trigger)
+
+    def command_pwr_dwn(self, card):
+        card.running = False
+        card.powered = False
+
+    def command_create_single_segment(self, card, channel_num, num_points, num_loops, pad_begin, pad_end,
+                                      wave_filename, triggered):
+        channel_num, pad_begin, pad_end = self.check_channel_and_pads(channel_num, pad_begin, pad_end)
+        num_loops = self.check_loops(num_loops)
+        if int(triggered) not in [0, 1]:
+            raise ValueError(f'triggered must be 0 or 1 (Received {triggered})')
+        words = self.load_wavefile(wave_filename, int(num_points))
+        self.check_memory(len(words))
+
+        card.channel_num, card.pad_begin, card.pad_end = channel_num, pad_begin, pad_end
+        card.segments = [(wave_filename, words, num_loops, int(triggered))]
+        card.loop_sequence = False
+
+    def command_create_segments(self, card, channel_num, num_waves, pad_begin, pad_end, waves_filename, loop):
+        channel_num, pad_begin, pad_end = self.check_channel_and_pads(channel_num, pad_begin, pad_end)
+        with open(os.path.join(self.directory, waves_filename)) as f:
+            lines = [line.split() for line in f.read().splitlines() if line.strip()]
+        if len(lines) != int(num_waves):
+            raise ValueError(f'{waves_filename} has {len(lines)} waves, expected {num_waves}')
+        if len(lines) > DPG11Device.sequence_limit:
+            raise ValueError(f'{len(lines)} segments is more than the limit of {DPG11Device.sequence_limit}')
+
+        segments = []
+        for wave_filename, num_points, num_loops, triggered in lines:
+            words = self.load_wavefile(wave_filename, int(num_points))
+            segments.append((wave_filename, words, self.check_loops(num_loops), int(triggered)))
+        # Each distinct wavefile is only stored once
+        self.check_memory(sum(len(words) for _, words, _, _ in {segment[0]: segment
+                                                                 for segment in segments}.values()))
+
+        card.channel_num, card.pad_begin, card.pad_end = channel_num, pad_begin, pad_end
+        card.segments = segments
+        card.loop_sequence = parse_bool(loop)
+
+    # Checks
+    def check_channel_and_pads(self, channel_num, pad_begin, pad_end) -> (int, int, int):
+        channel_num, pad_begin, pad_end = int(channel_num), int(pad_begin), int(pad_end)
+        if channel_num not in DPG11Device.device_output_channels:
+            raise ValueError(f'Output channel number {channel_num} is not in range (1 - 11)')
+        for pad in [pad_begin, pad_end]:
+            if not DPG11Device.pad_limits[0] <= pad <= DPG11Device.pad_limits[1]:
+                raise ValueError(f'Pad {pad} is out of range (0 - 4095)')
+        return channel_num, pad_begin, pad_end
+
+    def check_loops(self, num_loops) -> int:
+        num_loops = int(num_loops)
+        if not DPG11Device.loops_limits[0] <= num_loops <= DPG11Device.loops_limits[1]:
+            raise ValueError(f'num_loops {num_loops} is out of range (0 - {DPG11Device.loops_limits[1]})')
+        return num_loops
+
+    def check_memory(self, num_points: int):
+        if num_points > DPG11Device.memory_limits[1]:
+            raise ValueError(f'{num_points} samples is more than the memory limit '
+                             f'of {int(DPG11Device.memory_limits[1])}')
+
+    def load_wavefile(self,
+                      wave_filename: str,
+                      num_points: int) -> np.ndarray:
+        """
+        Load and check a wavefile.
+
+        Parameters
+        ----------
+        wave_filename : str
+            Filename of the wavefile relative to the directory.
+        num_points : int
+            Number of points the command says the wavefile has.
+
+        Returns
+        -------
+        np.ndarray
+            uint16 words of the wavefile.
+        """
+        words = read_wavefile_words(os.path.join(self.directory, wave_filename))
+        if len(words) != num_points:
+            raise ValueError(f'{wave_filename} has {len(words)} points, expected {num_points}')
+        if num_points < DPG11Device.memory_limits[0] or num_points % 64 != 0:
+            raise ValueError(f'{wave_filename} has {num_points} points, which must be modulo 64')
+        return words
+
+    # Output
+    def output_stream(self,
+                      card_number: int = 1,
+                      max_points: int = None) -> np.ndarray:
+        """
+        Get the words the card would output for one pass of its loaded program, with every segment repeated by its
+        number of loops. A segment with 0 loops plays continuously and is included once.
+
+        Parameters
+        ----------
+        card_number : int, optional
+            The card, by default 1
+        max_points : int, optional
+            If given, raise a ValueError instead of expanding a program longer than this, by default None
+
+        Returns
+        -------
+        np.ndarray
+            uint16 words of the output.
+        """
+        with self.lock:
+            segments = list(self.card(card_number).segments)
+        total = sum(len(words) * max(num_loops, 1) for _, words, num_loops, _ in segments)
+        if max_points is not None and total > max_points:
+            raise ValueError(f'The program is {total} points long, more than max_points={max_points}')
+        if not segments:
+            return np.zeros(0, dtype=np.uint16)
+        return np.concatenate([np.tile(words, max(num_loops, 1)) for _, words, num_loops, _ in segments])
+
+    def check(self):
+        """
+        Raise a ValueError if any command was rejected.
+        """
+        if self.errors:
+            raise ValueError('Rejected commands:\n' + '\n'.join(f'{command}: {message}'
+                                                                 for command, message in self.errors))
+
+
+# Function to parse the true/false arguments of the commands
+def parse_bool(value: str) -> bool:
+    """
+    Parse a 'true' or 'false' command argument.
+    """
+    if value.lower() not in ['true', 'false']:
+        raise ValueError(f'Expected true or false (Received {value})')
+    return value.lower() == 'true'
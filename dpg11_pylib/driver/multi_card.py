@@ -0,0 +1,381 @@
+# Module for driving several dpg11 cards on the same driver as one logical device
+import contextlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dpg11_pylib.driver.batching import parse_command
+from dpg11_pylib.driver.cache import WavefileCache
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.waveforms.packing import channel_dict_length, pack_channels
+
+# Number of output channels of each card
+CHANNELS_PER_CARD = len(DPG11Device.device_output_channels)
+
+
+class MultiCardDevice:
+    """
+    Several dpg11 cards driven by the same GUI as one logical device with CHANNELS_PER_CARD channels per card.
+    Logical channel c is channel (c - 1) % CHANNELS_PER_CARD + 1 of the (c - 1) // CHANNELS_PER_CARD-th card, so
+    with cards 1 and 2, channels 1 to 11 are on card 1 and channels 12 to 22 are on card 2.
+
+    The wavefiles of the cards are packed and written in parallel threads, and the configuration of every card is
+    sent as a single script that ends with the Run commands of all of the cards back to back, so the cards start
+    as close together as the GUI can run consecutive commands. run_skew measures that spread from a command log,
+    such as the log of a DAXGUIEmulator.
+
+    The cards share the transport, the shadow state and the wavefile cache, since they share the driver directory
+    and dax_cmd.txt.
+
+    Examples
+    --------
+    >>> cards = MultiCardDevice(driver_path, card_numbers=[1, 2])
+    >>> wave_filenames = cards.create_wave_files('odmr', {1: rf, 2: clock, 12: trigger, 14: laser})
+    >>> cards.program(wave_filenames, clock_rate=1e9)
+    """
+
+    def __init__(self,
+                 driver_path: str,
+                 card_numbers: list = (1, 2),
+                 transport=None,
+                 wavefile_cache_size=None,
+                 script_timeout=None,
+                 skip_redundant_commands: bool = False,
+                 max_workers: int = None):
+        """
+        Parameters
+        ----------
+        driver_path : str
+            Path of the driver directory, see DPG11Device.
+        card_numbers : list, optional
+            Card numbers of the cards, in the order of their logical channels, by default (1, 2)
+        transport : optional
+            Transport of the cards, see DPG11Device. None uses a FileTransport, by default None
+        wavefile_cache_size : optional
+            Size of the wavefile cache shared by the cards, see DPG11Device, by default None
+        script_timeout : optional
+            See DPG11Device, by default None
+        skip_redundant_commands : bool, optional
+            See DPG11Device, by default False
+        max_workers : int, optional
+            Number of threads that pack and write the wavefiles. None uses one per card, by default None
+        """
+        card_numbers = [int(card_number) for card_number in card_numbers]
+        if len(card_numbers) == 0:
+            raise ValueError('card_numbers must contain at least one card')
+        if len(set(card_numbers)) != len(card_numbers):
+            raise ValueError(f'card_numbers must not repeat (Received {card_numbers})')
+
+        first = DPG11Device(driver_path,
+                            card_number=card_numbers[0],
+                            wavefile_cache_size=wavefile_cache_size,
+                            script_timeout=script_timeout,
+                            transport=transport,
+                            skip_redundant_commands=skip_redundant_commands)
+        self.devices = {card_numbers[0]: first}
+        for card_number in card_numbers[1:]:
+            device = DPG11Device(driver_path,
+                                 card_number=card_number,
+                                 script_timeout=script_timeout,
+                                 transport=first.transport,
+                                 skip_redundant_commands=skip_redundant_commands)
+            # The cards share the directory, so they share what is known about it
+            device.state = first.state
+            device.wavefile_cache = first.wavefile_cache
+            self.devices[card_number] = device
+
+        self.directory = driver_path
+        self.transport = first.transport
+        self.state = first.state
+        self.wavefile_cache = first.wavefile_cache
+        self.max_workers = max_workers or len(card_numbers)
+
+    @property
+    def card_numbers(self) -> list:
+        return list(self.devices)
+
+    @property
+    def num_channels(self) -> int:
+        return CHANNELS_PER_CARD * len(self.devices)
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __getitem__(self, card_number: int) -> DPG11Device:
+        return self.devices[card_number]
+
+    def __repr__(self) -> str:
+        return f'MultiCardDevice(card_numbers={self.card_numbers}, num_channels={self.num_channels})'
+
+    # Mapping the logical channels onto the cards
+    def card_channel(self,
+                     channel: int) -> (int, int):
+        """
+        Get the card number and the channel on that card of a logical channel.
+        """
+        channel = int(channel)
+        if not 1 <= channel <= self.num_channels:
+            raise ValueError(f'Channel numbers must be between 1 and {self.num_channels} (Received {channel})')
+        index, card_channel = divmod(channel - 1, CHANNELS_PER_CARD)
+        return self.card_numbers[index], card_channel + 1
+
+    def split_channels(self,
+                       wave_dict: dict) -> dict:
+        """
+        Split a waveform dictionary of logical channels into one waveform dictionary per card.
+
+        Parameters
+        ----------
+        wave_dict : dict
+            Waveform dictionary of the form {1: ch1_waveform_array, 14: ch14_waveform_array}.
+
+        Returns
+        -------
+        dict
+            {card_number: wave_dict} with the channels of each card numbered from 1. Cards with no channels get
+            an empty dictionary.
+        """
+        card_dicts = {card_number: {} for card_number in self.devices}
+        for channel, waveform in wave_dict.items():
+            card_number, card_channel = self.card_channel(channel)
+            card_dicts[card_number][card_channel] = waveform
+        return card_dicts
+
+    # Creating the wavefiles
+    def create_wave_files(self,
+                          wave_name: str,
+                          wave_dict: dict) -> dict:
+        """
+        Create the wavefile of every card from a waveform dictionary of logical channels. Packing, hashing and
+        writing the wavefiles runs in parallel threads, one card per thread. Cards with no channels get a
+        wavefile with every channel off, so all of the cards play the same number of samples.
+
+        Parameters
+        ----------
+        wave_name : str
+            What to name the wavefiles. Do not include .txt. The wavefile of each card is named
+            wave_name_card{card_number} followed by the usual suffix of create_wave_file.
+        wave_dict : dict
+            Waveform dictionary of the form {1: ch1_waveform_array, 14: ch14_waveform_array}.
+
+        Returns
+        -------
+        dict
+            {card_number: wave_filename} of every card.
+        """
+        if ' ' in wave_name:
+            raise ValueError(
+                'wave_name cannot include any spaces (Recieved ' + wave_name
+            )
+
+        num_points = channel_dict_length(wave_dict)
+        if num_points % 64 != 0:
+            raise ValueError('Length of waveform_array must be modulo 64')
+
+        card_dicts = self.split_channels(wave_dict)
+        use_digest = self.wavefile_cache is not None or any(device.skip_redundant_commands
+                                                           for device in self.devices.values())
+
+        def pack(card_number):
+            card_dict = card_dicts[card_number] or {1: np.zeros(num_points, dtype=np.uint8)}
+            words = pack_channels(card_dict, num_points)
+            return words, WavefileCache.digest(words) if use_digest else None
+
+        # The wavefiles of the cards are pinned in the cache together, so adding one never evicts another
+        pinned = contextlib.nullcontext() if self.wavefile_cache is None else self.wavefile_cache.pinned_files()
+        with pinned:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                packed = dict(zip(self.devices, executor.map(pack, self.devices)))
+
+                # Name the files and find the ones that are already on disk before writing the rest in parallel
+                wave_filenames = {}
+                to_write = []
+                for card_number, (words, digest) in packed.items():
+                    card_wave_name = f'{wave_name}_card{card_number}'
+                    if self.wavefile_cache is None:
+                        wave_filenames[card_number] = f'wavefiles/{card_wave_name}_{num_points}.txt'
+                        to_write.append(card_number)
+                        continue
+                    cached_filename = self.wavefile_cache.lookup(digest)
+                    if cached_filename is None:
+                        cached_filename = self.wavefile_cache.filename('wavefiles', card_wave_name, digest, num_points)
+                        to_write.append(card_number)
+                    wave_filenames[card_number] = cached_filename
+
+                list(executor.map(lambda card_number: self.transport.write_wavefile(
+                    self.directory + '/' + wave_filenames[card_number], packed[card_number][0]), to_write))
+
+            for card_number, (_, digest) in packed.items():
+                self.state.file_written(wave_filenames[card_number], digest)
+                if self.wavefile_cache is not None and card_number in to_write:
+                    self.wavefile_cache.add(digest, wave_filenames[card_number])
+
+        return wave_filenames
+
+    # Building and sending the commands
+    def configuration_commands(self,
+                               wave_filenames: dict,
+                               clock_rate: float = None,
+                               **segment_kwargs) -> dict:
+        """
+        Get the commands that configure every card, without running them.
+
+        Parameters
+        ----------
+        wave_filenames : dict
+            {card_number: wave_filename} as returned by create_wave_files.
+        clock_rate : float, optional
+            If given, each card is stopped and set to this clock rate before loading its segment, by default None
+        **segment_kwargs
+            Keyword arguments of DPG11Device.create_single_segment, such as num_loops or triggered.
+
+        Returns
+        -------
+        dict
+            {card_number: command_list} of every card.
+        """
+        card_commands = {}
+        for card_number, wave_filename in wave_filenames.items():
+            device = self.devices[card_number]
+            command_list = []
+            if clock_rate is not None:
+                command_list += [device.stop(), device.set_clk_rate(clock_rate=clock_rate)]
+            command_list.append(device.create_single_segment(wave_filename=wave_filename, **segment_kwargs))
+            card_commands[card_number] = command_list
+        return card_commands
+
+    def send_commands(self,
+                      command_list: list,
+                      script_name: str = 'temp_multi_card',
+                      save_script: bool = False):
+        """
+        Send the commands of any of the cards as a single script. See DPG11Device.create_script.
+        """
+        first = self.devices[self.card_numbers[0]]
+        return first.create_script(command_list=command_list,
+                                   script_name=script_name,
+                                   execute_after_creation=True,
+                                   overwrite_script=True,
+                                   save_script=save_script)
+
+    def program(self,
+                wave_filenames: dict,
+                clock_rate: float = None,
+                run: bool = True,
+                soft_trig: bool = True,
+                script_name: str = 'temp_multi_card',
+                save_script: bool = False,
+                **segment_kwargs):
+        """
+        Configure every card, and start them if run is True, with a single script. The configuration of each card
+        is kept together, and the Run commands of all of the cards come last and back to back.
+
+        Parameters
+        ----------
+        wave_filenames : dict
+            {card_number: wave_filename} as returned by create_wave_files.
+        clock_rate : float, optional
+            If given, each card is stopped and set to this clock rate first, by default None
+        run : bool, optional
+            If True, the script ends with a Run command for every card, by default True
+        soft_trig : bool, optional
+            soft_trig of the Run commands, by default True
+        script_name : str, optional
+            What to name the script .txt file, by default 'temp_multi_card'
+        save_script : bool, optional
+            If True, then the script will be saved after execution, by default False
+        **segment_kwargs
+            Keyword arguments of DPG11Device.create_single_segment, such as num_loops or triggered.
+
+        Returns
+        -------
+        str or int
+            The return value of DPG11Device.create_script.
+        """
+        command_list = []
+        for card_commands in self.configuration_commands(wave_filenames, clock_rate, **segment_kwargs).values():
+            command_list += card_commands
+        if run:
+            command_list += [self.devices[card_number].run(soft_trig) for card_number in wave_filenames]
+        return self.send_commands(command_list, script_name=script_name, save_script=save_script)
+
+    def run(self,
+            soft_trig: bool = True):
+        """
+        Start every card with a single script of back to back Run commands.
+        """
+        return self.send_commands([device.run(soft_trig) for device in self.devices.values()])
+
+    def stop(self):
+        """
+        Stop every card with a single script.
+        """
+        return self.send_commands([device.stop() for device in self.devices.values()])
+
+    def run_wave_dict(self,
+                      wave_name: str,
+                      wave_dict: dict,
+                      clock_rate: float,
+                      soft_trig: bool = True,
+                      **segment_kwargs) -> dict:
+        """
+        Create the wavefiles of a waveform dictionary of logical channels, then configure and start every card
+        with a single script.
+
+        Returns
+        -------
+        dict
+            {card_number: wave_filename} of every card.
+        """
+        wave_filenames = self.create_wave_files(wave_name, wave_dict)
+        self.program(wave_filenames, clock_rate=clock_rate, run=True, soft_trig=soft_trig, **segment_kwargs)
+        return wave_filenames
+
+    def shut_down(self):
+        """
+        Stop and power down every card with a single script, then close the API.
+        """
+        command_list = [device.stop() for device in self.devices.values()]
+        command_list += [device.pwr_dwn() for device in self.devices.values()]
+        self.send_commands(command_list)
+        # Wait for the GUI to read the script before closing it, like DPG11Device.shut_down
+        first = self.devices[self.card_numbers[0]]
+        if first.script_timeout is not None:
+            first.wait_for_script(first.script_timeout)
+        else:
+            time.sleep(self.transport.close_delay)
+        first.close_api()
+
+
+# Function to measure the spread between the Run commands of several cards
+def run_skew(log: list,
+             card_numbers: list = None) -> float:
+    """
+    Get the time between the first and the last card starting, from the last Run command of each card in a
+    command log.
+
+    Parameters
+    ----------
+    log : list
+        List of (time, command) tuples, such as the log of a DAXGUIEmulator or a MemoryTransport.
+    card_numbers : list, optional
+        Cards to include. Default is None, which includes every card with a Run command in the log.
+
+    Returns
+    -------
+    float
+        The skew in the units of the log times, 0.0 if fewer than two cards were started.
+    """
+    run_times = {}
+    for command_time, command in log:
+        name, card_number, _ = parse_command(command)
+        if name == 'Run' and (card_numbers is None or card_number in card_numbers):
+            run_times[card_number] = command_time
+    if card_numbers is not None:
+        missing = [card_number for card_number in card_numbers if card_number not in run_times]
+        if missing:
+            raise ValueError(f'No Run command in the log for cards {missing}')
+    if len(run_times) < 2:
+        return 0.0
+    return max(run_times.values()) - min(run_times.values())
@@ -0,0 +1,298 @@
+# Module for checking dpg11 programs against the memory, segment, loop and pad limits before anything is written
+import hashlib
+import os
+
+import numpy as np
+
+from dpg11_pylib.driver.compress import BLOCK_MULTIPLE, find_period, split_loops
+
+
+class ProgramPlan:
+    """
+    A proposed single or multi-segment program and how much of the limits of the device it uses: stored samples
+    against the memory limits, segments against the sequence limit, and loops and pads against their limits.
+    Segments that play the same stored waveform only count once towards the memory.
+
+    Each segment is a tuple (key, num_points, num_loops, triggered), where key identifies the stored waveform,
+    such as its wavefile name, or (start, length) of a slice of the packed words for a plan from split_segments.
+
+    Examples
+    --------
+    >>> plan = device.plan_program(['wavefiles/a_4096.txt', 'wavefiles/b_64.txt'], [1, 100], [1, 0])
+    >>> plan.fits
+    True
+    >>> print(plan)
+    """
+
+    def __init__(self,
+                 segments: list,
+                 loop_sequence: bool = False,
+                 pad_begin: int = 2047,
+                 pad_end: int = 2047,
+                 memory_limits: list = (48, 8e6),
+                 loops_limits: list = (0, 2 ** 16 - 2),
+                 pad_limits: list = (0, 2 ** 12 - 1),
+                 sequence_limit: int = 60,
+                 max_segment_points: int = None):
+        """
+        Parameters
+        ----------
+        segments : list
+            List of (key, num_points, num_loops, triggered) tuples, in the order they are played.
+        loop_sequence : bool, optional
+            If True, the segments are played continuously, by default False
+        pad_begin : int, optional
+            Pad value the program starts at, by default 2047
+        pad_end : int, optional
+            Pad value the program ends at, by default 2047
+        memory_limits : list, optional
+            Minimum samples of a segment and maximum samples stored in total, by default (48, 8e6)
+        loops_limits : list, optional
+            Minimum and maximum loops of a segment, by default (0, 65534)
+        pad_limits : list, optional
+            Minimum and maximum pad values, by default (0, 4095)
+        sequence_limit : int, optional
+            Maximum number of segments of a multi-segment program, by default 60
+        max_segment_points : int, optional
+            Maximum samples of a single segment. None uses the maximum of memory_limits, by default None
+        """
+        self.segments = [(key, int(num_points), int(num_loops), int(triggered))
+                         for key, num_points, num_loops, triggered in segments]
+        self.loop_sequence = loop_sequence
+        self.pad_begin = pad_begin
+        self.pad_end = pad_end
+        self.memory_limits = memory_limits
+        self.loops_limits = loops_limits
+        self.pad_limits = pad_limits
+        self.sequence_limit = sequence_limit
+        self.max_segment_points = int(memory_limits[1] if max_segment_points is None else max_segment_points)
+
+    @classmethod
+    def from_files(cls,
+                   filename_arr: list,
+                   num_loops_arr: list,
+                   triggered_arr: list,
+                   **kwargs):
+        """
+        Plan of a program from the lists that go into a multi-wavefile, see DPG11Device.create_multi_wave_file.
+        The number of samples of each wavefile is read from its name, so no file needs to exist.
+        """
+        if not len(filename_arr) == len(num_loops_arr) == len(triggered_arr):
+            raise ValueError('filename_arr, num_loops_arr and triggered_arr must be the same length')
+        segments = [(filename, num_points_from_filename(filename), num_loops, triggered)
+                    for filename, num_loops, triggered in zip(filename_arr, num_loops_arr, triggered_arr)]
+        return cls(segments, **kwargs)
+
+    @property
+    def num_segments(self) -> int:
+        return len(self.segments)
+
+    @property
+    def stored_points(self) -> int:
+        """
+        Samples stored on the card, counting each distinct waveform once.
+        """
+        return sum({key: num_points for key, num_points, _, _ in self.segments}.values())
+
+    @property
+    def played_points(self) -> int or None:
+        """
+        Samples played by one pass through the program, None if a segment loops continuously.
+        """
+        if any(num_loops == 0 for _, _, num_loops, _ in self.segments):
+            return None
+        return sum(num_points * num_loops for _, num_points, num_loops, _ in self.segments)
+
+    def usage(self) -> dict:
+        """
+        Get what the program uses of each limit.
+
+        Returns
+        -------
+        dict
+            {name: (used, limit)} for 'memory' (stored samples), 'segment_points' (largest segment), 'segments',
+            'loops' (most loops of a segment) and 'pads' (largest pad value).
+        """
+        segment_points = max((num_points for _, num_points, _, _ in self.segments), default=0)
+        loops = max((num_loops for _, _, num_loops, _ in self.segments), default=0)
+        return {'memory': (self.stored_points, int(self.memory_limits[1])),
+                'segment_points': (segment_points, self.max_segment_points),
+                'segments': (self.num_segments, self.sequence_limit),
+                'loops': (loops, self.loops_limits[1]),
+                'pads': (max(self.pad_begin, self.pad_end), self.pad_limits[1])}
+
+    def problems(self) -> list:
+        """
+        Get every reason the device would reject the program.
+
+        Returns
+        -------
+        list
+            Messages of the limits that are broken, empty if the program fits.
+        """
+        problems = []
+        if self.num_segments == 0:
+            problems.append('The program has no segments')
+        if self.num_segments > self.sequence_limit:
+            problems.append(f'{self.num_segments} segments is more than the limit of {self.sequence_limit}')
+        if self.stored_points > self.memory_limits[1]:
+            problems.append(f'{self.stored_points} samples is more than the memory limit of '
+                            f'{int(self.memory_limits[1])}')
+        for index, (key, num_points, num_loops, triggered) in enumerate(self.segments):
+            if num_points % BLOCK_MULTIPLE != 0:
+                problems.append(f'Segment {index} ({key}) has {num_points} samples, which is not modulo '
+                                f'{BLOCK_MULTIPLE}')
+            if num_points < self.memory_limits[0]:
+                problems.append(f'Segment {index} ({key}) has {num_points} samples, fewer than the minimum of '
+                                f'{int(self.memory_limits[0])}')
+            if num_points > self.max_segment_points:
+                problems.append(f'Segment {index} ({key}) has {num_points} samples, more than a segment can hold '
+                                f'({self.max_segment_points})')
+            if not self.loops_limits[0] <= num_loops <= self.loops_limits[1]:
+                problems.append(f'Segment {index} ({key}) loops {num_loops} times, out of range '
+                                f'({self.loops_limits[0]} - {self.loops_limits[1]})')
+            if triggered not in [0, 1]:
+                problems.append(f'Segment {index} ({key}) has triggered {triggered}, which must be 0 or 1')
+        for name, pad in [('pad_begin', self.pad_begin), ('pad_end', self.pad_end)]:
+            if not self.pad_limits[0] <= pad <= self.pad_limits[1]:
+                problems.append(f'{name} {pad} is out of range ({self.pad_limits[0]} - {self.pad_limits[1]})')
+        return problems
+
+    @property
+    def fits(self) -> bool:
+        return len(self.problems()) == 0
+
+    def check(self):
+        """
+        Raise a ValueError listing every limit the program breaks, if it does not fit.
+        """
+        problems = self.problems()
+        if problems:
+            raise ValueError('The program does not fit on the device:\n' + '\n'.join(problems))
+
+    def __repr__(self) -> str:
+        return (f'ProgramPlan(num_segments={self.num_segments}, stored_points={self.stored_points}, '
+                f'loop_sequence={self.loop_sequence}, fits={self.fits})')
+
+    def __str__(self) -> str:
+        lines = [f'{"limit":>14} {"used":>10} {"max":>10}']
+        for name, (used, limit) in self.usage().items():
+            lines.append(f'{name:>14} {used:>10} {limit:>10}')
+        lines += self.problems()
+        return '\n'.join(lines)
+
+
+# Function to get the number of samples of a wavefile from its name
+def num_points_from_filename(filename: str) -> int:
+    """
+    Get the number after the last underscore of a wavefile name, such as 4096 for wavefiles/test_4096.txt.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        return int(stem.split('_')[-1])
+    except ValueError:
+        raise ValueError(f'Filename does not end in the number of samples (Received {filename})')
+
+
+# Function to split a long waveform into segments that fit the device
+def split_segments(words: np.ndarray,
+                   num_loops: int = 0,
+                   max_segment_points: int = 8000000,
+                   max_loops: int = 2 ** 16 - 2,
+                   max_segments: int = 60,
+                   block_multiple: int = BLOCK_MULTIPLE) -> (list, bool):
+    """
+    Split a waveform into blocks of at most max_segment_points samples, to be played as a multi-segment program.
+    Blocks with the same words are stored once, and a block that repeats back to back becomes one looped
+    segment. A periodic waveform is split on whole periods, so it becomes a single looped segment. A waveform
+    that fits in one segment is returned as a single segment.
+
+    Only a continuous program can loop the whole list of segments, so a waveform of several blocks that is
+    played a finite number of times has its segments written out once per play, with the last block of each
+    play looped into the first block of the next one when they are the same block.
+
+    Parameters
+    ----------
+    words : np.ndarray
+        Packed words of the waveform. The length must be modulo block_multiple.
+    num_loops : int, optional
+        Number of times the whole waveform is played. 0 plays it continuously, by default 0
+    max_segment_points : int, optional
+        Maximum samples of a segment, by default 8000000
+    max_loops : int, optional
+        Maximum number of loops of a single segment, by default 65534
+    max_segments : int, optional
+        Maximum number of segments of the program once the plays are written out, by default 60
+    block_multiple : int, optional
+        Every segment must be a multiple of this many samples, by default 64
+
+    Returns
+    -------
+    segments : list
+        List of (start, length, loops) tuples to be played in order, meaning words[start:start + length] is
+        played loops times, like compress_repetitions. loops is 0 for a single segment that plays continuously.
+    loop_sequence : bool
+        If True, the whole list of segments has to be looped continuously.
+
+    Raises
+    ------
+    ValueError
+        If a waveform of several blocks played num_loops times needs more than max_segments segments.
+    """
+    words = np.asarray(words)
+    num_points = len(words)
+    if num_points == 0 or num_points % block_multiple != 0:
+        raise ValueError(f'Length of the waveform must be a nonzero multiple of {block_multiple} '
+                         f'(Received {num_points})')
+    block_size = (int(max_segment_points) // block_multiple) * block_multiple
+    if block_size == 0:
+        raise ValueError(f'max_segment_points must be at least {block_multiple} (Received {max_segment_points})')
+
+    # A periodic waveform is split on whole periods, so every block is the same and only one is stored
+    if num_points > block_size:
+        period = find_period(words, block_multiple)
+        if period <= block_size and period < num_points:
+            repeats = num_points // period
+            block_size = period * max(k for k in range(1, block_size // period + 1) if repeats % k == 0)
+
+    # Runs of [start, length, count], where start is the first block with the same words
+    runs = []
+    first_starts = {}
+    for start in range(0, num_points, block_size):
+        block = words[start:start + block_size]
+        key = (len(block), hashlib.blake2b(block.tobytes(), digest_size=16).digest())
+        first = first_starts.setdefault(key, start)
+        if first != start and not np.array_equal(words[first:first + len(block)], block):
+            first = start
+        if runs and runs[-1][0] == first and runs[-1][1] == len(block):
+            runs[-1][2] += 1
+        else:
+            runs.append([first, len(block), 1])
+
+    # One block played over and over is a single looped segment
+    if len(runs) == 1:
+        start, length, count = runs[0]
+        if num_loops == 0:
+            return [(start, length, 0)], False
+        return split_loops([(start, length, count * num_loops)], max_loops), False
+
+    runs = [tuple(run) for run in runs]
+    if num_loops == 0:
+        return split_loops(runs, max_loops), True
+
+    # Write the runs out once per play, checking the number of segments before building them
+    merge = runs[0][:2] == runs[-1][:2]
+    num_runs = len(runs) * num_loops - (num_loops - 1 if merge else 0)
+    if num_runs > max_segments:
+        raise ValueError(f'The waveform is {len(runs)} different segments, so playing it {num_loops} times needs '
+                         f'{num_runs} segments, more than the limit of {max_segments}. Play it continuously '
+                         f'with num_loops=0, or describe it as a Repeat for create_sequence')
+    unrolled = list(runs)
+    for _ in range(num_loops - 1):
+        if merge:
+            start, length, count = unrolled.pop()
+            unrolled.append((start, length, count + runs[0][2]))
+            unrolled += runs[1:]
+        else:
+            unrolled += runs
+    return split_loops(unrolled, max_loops), False
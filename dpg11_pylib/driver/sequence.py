@@ -0,0 +1,235 @@
+# Module for describing dpg11 programs as nested repeated blocks and compiling them to segments
+import numpy as np
+
+from dpg11_pylib.driver.compress import split_loops
+from dpg11_pylib.waveforms.packing import pack_channels
+
+
+class Block:
+    """
+    A waveform on one or more channels that is played as a whole, the leaf of a sequence.
+    """
+
+    def __init__(self,
+                 wave_dict: dict,
+                 triggered: int = 0):
+        """
+        Parameters
+        ----------
+        wave_dict : dict
+            Waveform array dictionary of the form {1: 'ch1_waveform_array', 3: 'ch3_waveform_array'}, like
+            DPG11Device.create_wave_file. The length must be modulo 64.
+        triggered : int, optional
+            Triggered value of the segment that plays this block, by default 0
+        """
+        self.wave_dict = wave_dict
+        self.triggered = triggered
+        self.words = pack_channels(wave_dict)
+        if len(self.words) == 0 or len(self.words) % 64 != 0:
+            raise ValueError(f'Length of a Block must be a nonzero multiple of 64 (Received {len(self.words)})')
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __repr__(self) -> str:
+        return f'Block(num_points={len(self.words)}, channels={sorted(self.wave_dict.keys())})'
+
+
+class Repeat:
+    """
+    A list of blocks and repeats that is played count times in a row.
+
+    Examples
+    --------
+    Repeat 10000 times a pulse, a wait, and 50 clock cycles:
+
+    >>> program = Repeat(10000, pulse, wait, Repeat(50, clock))
+
+    A count of 0 plays the sequence continuously, which is only allowed for the outermost Repeat.
+    """
+
+    def __init__(self,
+                 count: int,
+                 *children):
+        """
+        Parameters
+        ----------
+        count : int
+            Number of times to play the children. 0 plays them continuously.
+        *children : Block | Repeat
+            What to play, in order.
+        """
+        if count < 0:
+            raise ValueError('count must not be negative')
+        if len(children) == 0:
+            raise ValueError('Repeat needs at least one child')
+        for child in children:
+            if not isinstance(child, (Block, Repeat)):
+                raise TypeError(f'Children of Repeat must be Block or Repeat (Received {type(child)})')
+            if isinstance(child, Repeat) and child.count == 0:
+                raise ValueError('Only the outermost Repeat can play continuously')
+        self.count = count
+        self.children = children
+
+    def __len__(self) -> int:
+        return max(self.count, 1) * sum(len(child) for child in self.children)
+
+    def __repr__(self) -> str:
+        return f'Repeat({self.count}, {", ".join(repr(child) for child in self.children)})'
+
+    def body_words(self) -> np.ndarray:
+        """
+        Packed words of one pass through the children, with every inner repeat expanded.
+        """
+        parts = []
+        for child in self.children:
+            if isinstance(child, Block):
+                parts.append(child.words)
+            else:
+                parts.append(np.tile(child.body_words(), child.count))
+        return np.concatenate(parts)
+
+    def inner_repeats(self) -> list:
+        """
+        Every Repeat inside this one, innermost first.
+        """
+        repeats = []
+        for child in self.children:
+            if isinstance(child, Repeat):
+                repeats.extend(child.inner_repeats())
+                repeats.append(child)
+        return repeats
+
+
+class FlattenedRepeat:
+    """
+    A Repeat whose body could not be expressed as segments and is written as a single block.
+    """
+
+    def __init__(self,
+                 repeat: Repeat):
+        self.repeat = repeat
+        self.words = repeat.body_words()
+        self.triggered = first_block(repeat).triggered
+
+
+# Function to get the first block of a sequence
+def first_block(node: Block or Repeat) -> Block:
+    """
+    Get the first block that is played by a sequence.
+    """
+    while isinstance(node, Repeat):
+        node = node.children[0]
+    return node
+
+
+# Function to merge neighbouring segments that play the same leaf
+def merge_segments(segments: list) -> list:
+    """
+    Merge neighbouring (leaf, loops) segments that play the same leaf into one segment.
+    """
+    merged = []
+    for leaf, loops in segments:
+        if merged and merged[-1][0] is leaf and not leaf.triggered:
+            merged[-1] = (leaf, merged[-1][1] + loops)
+        else:
+            merged.append((leaf, loops))
+    return merged
+
+
+# Function to flatten a sequence into segments
+def flatten_sequence(node: Block or Repeat,
+                     flattened: dict,
+                     limit: int) -> list or None:
+    """
+    Flatten a sequence into a list of (leaf, loops) segments. A Repeat of a single segment becomes that segment
+    looped more times, a Repeat of several segments is unrolled, and the Repeats in flattened are played as
+    a single block. A triggered segment waits for a trigger once however many times it loops, so Repeats of
+    a triggered segment are always unrolled, like merge_segments never merges them.
+
+    Parameters
+    ----------
+    node : Block | Repeat
+        The sequence to flatten.
+    flattened : dict
+        Dictionary of id(repeat): FlattenedRepeat for the repeats to write as a single block.
+    limit : int
+        Give up once the sequence needs more than this many segments.
+
+    Returns
+    -------
+    list | None
+        List of (leaf, loops) segments, where leaf is a Block or FlattenedRepeat, or None if over the limit.
+    """
+    if isinstance(node, Block):
+        return [(node, 1)]
+    count = max(node.count, 1)
+    if id(node) in flattened:
+        leaf = flattened[id(node)]
+        if not leaf.triggered:
+            return [(leaf, count)]
+        return [(leaf, 1)] * count if count <= limit else None
+
+    inner = []
+    for child in node.children:
+        child_segments = flatten_sequence(child, flattened, limit)
+        if child_segments is None:
+            return None
+        inner.extend(child_segments)
+        if len(inner) > limit:
+            return None
+    inner = merge_segments(inner)
+
+    if len(inner) == 1 and not inner[0][0].triggered:
+        return [(inner[0][0], inner[0][1] * count)]
+    if len(inner) * count > limit:
+        return None
+    return merge_segments(inner * count)
+
+
+# Function to compile a sequence to segments
+def compile_sequence(sequence: Block or Repeat,
+                     max_loops: int = 2 ** 16 - 2,
+                     max_segments: int = 60) -> (list, bool):
+    """
+    Compile a nested sequence into the segments of the dpg11. Inner repeats are kept as loop counts or unrolled
+    into segments where possible. Only when the sequence does not fit in max_segments segments are the
+    innermost repeats of more than one segment flattened into a single block, until it fits.
+
+    Parameters
+    ----------
+    sequence : Block | Repeat
+        The sequence to compile.
+    max_loops : int, optional
+        Maximum number of loops of a single segment, by default 65534
+    max_segments : int, optional
+        Maximum number of segments in a sequence, by default 60
+
+    Returns
+    -------
+    segments : list
+        List of (leaf, loops) segments to play in order, where leaf.words are the packed words and
+        leaf.triggered is the triggered value.
+    loop_sequence : bool
+        If True, the segments are played continuously.
+    """
+    loop_sequence = isinstance(sequence, Repeat) and sequence.count == 0
+    # Repeats that hold more than one child are the ones that may need flattening, innermost first
+    candidates = sequence.inner_repeats() + [sequence] if isinstance(sequence, Repeat) else []
+    candidates = [repeat for repeat in candidates if len(repeat.children) > 1 or isinstance(repeat.children[0], Repeat)]
+
+    flattened = {}
+    while True:
+        segments = flatten_sequence(sequence, flattened, max_segments)
+        if segments is not None:
+            # A continuously looped single segment is played with 0 loops
+            if loop_sequence and len(segments) == 1:
+                return [(segments[0][0], 0)], False
+            # Split the loop counts that are over the limit of the device into several segments
+            segments = split_loops([(leaf, len(leaf.words), loops) for leaf, loops in segments], max_loops)
+            if len(segments) <= max_segments:
+                return [(leaf, loops) for leaf, _, loops in segments], loop_sequence
+        if len(candidates) == 0:
+            raise ValueError(f'The sequence cannot be played in at most {max_segments} segments')
+        repeat = candidates.pop(0)
+        flattened[id(repeat)] = FlattenedRepeat(repeat)
@@ -0,0 +1,181 @@
+# Module for the shadow copy of the dpg11 state, used to skip commands that would not change anything
+import copy
+
+from dpg11_pylib.driver.batching import parse_command
+
+
+class CardShadow:
+    """
+    Last known state of a single card. None means the value is not known, so no command setting it is skipped.
+    """
+
+    def __init__(self):
+        self.clock_rate = None
+        self.external_trigger = None
+        self.running = None
+        self.soft_trig = None
+        self.powered = None
+        # Key of the loaded segments: the segment command, its arguments and the digests of the files it loads
+        self.program = None
+
+    def __repr__(self) -> str:
+        return (f'CardShadow(clock_rate={self.clock_rate}, external_trigger={self.external_trigger}, '
+                f'running={self.running}, powered={self.powered}, program={self.program})')
+
+
+class DeviceState:
+    """
+    Shadow copy of the last state handed to the DPG11: for each card the clock rate, trigger mode, run state and
+    the loaded segments, with the digests of the wavefile contents they were loaded from. A command that would
+    not change this state, such as a SetClkRate to the current clock rate or a CreateSingleSegment of a wavefile
+    that is already loaded with the same contents and arguments, is redundant and can be dropped.
+
+    Run and PWR_DWN are never redundant, since a Run may be a software trigger. A segment whose file contents are
+    not known (it was not written by the device, or was rewritten without a digest) is always loaded again.
+    """
+
+    def __init__(self):
+        self.cards = {}
+        # Relative filename -> digest of the contents of every file written, None if it is not known
+        self.file_digests = {}
+        # Relative filename of a multi-wavefile -> the wavefiles it references
+        self.multi_wavefile_members = {}
+
+    def card(self,
+             card_number: int) -> CardShadow:
+        """
+        Get the shadow of a card, creating it with an unknown state on first use.
+        """
+        if card_number not in self.cards:
+            self.cards[card_number] = CardShadow()
+        return self.cards[card_number]
+
+    def file_written(self,
+                     filename: str,
+                     digest: str = None,
+                     members: list = None):
+        """
+        Record the contents of a file that was just written.
+
+        Parameters
+        ----------
+        filename : str
+            Relative filename of the file, as used in the commands.
+        digest : str, optional
+            Digest of the contents. None if it is not known, by default None
+        members : list, optional
+            For a multi-wavefile, the filenames of the wavefiles it references, by default None
+        """
+        self.file_digests[filename] = digest
+        if members is not None:
+            self.multi_wavefile_members[filename] = list(members)
+
+    def program_key(self,
+                    name: str,
+                    args: list) -> tuple or None:
+        """
+        Key of a segment command, that is equal for two commands only if they load the same contents the same way.
+
+        Returns
+        -------
+        tuple | None
+            The key, or None if the contents of a file it loads are not known.
+        """
+        filename = args[5] if name == 'CreateSingleSegment' else args[4]
+        digests = [self.file_digests.get(filename)]
+        if name == 'CreateSegments':
+            members = self.multi_wavefile_members.get(filename)
+            if members is None:
+                return None
+            digests += [self.file_digests.get(member) for member in members]
+        if None in digests:
+            return None
+        return (name, tuple(args), tuple(digests))
+
+    def update(self,
+               command: str,
+               cards: dict = None) -> bool:
+        """
+        Apply a command to the shadow state.
+
+        Parameters
+        ----------
+        command : str
+            The command string.
+        cards : dict, optional
+            Card shadows to apply it to, by default the cards of this state
+
+        Returns
+        -------
+        bool
+            True if the command changed the state, False if it was redundant.
+        """
+        if cards is None:
+            cards = self.cards
+        name, card_number, args = parse_command(command)
+        if card_number not in cards:
+            cards[card_number] = CardShadow()
+        card = cards[card_number]
+
+        if name == 'Run':
+            card.running = True
+            card.soft_trig = args[0].lower() == 'true'
+            return True
+        if name == 'Stop':
+            changed = card.running is not False
+            card.running = False
+            return changed
+        if name == 'SetClkRate':
+            changed = card.clock_rate is None or card.clock_rate != int(args[0])
+            card.clock_rate = int(args[0])
+            return changed
+        if name == 'SelExtTrig':
+            external_trigger = args[0].lower() == 'true'
+            changed = card.external_trigger is None or card.external_trigger != external_trigger
+            card.external_trigger = external_trigger
+            return changed
+        if name in ['CreateSingleSegment', 'CreateSegments']:
+            program = self.program_key(name, args)
+            changed = program is None or card.program != program
+            card.program = program
+            return changed
+        if name == 'PWR_DWN':
+            cards[card_number] = CardShadow()
+            cards[card_number].running = False
+            cards[card_number].powered = False
+            return True
+        # A command this class does not know about may change anything
+        cards[card_number] = CardShadow()
+        return True
+
+    def changed_commands(self,
+                         command_list: list) -> list:
+        """
+        Drop the commands that would not change the state, without applying them.
+
+        Parameters
+        ----------
+        command_list : list
+            List of command strings in the order they would be sent.
+
+        Returns
+        -------
+        list
+            The commands that change the state, in order.
+        """
+        cards = copy.deepcopy(self.cards)
+        return [command for command in command_list if self.update(command, cards)]
+
+    def apply(self,
+              command_list: list):
+        """
+        Apply the commands of a script that was handed to the GUI.
+        """
+        for command in command_list:
+            self.update(command)
+
+    def reset(self):
+        """
+        Forget the state of every card, so that the next commands are all sent. The file digests are kept.
+        """
+        self.cards.clear()
@@ -0,0 +1,236 @@
+# Module for generating the wavefiles of a whole parameter sweep up front, across a process pool
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from dpg11_pylib.driver.cache import WavefileCache
+from dpg11_pylib.driver.transport import FileTransport
+from dpg11_pylib.waveforms.packing import pack_channels
+from dpg11_pylib.waveforms.wavefile import write_wavefile
+
+
+# Function to build, pack and write the wavefile of a single sweep point in a worker process
+def build_sweep_wavefile(build_wave_dict,
+                         point,
+                         wave_name: str,
+                         directory: str = None) -> (str, str, object):
+    """
+    Build the waveform of a sweep point and pack it into words. If directory is given, the wavefile is written
+    there too, unless a file with the same contents is already on disk.
+
+    The wavefile is named wave_name_{digest}_{num_points}.txt from a hash of its contents, so points with the same
+    waveform share one file, and the files follow the naming of the WavefileCache.
+
+    Parameters
+    ----------
+    build_wave_dict : callable
+        Picklable function that takes the point and returns its waveform dictionary, of the form
+        {1: 'ch1_waveform_array', 3: 'ch3_waveform_array'}.
+    point
+        The parameter point.
+    wave_name : str
+        What to name the wavefile. Do not include .txt
+    directory : str, optional
+        The driver directory to write the wavefile into. If None, the words are returned instead, by default None
+
+    Returns
+    -------
+    wave_filename : str
+        Relative filename of the wavefile.
+    digest : str
+        Digest of the contents.
+    words : np.ndarray | None
+        The packed words if directory is None, else None.
+    """
+    words = pack_channels(build_wave_dict(point))
+    if len(words) % 64 != 0:
+        raise ValueError(f'Length of waveform_array must be modulo 64 (Received {len(words)} for point {point})')
+
+    digest = WavefileCache.digest(words)
+    wave_filename = f'wavefiles/{wave_name}_{digest}_{len(words)}.txt'
+    if directory is None:
+        return wave_filename, digest, words
+    wave_filepath = os.path.join(directory, wave_filename)
+    if not os.path.isfile(wave_filepath):
+        write_wavefile(wave_filepath, words)
+    return wave_filename, digest, None
+
+
+class SweepManifest:
+    """
+    The wavefiles and command lists of every point of a precompiled sweep, in the order of the points.
+
+    Each entry is a tuple (point, wave_filename, command_list). The command lists are those of
+    DPG11Device.create_script, so a point is programmed with a single script.
+
+    Examples
+    --------
+    >>> manifest = precompile_sweep(device, build_wave_dict, rf_pulse_durations, clock_rate=1e9)
+    >>> for index, (rf_pulse_duration, wave_filename, command_list) in enumerate(manifest):
+    ...     manifest.program(device, index)
+    ...     acquire()
+    """
+
+    def __init__(self,
+                 entries: list):
+        """
+        Parameters
+        ----------
+        entries : list
+            List of (point, wave_filename, command_list) tuples.
+        """
+        self.entries = list(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index: int) -> tuple:
+        return self.entries[index]
+
+    def __repr__(self) -> str:
+        return f'SweepManifest({len(self.entries)} points, {len(self.wave_filenames())} wavefiles)'
+
+    def index(self, point) -> int:
+        """
+        Get the index of the first entry of a point.
+        """
+        for index, entry in enumerate(self.entries):
+            if entry[0] == point:
+                return index
+        raise KeyError(f'{point} is not in the sweep')
+
+    def lookup(self, point) -> (str, list):
+        """
+        Get the wavefile and the command list of a point.
+
+        Returns
+        -------
+        wave_filename : str
+            Relative filename of the wavefile.
+        command_list : list
+            The commands that program the point.
+        """
+        _, wave_filename, command_list = self.entries[self.index(point)]
+        return wave_filename, command_list
+
+    def wave_filenames(self) -> list:
+        """
+        Get the distinct wavefiles of the sweep, in order of first use.
+        """
+        return list(dict.fromkeys(entry[1] for entry in self.entries))
+
+    def program(self,
+                device,
+                index: int,
+                script_name: str = 'temp_sweep'):
+        """
+        Send the commands of a point to the device as a single script.
+
+        Parameters
+        ----------
+        device : DPG11Device
+            The device the sweep was compiled for.
+        index : int
+            Index of the point.
+        script_name : str, optional
+            What to name the script .txt file, by default 'temp_sweep'
+
+        Returns
+        -------
+        str or int
+            The return value of DPG11Device.create_script.
+        """
+        return device.create_script(command_list=list(self.entries[index][2]),
+                                    script_name=script_name,
+                                    execute_after_creation=True,
+                                    overwrite_script=True,
+                                    save_script=False)
+
+
+# Function to generate all of the wavefiles of a sweep across a process pool
+def precompile_sweep(device,
+                     build_wave_dict,
+                     points: list,
+                     wave_name: str = 'sweep',
+                     clock_rate: float = None,
+                     run: bool = False,
+                     soft_trig: bool = True,
+                     max_workers: int = None,
+                     executor=None,
+                     **segment_kwargs) -> SweepManifest:
+    """
+    Generate the wavefiles of every point of a sweep up front, so the acquisition loop only has to send one small
+    script per point. Building, packing, hashing and formatting the waveforms runs across a process pool, and with
+    a FileTransport the workers write the wavefiles into the driver directory themselves. Points with the same
+    waveform share one wavefile.
+
+    The wavefiles are registered with the wavefile cache and the shadow state of the device, if they are used.
+    Note that a cache smaller than the sweep may evict wavefiles of the sweep before they are used.
+
+    Parameters
+    ----------
+    device : DPG11Device
+        The device to compile the sweep for.
+    build_wave_dict : callable
+        Function that takes a point and returns its waveform dictionary. It must be picklable, so a module level
+        function or a functools.partial of one, not a lambda or a method of a local object.
+    points : list
+        The parameter points, such as a list of rf pulse durations.
+    wave_name : str, optional
+        What to name the wavefiles. Do not include .txt, by default 'sweep'
+    clock_rate : float, optional
+        If given, each command list stops the output and sets this clock rate before loading the segment,
+        by default None
+    run : bool, optional
+        If True, each command list ends with a Run command, by default False
+    soft_trig : bool, optional
+        soft_trig of the Run command, by default True
+    max_workers : int, optional
+        Number of worker processes. None uses the number of CPUs, by default None
+    executor : concurrent.futures.Executor, optional
+        Executor to use instead of creating a process pool, by default None
+    **segment_kwargs
+        Keyword arguments of DPG11Device.create_single_segment, such as num_loops or triggered.
+
+    Returns
+    -------
+    SweepManifest
+        The wavefile and command list of every point, in the order of points.
+    """
+    points = list(points)
+    # Workers write straight into the driver directory, other transports get the words back
+    directory = device.directory if isinstance(device.transport, FileTransport) else None
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(build_sweep_wavefile, build_wave_dict, point, wave_name, directory)
+                   for point in points]
+        results = [future.result() for future in futures]
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    entries = []
+    registered = set()
+    for point, (wave_filename, digest, words) in zip(points, results):
+        if wave_filename not in registered:
+            registered.add(wave_filename)
+            if words is not None:
+                device.transport.write_wavefile(device.directory + '/' + wave_filename, words)
+            device.state.file_written(wave_filename, digest)
+            if device.wavefile_cache is not None:
+                device.wavefile_cache.add(digest, wave_filename)
+
+        command_list = []
+        if clock_rate is not None:
+            command_list += [device.stop(), device.set_clk_rate(clock_rate=clock_rate)]
+        command_list.append(device.create_single_segment(wave_filename=wave_filename, **segment_kwargs))
+        if run:
+            command_list.append(device.run(soft_trig))
+        entries.append((point, wave_filename, command_list))
+
+    return SweepManifest(entries)
@@ -0,0 +1,243 @@
+# Module for the transports that carry the dpg11 scripts and wavefiles to the GUI
+import os
+import subprocess
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from dpg11_pylib.driver.command_queue import CommandQueue
+from dpg11_pylib.instrumentation.recorder import add_bytes
+from dpg11_pylib.waveforms.wavefile import as_words, write_text_atomic, write_wavefile
+
+
+class FileTransport:
+    """
+    Transport that writes the scripts, wavefiles and multi-wavefiles into the driver directory and hands the
+    scripts to dax22000_GUI_64.exe through dax_cmd.txt. This is the transport DPG11Device uses by default.
+    """
+
+    # Time in seconds to give the GUI to read the last script before it is closed, when not waiting for it
+    close_delay = 2
+
+    def __init__(self,
+                 directory: str,
+                 check_driver: bool = True):
+        """
+        Parameters
+        ----------
+        directory : str
+            The driver directory with dax22000_GUI_64.exe and the .bat files.
+        check_driver : bool, optional
+            If True, raise a ValueError if dax22000_GUI_64.exe is not in directory, by default True
+        """
+        self.directory = directory
+        # check that the driver is in the path provided
+        if check_driver and not os.path.exists(os.path.join(self.directory, 'dax22000_GUI_64.exe')):
+            raise ValueError('No driver was found in the path provided. Please input a valid path.')
+        # create the script, wave, and multi-wave folders if they don't exist
+        try:
+            for subdirectory in ['scripts', 'wavefiles', 'multi_wavefiles']:
+                os.makedirs(os.path.join(self.directory, subdirectory), exist_ok=True)
+        except OSError:
+            raise ValueError('The driver path is not valid or there was an issue. Please input a valid path.')
+
+        # Queue that hands the scripts to the GUI through dax_cmd.txt
+        self.command_queue = CommandQueue(os.path.join(self.directory, 'dax_cmd.txt'))
+
+    def exists(self,
+               path: str) -> bool:
+        """
+        Check whether a file exists.
+        """
+        return os.path.isfile(path)
+
+    def write_script(self,
+                     path: str,
+                     script_str: str):
+        """
+        Write the text of a script to path.
+        """
+        with open(path, 'w') as f:
+            f.write(script_str)
+        add_bytes(len(script_str))
+
+    def write_wavefile(self,
+                       path: str,
+                       words: np.ndarray):
+        """
+        Write the packed words of a wavefile to path. See write_wavefile.
+        """
+        write_wavefile(path, words)
+
+    def write_text(self,
+                   path: str,
+                   text: str):
+        """
+        Write the text of a multi-wavefile to path. See write_text_atomic.
+        """
+        write_text_atomic(path, text)
+
+    def send(self,
+             script_path: str,
+             keep_script: bool = True,
+             timeout: float = None,
+             wait_for_previous: bool = True):
+        """
+        Hand a script to the GUI. See CommandQueue.send.
+        """
+        self.command_queue.send(script_path,
+                                keep_script=keep_script,
+                                timeout=timeout,
+                                wait_for_previous=wait_for_previous)
+
+    def submit(self,
+               script_path: str,
+               keep_script: bool = True,
+               timeout: float = None) -> Future:
+        """
+        Queue a script to be handed to the GUI in the background. See CommandQueue.submit.
+        """
+        return self.command_queue.submit(script_path, keep_script=keep_script, timeout=timeout)
+
+    def wait_for_consumption(self,
+                             timeout: float = None) -> bool:
+        """
+        Block until the GUI has consumed the last script. See CommandQueue.wait_for_consumption.
+        """
+        return self.command_queue.wait_for_consumption(timeout)
+
+    def run_batch_file(self,
+                       bat_name: str):
+        """
+        Run one of the .bat files of the driver directory, such as the one that opens the API.
+        """
+        subprocess.call([r'{0}\\{1}.bat'.format(self.directory, bat_name)])
+
+
+class MemoryTransport:
+    """
+    Dry-run transport that keeps the scripts, wavefiles and multi-wavefiles as Python objects instead of writing
+    them, and records every command that would have been sent in a timestamped log. No driver directory or
+    dax22000_GUI_64.exe is needed, so whole sweeps can be compiled and checked without any disk I/O, and the
+    time spent in Python can be measured apart from the time spent in the filesystem.
+
+    Examples
+    --------
+    >>> transport = MemoryTransport()
+    >>> device = DPG11Device('dry_run', transport=transport)
+    >>> device.run_single_wave(device.create_wave_file('test', {1: np.ones(64)}), clock_rate=1e9)
+    >>> transport.commands()
+    ['Stop 1', 'SetClkRate 1 1000000000', 'CreateSingleSegment 1 1 64 0 2047 2047 wavefiles/test_64.txt 0',
+     'Run 1 true']
+    """
+
+    close_delay = 0
+
+    def __init__(self):
+        # Full path -> contents of every file that was written. Wavefiles are kept as arrays of packed words,
+        # scripts and multi-wavefiles as text
+        self.files = {}
+        # List of (time, command) of every command that was sent, in order
+        self.log = []
+        # Text of every script that was sent, in order
+        self.scripts = []
+        # Names of the .bat files that were run
+        self.batch_files = []
+        self.num_sent = 0
+
+    def exists(self,
+               path: str) -> bool:
+        """
+        Check whether a file was written.
+        """
+        return path in self.files
+
+    def write_script(self,
+                     path: str,
+                     script_str: str):
+        """
+        Keep the text of a script.
+        """
+        self.files[path] = script_str
+
+    def write_wavefile(self,
+                       path: str,
+                       words: np.ndarray):
+        """
+        Keep a copy of the packed words of a wavefile.
+        """
+        self.files[path] = as_words(words).copy()
+
+    def write_text(self,
+                   path: str,
+                   text: str):
+        """
+        Keep the text of a multi-wavefile.
+        """
+        self.files[path] = text
+
+    def send(self,
+             script_path: str,
+             keep_script: bool = True,
+             timeout: float = None,
+             wait_for_previous: bool = True):
+        """
+        Record the commands of a script in the log, as if the GUI consumed it straight away.
+        """
+        script_str = self.files[script_path] if keep_script else self.files.pop(script_path)
+        sent_time = time.perf_counter()
+        self.scripts.append(script_str)
+        self.log.extend((sent_time, command) for command in script_str.splitlines() if command.strip())
+        self.num_sent += 1
+
+    def submit(self,
+               script_path: str,
+               keep_script: bool = True,
+               timeout: float = None) -> Future:
+        """
+        Record the commands of a script in the log. The returned Future is already resolved, with a latency of 0.
+        """
+        future = Future()
+        try:
+            self.send(script_path, keep_script=keep_script, timeout=timeout)
+        except BaseException as error:
+            future.set_exception(error)
+        else:
+            future.set_result(0.0)
+        return future
+
+    def wait_for_consumption(self,
+                             timeout: float = None) -> bool:
+        """
+        Scripts are consumed as soon as they are sent, so this always returns True.
+        """
+        return True
+
+    def run_batch_file(self,
+                       bat_name: str):
+        """
+        Record the name of a .bat file instead of running it.
+        """
+        self.batch_files.append(bat_name)
+
+    def commands(self) -> list:
+        """
+        Get the commands that were sent, without their timestamps.
+
+        Returns
+        -------
+        list
+            The command strings, in order.
+        """
+        return [command for _, command in self.log]
+
+    def clear(self):
+        """
+        Forget every file, script and logged command.
+        """
+        self.files.clear()
+        self.log.clear()
+        self.scripts.clear()
+        self.batch_files.clear()
+        self.num_sent = 0
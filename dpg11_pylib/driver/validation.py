@@ -0,0 +1,125 @@
+# Module for checking the argument types of the dpg11 functions
+import contextlib
+import functools
+import inspect
+
+import numpy as np
+
+from dpg11_pylib.waveforms.packing import PackedWaveform
+
+# Types accepted for each annotation. numpy scalars are accepted as the matching Python type, and an int is
+# accepted wherever a float is, since the annotations like float or int only keep the first type. A
+# PackedWaveform is accepted wherever a waveform dictionary is.
+ACCEPTED_TYPES = {int: (int, np.integer),
+                  float: (float, int, np.floating, np.integer),
+                  bool: (bool, np.bool_),
+                  dict: (dict, PackedWaveform)}
+# Annotations that must not accept a bool, even though bool is a subclass of int
+NON_BOOL_ANNOTATIONS = [int, float]
+
+# Global switch for the checks, see set_validation
+validation_enabled = True
+
+
+# Function to turn the argument type checks on or off
+def set_validation(enabled: bool):
+    """
+    Turn the argument type checks of every validated function on or off. The checks are on by default. Turning
+    them off skips them completely, for trusted hot paths that build thousands of commands. The value and range
+    checks of the functions still run.
+
+    Parameters
+    ----------
+    enabled : bool
+        If False, the argument types are not checked.
+    """
+    global validation_enabled
+    validation_enabled = bool(enabled)
+
+
+# Context manager to skip the checks for a block of code
+@contextlib.contextmanager
+def validation_disabled():
+    """
+    Skip the argument type checks inside the with block, restoring the previous setting afterwards.
+
+    Examples
+    --------
+    >>> with validation_disabled():
+    ...     command_list = [device.set_clk_rate(clock_rate) for clock_rate in clock_rates]
+    """
+    global validation_enabled
+    previous = validation_enabled
+    validation_enabled = False
+    try:
+        yield
+    finally:
+        validation_enabled = previous
+
+
+# Function to build the check of a single annotation
+def accepted_types(annotation) -> tuple or None:
+    """
+    Get the types accepted for an annotation.
+
+    Parameters
+    ----------
+    annotation
+        The annotation of the argument.
+
+    Returns
+    -------
+    tuple | None
+        Tuple of the accepted types, or None if the annotation is not a type and is not checked.
+    """
+    if not isinstance(annotation, type) or annotation is inspect.Parameter.empty:
+        return None
+    return ACCEPTED_TYPES.get(annotation, (annotation,))
+
+
+# Decorator to check the argument types against the annotations
+def validate_arguments(func):
+    """
+    Check the arguments of a function against its type annotations on every call, raising a TypeError for an
+    argument of the wrong type. The checks are built once, when the function is decorated, instead of inspecting
+    the function on every call. See ACCEPTED_TYPES for the types accepted for each annotation. Arguments that are
+    left at their default are not checked, and the checks are skipped when the validation is turned off with
+    set_validation or validation_disabled.
+
+    Parameters
+    ----------
+    func : callable
+        The function to check, with annotated arguments.
+
+    Returns
+    -------
+    callable
+        The wrapped function.
+    """
+    checks = []
+    for index, parameter in enumerate(inspect.signature(func).parameters.values()):
+        if parameter.kind not in [parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY]:
+            continue
+        types = accepted_types(parameter.annotation)
+        if types is not None:
+            if parameter.kind == parameter.KEYWORD_ONLY:
+                index = None
+            checks.append((parameter.name, index, types, parameter.annotation in NON_BOOL_ANNOTATIONS,
+                           parameter.annotation))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if validation_enabled:
+            for name, index, types, reject_bool, annotation in checks:
+                if name in kwargs:
+                    value = kwargs[name]
+                elif index is not None and index < len(args):
+                    value = args[index]
+                else:
+                    continue
+                if not isinstance(value, types) or (reject_bool and isinstance(value, (bool, np.bool_))):
+                    raise TypeError(f'{name} must be of type {annotation} (Received input of type {type(value)})')
+        return func(*args, **kwargs)
+
+    wrapper.checks = checks
+    return wrapper
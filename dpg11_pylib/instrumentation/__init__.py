@@ -0,0 +1 @@
+from dpg11_pylib.instrumentation.recorder import Recorder, Stage, add_bytes, get_recorder, instrumented
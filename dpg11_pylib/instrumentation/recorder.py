@@ -0,0 +1,332 @@
+# Module for recording the time, bytes written and number of calls of each stage of the dpg11 pipeline
+import functools
+import json
+import threading
+import time
+
+
+# Recorder that the stages report to. None when instrumentation is off, which is the default
+active_recorder = None
+# Stack of the stages that are running on each thread
+thread_stages = threading.local()
+
+
+class StageRecord:
+    """
+    A single call of an instrumented stage.
+
+    Attributes
+    ----------
+    stage : str
+        Name of the stage, such as 'create_script'.
+    start : float
+        Start time in seconds since the recorder was created.
+    duration : float
+        Time spent in the stage, including the stages it called.
+    self_time : float
+        Time spent in the stage itself, excluding the instrumented stages it called.
+    num_bytes : int
+        Bytes written to disk during the stage, including by the stages it called.
+    depth : int
+        Number of instrumented stages this call is nested in.
+    thread : str
+        Name of the thread the stage ran on.
+    """
+
+    def __init__(self,
+                 stage: str,
+                 start: float,
+                 duration: float,
+                 self_time: float,
+                 num_bytes: int,
+                 depth: int,
+                 thread: str):
+        self.stage = stage
+        self.start = start
+        self.duration = duration
+        self.self_time = self_time
+        self.num_bytes = num_bytes
+        self.depth = depth
+        self.thread = thread
+
+    def to_dict(self) -> dict:
+        return {'stage': self.stage,
+                'start': self.start,
+                'duration': self.duration,
+                'self_time': self.self_time,
+                'num_bytes': self.num_bytes,
+                'depth': self.depth,
+                'thread': self.thread}
+
+    def __repr__(self) -> str:
+        return (f'StageRecord(stage={self.stage!r}, duration={self.duration:.6f}, '
+                f'num_bytes={self.num_bytes}, depth={self.depth})')
+
+
+class StageFrame:
+    """
+    A stage that is running, on the stack of its thread.
+    """
+
+    def __init__(self,
+                 stage: str,
+                 start: float):
+        self.stage = stage
+        self.start = start
+        self.num_bytes = 0
+        self.child_time = 0.0
+
+
+class Recorder:
+    """
+    Opt-in recorder of the stages of the pipeline: waveform construction in waveforms, packing the channels,
+    create_decimal_array, writing the wavefile in create_wave_file, create_multi_wave_file, create_script,
+    execute_script (which includes the handoff to the GUI) and the program_pulser_state of the pulser. Nothing
+    is recorded unless a Recorder is active, and the instrumented functions only check for one when it is not.
+
+    Every call is kept as a StageRecord in the trace, and report aggregates them per stage. Stages nest, so the
+    duration of a stage includes the stages it calls, self_time does not, and bytes written count towards every
+    stage that was running. A stage that mostly spends its self_time with no bytes written is bound by the CPU,
+    one that writes many bytes is bound by the disk, and a long execute_script is waiting on the GUI.
+
+    Examples
+    --------
+    >>> with Recorder() as recorder:
+    ...     pulser.program_pulser_state(rf_pulse_duration=1e-6)
+    >>> print(recorder)
+    >>> recorder.to_json('program_pulser_state.json')
+    """
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.previous = None
+
+    # Turning the recorder on and off
+    def start(self):
+        """
+        Make this the active recorder, until stop() is called.
+        """
+        global active_recorder
+        self.previous = active_recorder
+        active_recorder = self
+        return self
+
+    def stop(self):
+        """
+        Stop recording and make the previously active recorder active again.
+        """
+        global active_recorder
+        if active_recorder is self:
+            active_recorder = self.previous
+        self.previous = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add(self,
+            record: StageRecord):
+        """
+        Keep a finished call.
+        """
+        with self.lock:
+            self.records.append(record)
+
+    def clear(self):
+        """
+        Forget every recorded call.
+        """
+        with self.lock:
+            self.records = []
+        self.start_time = time.perf_counter()
+
+    # Results
+    def trace(self) -> list:
+        """
+        Get every recorded call as a dictionary, in the order they finished.
+        """
+        with self.lock:
+            return [record.to_dict() for record in self.records]
+
+    def report(self) -> dict:
+        """
+        Aggregate the recorded calls per stage.
+
+        Returns
+        -------
+        dict
+            {stage: {'calls', 'total_time', 'self_time', 'mean_time', 'max_time', 'num_bytes'}}, ordered by
+            total_time, longest first. Times are in seconds.
+        """
+        with self.lock:
+            records = list(self.records)
+
+        report = {}
+        for record in records:
+            stats = report.setdefault(record.stage, {'calls': 0,
+                                                     'total_time': 0.0,
+                                                     'self_time': 0.0,
+                                                     'mean_time': 0.0,
+                                                     'max_time': 0.0,
+                                                     'num_bytes': 0})
+            stats['calls'] += 1
+            stats['total_time'] += record.duration
+            stats['self_time'] += record.self_time
+            stats['max_time'] = max(stats['max_time'], record.duration)
+            stats['num_bytes'] += record.num_bytes
+        for stats in report.values():
+            stats['mean_time'] = stats['total_time'] / stats['calls']
+        return dict(sorted(report.items(), key=lambda item: item[1]['total_time'], reverse=True))
+
+    def to_json(self,
+                path: str = None,
+                indent: int = 2) -> str:
+        """
+        Dump the report and the trace to JSON.
+
+        Parameters
+        ----------
+        path : str, optional
+            If given, the JSON is also written to this file, by default None
+        indent : int, optional
+            Indent of the JSON, by default 2
+
+        Returns
+        -------
+        str
+            JSON of the form {'report': report(), 'trace': trace()}.
+        """
+        text = json.dumps({'report': self.report(), 'trace': self.trace()}, indent=indent)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def __repr__(self) -> str:
+        return f'Recorder({len(self.records)} calls)'
+
+    def __str__(self) -> str:
+        lines = [f'{"stage":<36} {"calls":>6} {"total [s]":>10} {"self [s]":>10} {"mean [s]":>10} {"MB":>8}']
+        for name, stats in self.report().items():
+            lines.append(f'{name:<36} {stats["calls"]:>6} {stats["total_time"]:>10.4f} {stats["self_time"]:>10.4f} '
+                         f'{stats["mean_time"]:>10.6f} {stats["num_bytes"] / 1e6:>8.2f}')
+        return '\n'.join(lines)
+
+
+# Function to get the recorder that is recording, if any
+def get_recorder():
+    """
+    Get the active Recorder, or None if instrumentation is off.
+    """
+    return active_recorder
+
+# Function to add bytes written to every running stage
+def add_bytes(num_bytes: int):
+    """
+    Count bytes written to disk towards every stage that is running on this thread. Does nothing if
+    instrumentation is off.
+    """
+    if active_recorder is None:
+        return
+    for frame in getattr(thread_stages, 'stack', ()):
+        frame.num_bytes += num_bytes
+
+# Function to enter a stage
+def enter_stage(name: str) -> StageFrame:
+    """
+    Push a stage onto the stack of this thread. Use Stage or instrumented rather than calling this directly.
+    """
+    stack = getattr(thread_stages, 'stack', None)
+    if stack is None:
+        stack = thread_stages.stack = []
+    frame = StageFrame(name, time.perf_counter())
+    stack.append(frame)
+    return frame
+
+# Function to leave a stage and record it
+def exit_stage(recorder: Recorder,
+               frame: StageFrame):
+    """
+    Pop a stage off the stack of this thread and record the call. Use Stage or instrumented rather than calling
+    this directly.
+    """
+    end = time.perf_counter()
+    stack = thread_stages.stack
+    stack.pop()
+    duration = end - frame.start
+    if stack:
+        stack[-1].child_time += duration
+    recorder.add(StageRecord(frame.stage,
+                             frame.start - recorder.start_time,
+                             duration,
+                             duration - frame.child_time,
+                             frame.num_bytes,
+                             len(stack),
+                             threading.current_thread().name))
+
+
+class Stage:
+    """
+    Context manager that records the code inside it as a stage, if a Recorder is active.
+
+    Examples
+    --------
+    >>> with Stage('create_wave_file.write'):
+    ...     transport.write_wavefile(path, words)
+    """
+
+    def __init__(self,
+                 name: str):
+        self.name = name
+        self.recorder = None
+        self.frame = None
+
+    def __enter__(self):
+        self.recorder = active_recorder
+        if self.recorder is not None:
+            self.frame = enter_stage(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.recorder is not None:
+            exit_stage(self.recorder, self.frame)
+            self.recorder = self.frame = None
+
+
+# Decorator to record every call of a function as a stage
+def instrumented(name: str):
+    """
+    Decorator that records every call of the function as the stage name, if a Recorder is active. When none is,
+    the function is called straight away.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, such as 'create_script'.
+
+    Examples
+    --------
+    >>> @instrumented('waveforms.on_off_array')
+    ... def on_off_array(size=1, length=64):
+    ...     ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = active_recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            frame = enter_stage(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                exit_stage(recorder, frame)
+
+        wrapper.stage = name
+        return wrapper
+
+    return decorator
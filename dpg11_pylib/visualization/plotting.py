@@ -1,8 +1,7 @@
 # Module for functions that are helpful when coding
+# matplotlib is only imported when something is plotted, so that importing the package stays cheap for
+# processes that never plot (control processes, sweep workers)
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-from matplotlib.ticker import MultipleLocator, AutoLocator
 # import the waveforms module
 from dpg11_pylib import waveforms
 # import the local libraries
@@ -100,6 +99,11 @@ def plot_waveforms(waveforms: list or np.ndarray,
         
     
     
+    # Import matplotlib on first use
+    import matplotlib.pyplot as plt
+    import matplotlib.gridspec as gridspec
+    from matplotlib.ticker import MultipleLocator
+
     # Create the figure where the height is determined by the number of waveforms
     fig = plt.figure(figsize=(figure_width, num_waves))
     # Now create the gridspec that we will use
@@ -165,8 +169,8 @@ def plot_dpg11_wavefile(wavefile: str,
     None
     '''
     
-    # Get the waveforms array from the wavefile
-    waveforms_arr = waveforms.wavefile2arrays(wavefile)
+    # Get the channel planes from the wavefile, read in bulk as uint8 0s and 1s
+    waveforms_arr = waveforms.read_wavefile(wavefile, dtype=np.uint8)
     # Get the number of channels
     if plot_channels == None:
         channels = np.arange(len(waveforms_arr))
@@ -1 +1,5 @@
-from dpg11_pylib.waveforms.waveforms import *
\ No newline at end of file
+from dpg11_pylib.waveforms.waveforms import *
+from dpg11_pylib.waveforms.packing import *
+from dpg11_pylib.waveforms.wavefile import *
+from dpg11_pylib.waveforms.run_length import *
+from dpg11_pylib.waveforms.batch import *
@@ -0,0 +1,200 @@
+# Module for building the waveforms of a whole parameter sweep at once, one row per point
+import numpy as np
+
+from dpg11_pylib.instrumentation.recorder import instrumented
+from dpg11_pylib.waveforms.packing import WORD_BITS
+
+# Create a batch of on off waveforms, one for each step width
+@instrumented('waveforms.on_off_arrays')
+def on_off_arrays(sizes: np.ndarray or list,
+                  length: int = 64,
+                  dtype=np.uint8) -> np.ndarray:
+    """
+    Batched on_off_array. Row i is on_off_array(sizes[i], length), built in a single vectorized pass.
+
+    Parameters
+    ----------
+    sizes : np.ndarray | list
+        Width of the steps of each waveform in samples.
+    length : int
+        Length of the waveforms. Default is 64.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+
+    Returns
+    -------
+    arr : np.ndarray
+        Array of ones and zeros of shape (len(sizes), length).
+    """
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 1)
+    return ((np.arange(length) // sizes) % 2 == 0).astype(dtype)
+
+# Create a batch of off on waveforms, one for each step width
+@instrumented('waveforms.off_on_arrays')
+def off_on_arrays(sizes: np.ndarray or list,
+                  length: int = 64,
+                  dtype=np.uint8) -> np.ndarray:
+    """
+    Batched off_on_array. Row i is off_on_array(sizes[i], length), built in a single vectorized pass.
+
+    Parameters
+    ----------
+    sizes : np.ndarray | list
+        Width of the steps of each waveform in samples.
+    length : int
+        Length of the waveforms. Default is 64.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+
+    Returns
+    -------
+    arr : np.ndarray
+        Array of zeros and ones of shape (len(sizes), length).
+    """
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 1)
+    return ((np.arange(length) // sizes) % 2 == 1).astype(dtype)
+
+# Create a batch of single pulses with different widths and delays
+@instrumented('waveforms.pulse_arrays')
+def pulse_arrays(widths: np.ndarray or list,
+                 length: int,
+                 delays: np.ndarray or list or int = 0,
+                 dtype=np.uint8) -> np.ndarray:
+    """
+    Batched single pulses, such as the pulses of a Rabi or delay sweep. Row i is on from sample delays[i] for
+    widths[i] samples and off everywhere else, so with no delay it is the same as
+    pad_waveform(np.ones(widths[i]), length).
+
+    Parameters
+    ----------
+    widths : np.ndarray | list
+        Width of the pulse of each waveform in samples.
+    length : int
+        Length of the waveforms.
+    delays : np.ndarray | list | int
+        Start of the pulse of each waveform in samples, or one start for all of them. Default is 0.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+
+    Returns
+    -------
+    arr : np.ndarray
+        Array of shape (len(widths), length).
+    """
+    widths = np.asarray(widths, dtype=np.int64).reshape(-1, 1)
+    delays = np.broadcast_to(np.asarray(delays, dtype=np.int64).reshape(-1, 1), widths.shape)
+    if np.any(widths < 0) or np.any(delays < 0):
+        raise ValueError('widths and delays must not be negative')
+    if np.any(widths + delays > length):
+        raise ValueError(f'Every pulse must end within length ({length} samples)')
+
+    samples = np.arange(length)
+    return ((samples >= delays) & (samples < delays + widths)).astype(dtype)
+
+# Pad a batch of waveforms of different lengths to the same length
+@instrumented('waveforms.pad_waveforms')
+def pad_waveforms(waveforms: list,
+                  length: int,
+                  pad_value: int = 0,
+                  pad_side: str = 'right',
+                  dtype=np.uint8) -> np.ndarray:
+    """
+    Batched pad_waveform. Pad each waveform with pad_value on pad_side to length and stack them into rows.
+
+    Parameters
+    ----------
+    waveforms : list
+        The waveforms to pad, which may have different lengths.
+    length : int
+        Length to pad the waveforms to.
+    pad_value : int
+        Value to pad the waveforms with. Default is 0.
+    pad_side : str
+        Side to pad the waveforms on, 'right' or 'left'. Default is 'right'.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+
+    Returns
+    -------
+    arr : np.ndarray
+        Array of shape (len(waveforms), length).
+    """
+    if pad_value not in [0, 1]:
+        raise ValueError('pad_value must be either 0 or 1')
+    if pad_side not in ['right', 'left']:
+        raise ValueError('pad_side must be either "right" or "left"')
+
+    lengths = np.array([len(waveform) for waveform in waveforms], dtype=np.int64).reshape(-1, 1)
+    if np.any(lengths > length):
+        raise ValueError(f'Every waveform must be at most length ({length} samples)')
+
+    arr = np.full((len(waveforms), length), pad_value, dtype=dtype)
+    # Mask of where the waveform samples go in each row, filled in row major order like the concatenation
+    samples = np.arange(length)
+    mask = samples < lengths if pad_side == 'right' else samples >= length - lengths
+    if len(waveforms):
+        arr[mask] = np.concatenate([np.asarray(waveform).ravel() for waveform in waveforms])
+    return arr
+
+# Get the modulo 64 lengths of a batch of pulse widths
+def lengths_mod_64(pulse_widths: np.ndarray or list,
+                   sample_rate: int) -> (np.ndarray, np.ndarray):
+    """
+    Batched length_mod_64.
+
+    Parameters
+    ----------
+    pulse_widths : np.ndarray | list
+        Pulse widths in seconds.
+    sample_rate : int
+        Sample rate of the device.
+
+    Returns
+    -------
+    num_samples_64 : np.ndarray
+        Number of samples of each pulse, rounded up to modulo 64.
+    new_duration : np.ndarray
+        Durations in seconds, as returned by length_mod_64.
+    """
+    num_samples = np.asarray(pulse_widths, dtype=float) * sample_rate
+    num_samples_64 = (np.ceil(num_samples / 64) * 64).astype(np.int64)
+    return num_samples_64, num_samples / sample_rate
+
+# Pack a batch of channel waveforms into a matrix of dpg11 words
+@instrumented('waveforms.pack_channel_batch')
+def pack_channel_batch(wave_dict: dict) -> np.ndarray:
+    """
+    Batched pack_channels. Each channel is a 2-D array with one row per point, or a 1-D array that is the same
+    for every point, and row i of the result is the packed words of point i.
+
+    Parameters
+    ----------
+    wave_dict : dict
+        Waveform dictionary of the form {1: ch1_waveform_rows, 3: ch3_waveform}. Any nonzero value is treated
+        as the channel being on.
+
+    Returns
+    -------
+    words : np.ndarray
+        uint16 array of shape (num_points, num_samples).
+    """
+    if len(wave_dict) == 0:
+        raise ValueError('wave_dict must contain at least one channel')
+
+    arrays = {channel: np.asarray(waveform) for channel, waveform in wave_dict.items()}
+    try:
+        shape = np.broadcast_shapes(*[np.atleast_2d(waveform).shape for waveform in arrays.values()])
+    except ValueError:
+        raise ValueError(f'The waveforms in wave_dict do not have matching shapes '
+                         f'(Received {[waveform.shape for waveform in arrays.values()]})')
+
+    words = np.zeros(shape, dtype=np.uint16)
+    scratch = np.empty(shape, dtype=np.uint16)
+    for channel, waveform in arrays.items():
+        if not 1 <= int(channel) <= WORD_BITS:
+            raise ValueError(f'Channel numbers must be between 1 and {WORD_BITS} (Received {channel})')
+        # Shift the channel bit into place and OR it into the words
+        np.copyto(scratch, waveform != 0, casting='unsafe')
+        scratch <<= np.uint16(int(channel) - 1)
+        words |= scratch
+    return words
@@ -0,0 +1,242 @@
+# Module for comparing dpg11 wavefiles channel by channel, run as a script with
+#     python -m dpg11_pylib.waveforms.diff wavefile_a wavefile_b
+import argparse
+import sys
+
+import numpy as np
+
+from dpg11_pylib.waveforms.packing import WORD_BITS, pack_channels
+from dpg11_pylib.waveforms.wavefile import NUM_CHANNELS, READ_CHUNK_SIZE, as_words, iter_wavefile_words
+
+
+class ChannelDiff:
+    """
+    The result of comparing a single channel of two waveforms.
+
+    Attributes
+    ----------
+    channel : int
+        The channel number.
+    first_mismatch : int | None
+        Index of the first sample where the channel differs, None if it matches.
+    num_mismatches : int
+        Number of samples where the channel differs.
+    """
+
+    def __init__(self,
+                 channel: int,
+                 first_mismatch: int = None,
+                 num_mismatches: int = 0):
+        self.channel = channel
+        self.first_mismatch = first_mismatch
+        self.num_mismatches = num_mismatches
+
+    @property
+    def match(self) -> bool:
+        return self.num_mismatches == 0
+
+    def __repr__(self) -> str:
+        return (f'ChannelDiff(channel={self.channel}, first_mismatch={self.first_mismatch}, '
+                f'num_mismatches={self.num_mismatches})')
+
+
+class WavefileDiff:
+    """
+    The result of comparing two waveforms with diff_wavefiles.
+
+    Attributes
+    ----------
+    channels : dict
+        ChannelDiff of each compared channel, keyed by channel number.
+    num_samples : tuple
+        Number of samples of each waveform.
+    num_mismatched_words : int
+        Number of samples where any bit of the words differs, including bits of channels that were not compared.
+        Only the samples both waveforms have are compared.
+    """
+
+    def __init__(self,
+                 channels: dict,
+                 num_samples: tuple,
+                 num_mismatched_words: int):
+        self.channels = channels
+        self.num_samples = num_samples
+        self.num_mismatched_words = num_mismatched_words
+
+    @property
+    def match(self) -> bool:
+        return self.num_mismatched_words == 0 and self.num_samples[0] == self.num_samples[1]
+
+    def first_mismatch(self):
+        """
+        Get the first sample where any compared channel differs, None if they all match.
+        """
+        mismatches = [diff.first_mismatch for diff in self.channels.values() if diff.first_mismatch is not None]
+        return min(mismatches) if mismatches else None
+
+    def mismatched_channels(self) -> list:
+        """
+        Get the channel numbers that differ.
+        """
+        return [channel for channel, diff in self.channels.items() if not diff.match]
+
+    def __getitem__(self, channel: int) -> ChannelDiff:
+        return self.channels[channel]
+
+    def __repr__(self) -> str:
+        return (f'WavefileDiff(match={self.match}, num_samples={self.num_samples}, '
+                f'mismatched_channels={self.mismatched_channels()})')
+
+    def __str__(self) -> str:
+        lines = [f'samples: {self.num_samples[0]} vs {self.num_samples[1]}',
+                 f'{"channel":>7} {"match":>6} {"first mismatch":>15} {"mismatches":>11}']
+        for channel, diff in self.channels.items():
+            first_mismatch = '-' if diff.first_mismatch is None else diff.first_mismatch
+            lines.append(f'{channel:>7} {str(diff.match):>6} {first_mismatch:>15} {diff.num_mismatches:>11}')
+        return '\n'.join(lines)
+
+
+# Function to iterate over the words of a wavefile, channel dictionary or word array in chunks
+def iter_source_words(source,
+                      chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Yield the words of a waveform in chunks of chunk_size words (the last chunk may be shorter).
+
+    Parameters
+    ----------
+    source : str | dict | np.ndarray
+        Path of a wavefile, a waveform dictionary of the form {1: ch1_waveform_array} as passed to
+        create_wave_file, or an array of packed words.
+    chunk_size : int, optional
+        Number of words per chunk. Default is READ_CHUNK_SIZE.
+
+    Yields
+    ------
+    np.ndarray
+        uint16 array of the words of each chunk.
+    """
+    if isinstance(source, str):
+        yield from iter_wavefile_words(source, chunk_size=chunk_size)
+        return
+
+    words = pack_channels(source) if isinstance(source, dict) else as_words(source)
+    for start in range(0, len(words), chunk_size):
+        yield words[start:start + chunk_size]
+
+# Function to compare two waveforms channel by channel
+def diff_wavefiles(source_a,
+                   source_b,
+                   channels: list = None,
+                   chunk_size: int = READ_CHUNK_SIZE) -> WavefileDiff:
+    """
+    Compare two waveforms channel by channel, such as the wavefile create_wave_file wrote against the waveform
+    dictionary it was given. The waveforms are compared a chunk at a time on the packed words, XORing the words
+    and testing one bit of the difference per channel, so they are never expanded into channel arrays and
+    wavefiles are never read into memory whole.
+
+    Parameters
+    ----------
+    source_a, source_b : str | dict | np.ndarray
+        Path of a wavefile, a waveform dictionary of the form {1: ch1_waveform_array}, or an array of packed
+        words. Channels missing from a dictionary are off.
+    channels : list, optional
+        Channel numbers to compare. Default is None, which compares channels 1 to NUM_CHANNELS.
+    chunk_size : int, optional
+        Number of samples compared at a time. Default is READ_CHUNK_SIZE.
+
+    Returns
+    -------
+    WavefileDiff
+        The ChannelDiff of every channel. If the waveforms have different lengths, only the samples both of them
+        have are compared, and the diff does not match.
+
+    Examples
+    --------
+    >>> diff = diff_wavefiles('C:/dax22000/wavefiles/cwodmr_4096.txt', wave_dict)
+    >>> diff.match
+    False
+    >>> diff[1].first_mismatch
+    2048
+    """
+    if channels is None:
+        channels = range(1, NUM_CHANNELS + 1)
+    channels = [int(channel) for channel in channels]
+    for channel in channels:
+        if not 1 <= channel <= WORD_BITS:
+            raise ValueError(f'Channel numbers must be between 1 and {WORD_BITS} (Received {channel})')
+    bits = [np.uint16(1 << (channel - 1)) for channel in channels]
+
+    first_mismatches = [None] * len(channels)
+    num_mismatches = [0] * len(channels)
+    num_mismatched_words = 0
+    num_samples = [0, 0]
+
+    chunks_a = iter_source_words(source_a, chunk_size=chunk_size)
+    chunks_b = iter_source_words(source_b, chunk_size=chunk_size)
+    empty = np.empty(0, dtype=np.uint16)
+    while True:
+        words_a = next(chunks_a, empty)
+        words_b = next(chunks_b, empty)
+        if len(words_a) == 0 and len(words_b) == 0:
+            break
+
+        offset = min(num_samples)
+        num_samples[0] += len(words_a)
+        num_samples[1] += len(words_b)
+        # Both sources give full chunks until one of them ends, so the chunks line up
+        common = min(len(words_a), len(words_b))
+        difference = np.bitwise_xor(words_a[:common], words_b[:common])
+        num_changed = np.count_nonzero(difference)
+        if num_changed == 0:
+            continue
+        num_mismatched_words += num_changed
+
+        scratch = np.empty(common, dtype=np.uint16)
+        for i, bit in enumerate(bits):
+            np.bitwise_and(difference, bit, out=scratch)
+            count = np.count_nonzero(scratch)
+            if count:
+                num_mismatches[i] += count
+                if first_mismatches[i] is None:
+                    first_mismatches[i] = offset + int(np.flatnonzero(scratch)[0])
+
+    return WavefileDiff({channel: ChannelDiff(channel, first_mismatch, count)
+                         for channel, first_mismatch, count in zip(channels, first_mismatches, num_mismatches)},
+                        tuple(num_samples),
+                        num_mismatched_words)
+
+# Function to run the wavefile comparison from the command line
+def main(argv: list = None) -> int:
+    """
+    Compare two wavefiles from the command line and print the result of each channel.
+
+    Returns
+    -------
+    int
+        Exit status, 0 if the wavefiles match and 1 if they do not.
+    """
+    parser = argparse.ArgumentParser(prog='python -m dpg11_pylib.waveforms.diff',
+                                     description='Compare two dpg11 wavefiles channel by channel.')
+    parser.add_argument('wavefile_a', help='path of the first wavefile')
+    parser.add_argument('wavefile_b', help='path of the second wavefile')
+    parser.add_argument('-c', '--channels', type=int, nargs='+', default=None,
+                        help=f'channels to compare, default is 1 to {NUM_CHANNELS}')
+    parser.add_argument('--chunk-size', type=int, default=READ_CHUNK_SIZE,
+                        help=f'number of samples compared at a time, default is {READ_CHUNK_SIZE}')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='only set the exit status')
+    args = parser.parse_args(argv)
+
+    diff = diff_wavefiles(args.wavefile_a, args.wavefile_b, channels=args.channels, chunk_size=args.chunk_size)
+    if not args.quiet:
+        print(diff)
+        if diff.match:
+            print('The wavefiles match')
+        else:
+            first_mismatch = diff.first_mismatch()
+            print('The wavefiles differ' + ('' if first_mismatch is None else f', first at sample {first_mismatch}'))
+    return 0 if diff.match else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+# Module for packing channel waveforms into the 16 bit words used by the dpg11 wavefiles
+import numpy as np
+
+from dpg11_pylib.instrumentation.recorder import instrumented
+from dpg11_pylib.waveforms.run_length import RunLengthWaveform
+from dpg11_pylib.waveforms.wavefile import NUM_CHANNELS, as_words, read_wavefile_words, unpack_channels
+
+# Number of bits in a single dpg11 wavefile word. Channel n is stored in bit n - 1.
+WORD_BITS = 16
+
+# Function to get the number of points in a channel dictionary
+def channel_dict_length(wave_dict: dict) -> int:
+    """
+    Get the number of points of the waveforms in a channel dictionary, checking that they all match.
+
+    Parameters
+    ----------
+    wave_dict : dict
+        Waveform dictionary of the form {channel_number: waveform_array}, or a PackedWaveform.
+
+    Returns
+    -------
+    num_points : int
+        Number of points in each waveform.
+    """
+    if isinstance(wave_dict, PackedWaveform):
+        return len(wave_dict)
+    if len(wave_dict) == 0:
+        raise ValueError('wave_dict must contain at least one channel')
+
+    lengths = {len(waveform) for waveform in wave_dict.values()}
+    if len(lengths) != 1:
+        raise ValueError(f'All waveforms in wave_dict must be the same length (Received lengths {sorted(lengths)})')
+
+    return lengths.pop()
+
+# Function to pack a channel dictionary straight into the dpg11 words
+@instrumented('waveforms.pack_channels')
+def pack_channels(wave_dict: dict,
+                  num_points: int = None) -> np.ndarray:
+    """
+    Pack a channel dictionary into an array of uint16 words, where channel n sets bit n - 1 of each word.
+    Only the channels present in wave_dict are touched, so the cost scales with the number of used channels
+    rather than with all 16 bits of the word. RunLengthWaveform channels are never expanded to samples, their
+    edges are added to a single difference array that is summed once at the end.
+
+    Parameters
+    ----------
+    wave_dict : dict
+        Waveform dictionary of the form {1: ch1_waveform_array, 3: ch3_waveform_array}. Any nonzero
+        value is treated as the channel being on. The waveforms may also be RunLengthWaveform. A PackedWaveform
+        is already packed, and its words are returned without a copy.
+    num_points : int, optional
+        Number of points in the waveforms. Default is None, which determines it from wave_dict.
+
+    Returns
+    -------
+    words : np.ndarray
+        uint16 array of length num_points with the packed channel bits.
+    """
+    if num_points is None:
+        num_points = channel_dict_length(wave_dict)
+    if isinstance(wave_dict, PackedWaveform):
+        if len(wave_dict) != num_points:
+            raise ValueError(f'PackedWaveform has {len(wave_dict)} points, expected {num_points}')
+        return wave_dict.words
+
+    words = np.zeros(num_points, dtype=np.uint16)
+    # Scratch buffers that are reused for every channel so we do not allocate per channel
+    scratch = None
+    nonzero = None
+    # Difference array of the run length channels, the words are its cumulative sum
+    edge_deltas = None
+
+    for channel, waveform in wave_dict.items():
+        if not 1 <= int(channel) <= WORD_BITS:
+            raise ValueError(f'Channel numbers must be between 1 and {WORD_BITS} (Received {channel})')
+        if len(waveform) != num_points:
+            raise ValueError(f'Waveform on channel {channel} has {len(waveform)} points, expected {num_points}')
+
+        if isinstance(waveform, RunLengthWaveform):
+            if edge_deltas is None:
+                edge_deltas = np.zeros(num_points + 1, dtype=np.int32)
+            # Each channel has its own bit, so adding the bit at the rising edges and removing it at the
+            # falling edges is the same as an OR once summed. The starts of one channel are all distinct.
+            starts, ends = waveform.on_intervals()
+            edge_deltas[starts] += 1 << (int(channel) - 1)
+            edge_deltas[ends] -= 1 << (int(channel) - 1)
+            continue
+
+        if scratch is None:
+            scratch = np.empty(num_points, dtype=np.uint16)
+        bits = np.asarray(waveform)
+        if bits.dtype != np.bool_:
+            if nonzero is None:
+                nonzero = np.empty(num_points, dtype=np.bool_)
+            bits = np.not_equal(bits, 0, out=nonzero)
+        # Shift the channel bit into place straight from the bytes of the booleans, without copying the
+        # waveform, and OR it into the words
+        np.left_shift(bits.view(np.uint8), np.uint16(int(channel) - 1), out=scratch)
+        words |= scratch
+
+    if edge_deltas is not None:
+        words |= np.cumsum(edge_deltas[:-1]).astype(np.uint16)
+
+    return words
+
+# Function to pack a stacked binary array (most significant bit in the first column) into words
+def pack_stacked_bits(stack_arr: np.ndarray) -> np.ndarray:
+    """
+    Convert a stacked binary array, where each row is a sample and the first column is the most significant
+    bit, into an array of integer words using weighted sums instead of string parsing. The sums are accumulated
+    one column at a time, so a bool or uint8 stack is never converted to int64 as a whole.
+
+    Parameters
+    ----------
+    stack_arr : np.ndarray
+        Stacked binary array of shape (num_points, num_bits).
+
+    Returns
+    -------
+    words : np.ndarray
+        int64 array of length num_points.
+    """
+    stack_arr = np.asarray(stack_arr)
+    if not (np.issubdtype(stack_arr.dtype, np.integer) or stack_arr.dtype == np.bool_):
+        stack_arr = stack_arr.astype(np.int64)
+    words = np.zeros(len(stack_arr), dtype=np.int64)
+    # Horner's rule from the most significant column, the same as the weighted sum for any integer values
+    for column in stack_arr.T:
+        words <<= 1
+        words += column
+    return words
+
+
+class PackedWaveform:
+    """
+    Program of all the channels of the dpg11 stored as one uint16 word per sample, the same words that are written
+    to the wavefiles, where channel n is bit n - 1. Reading and writing a channel only touches its bit plane, so a
+    sweep that changes one channel updates it in place instead of rebuilding and repacking a waveform dictionary.
+    It can be given to DPG11Device.create_wave_file (and anywhere else a wave_dict is packed) and to
+    wavefile2arrays in place of a waveform dictionary or a wavefile.
+
+    Slices share the words of the waveform they are taken from, like numpy views, so setting a channel of a
+    slice sets it in the original.
+
+    Examples
+    --------
+    >>> program = PackedWaveform.from_channels({2: on_array(6400), 3: off_on_array(4, 6400)})
+    >>> program.set_channel(1, pad_waveform(on_array(640), 6400))
+    >>> program.channels
+    [1, 2, 3]
+    >>> wave_filename = device.create_wave_file('cwodmr', program)
+    """
+
+    def __init__(self,
+                 words: np.ndarray or list):
+        """
+        Parameters
+        ----------
+        words : np.ndarray | list
+            The 16 bit words of the program. A uint16 array is used as is, without a copy.
+        """
+        words = as_words(words)
+        if words.ndim != 1:
+            raise ValueError(f'words must be a 1D array (Received shape {words.shape})')
+        self.words = words
+
+    # Constructors
+    @classmethod
+    def zeros(cls,
+              num_points: int = 64):
+        """
+        Program with every channel off for num_points samples.
+        """
+        return cls(np.zeros(num_points, dtype=np.uint16))
+
+    @classmethod
+    def from_channels(cls,
+                      wave_dict: dict,
+                      num_points: int = None):
+        """
+        Pack a waveform dictionary, see pack_channels.
+
+        Parameters
+        ----------
+        wave_dict : dict
+            Waveform dictionary of the form {1: ch1_waveform_array, 3: ch3_waveform_array}.
+        num_points : int, optional
+            Number of points in the waveforms. Default is None, which determines it from wave_dict.
+
+        Returns
+        -------
+        PackedWaveform
+            The packed program.
+        """
+        return cls(pack_channels(wave_dict, num_points))
+
+    @classmethod
+    def from_wavefile(cls,
+                      path: str,
+                      sidecar: bool = False):
+        """
+        Read a wavefile without unpacking it, see read_wavefile_words.
+
+        Parameters
+        ----------
+        path : str
+            Path of the wavefile.
+        sidecar : bool, optional
+            If True, cache the words in a .npy sidecar for instant reloads. Default is False.
+
+        Returns
+        -------
+        PackedWaveform
+            The program of the wavefile.
+        """
+        return cls(read_wavefile_words(path, sidecar=sidecar))
+
+    @classmethod
+    def join(cls,
+             waveform_arr: list):
+        """
+        Join multiple programs together in the order given, the packed version of join_waveforms.
+
+        Parameters
+        ----------
+        waveform_arr : list
+            List of PackedWaveform, or waveform dictionaries, to join.
+
+        Returns
+        -------
+        PackedWaveform
+            Joined program.
+        """
+        waveform_arr = [cls.coerce(waveform) for waveform in waveform_arr]
+        if len(waveform_arr) == 0:
+            return cls(np.zeros(0, dtype=np.uint16))
+        return cls(np.concatenate([waveform.words for waveform in waveform_arr]))
+
+    @classmethod
+    def coerce(cls,
+               waveform):
+        """
+        Return waveform as a PackedWaveform, packing it if it is a waveform dictionary.
+        """
+        if isinstance(waveform, cls):
+            return waveform
+        if isinstance(waveform, dict):
+            return cls.from_channels(waveform)
+        return cls(waveform)
+
+    # Properties
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def channels(self) -> list:
+        """
+        Channels that are on for at least one sample.
+        """
+        used_bits = int(np.bitwise_or.reduce(self.words)) if len(self.words) else 0
+        return [bit + 1 for bit in range(WORD_BITS) if used_bits >> bit & 1]
+
+    def __repr__(self) -> str:
+        return f'PackedWaveform(length={len(self)}, channels={self.channels})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PackedWaveform):
+            return NotImplemented
+        return np.array_equal(self.words, other.words)
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or np.dtype(dtype) == self.words.dtype:
+            return self.words.copy() if copy else self.words
+        return self.words.astype(dtype)
+
+    # Channels
+    def channel_bit(self,
+                    channel: int) -> np.uint16:
+        """
+        Bit of the words that holds a channel.
+        """
+        if not 1 <= int(channel) <= WORD_BITS:
+            raise ValueError(f'Channel numbers must be between 1 and {WORD_BITS} (Received {channel})')
+        return np.uint16(1 << (int(channel) - 1))
+
+    def channel(self,
+                channel: int,
+                dtype=np.bool_) -> np.ndarray:
+        """
+        Unpack the bit plane of a channel.
+
+        Parameters
+        ----------
+        channel : int
+            Channel number, from 1.
+        dtype : data-type, optional
+            dtype of the plane, such as np.bool_ or np.uint8. Default is np.bool_.
+
+        Returns
+        -------
+        np.ndarray
+            Array of 1s and 0s of length len(self).
+        """
+        plane = np.empty(len(self), dtype=dtype)
+        np.not_equal(self.words & self.channel_bit(channel), 0, out=plane, casting='unsafe')
+        return plane
+
+    def set_channel(self,
+                    channel: int,
+                    waveform):
+        """
+        Set the bit plane of a channel in place, leaving the other channels untouched.
+
+        Parameters
+        ----------
+        channel : int
+            Channel number, from 1.
+        waveform : np.ndarray | list | RunLengthWaveform | int
+            Waveform of length len(self), where any nonzero value is treated as on, or 0 or 1 to turn the
+            channel off or on for every sample. A bool array is used without a copy.
+        """
+        bit = self.channel_bit(channel)
+        bits = None
+        if not isinstance(waveform, RunLengthWaveform):
+            bits = np.asarray(waveform)
+            if bits.ndim == 0:
+                # The same value for every sample
+                self.words &= ~bit
+                if bits:
+                    self.words |= bit
+                return
+        # Check the length before touching the words, so a bad waveform leaves the channel as it was
+        if len(waveform) != len(self):
+            raise ValueError(f'Waveform on channel {channel} has {len(waveform)} points, expected {len(self)}')
+
+        self.words &= ~bit
+        if bits is None:
+            for start, end in zip(*waveform.on_intervals()):
+                self.words[start:end] |= bit
+            return
+        if bits.dtype != np.bool_:
+            bits = bits != 0
+        np.bitwise_or(self.words, bit, out=self.words, where=bits)
+
+    def clear_channel(self,
+                      channel: int):
+        """
+        Turn a channel off for every sample, in place.
+        """
+        self.words &= ~self.channel_bit(channel)
+
+    def to_dict(self,
+                channels: list = None,
+                dtype=np.bool_) -> dict:
+        """
+        Unpack the program into a waveform dictionary.
+
+        Parameters
+        ----------
+        channels : list, optional
+            Channels to unpack. Default is None, which unpacks the channels that are used.
+        dtype : data-type, optional
+            dtype of the planes. Default is np.bool_.
+
+        Returns
+        -------
+        dict
+            Waveform dictionary of the form {channel_number: waveform_array}.
+        """
+        if channels is None:
+            channels = self.channels
+        return {channel: self.channel(channel, dtype=dtype) for channel in channels}
+
+    def to_planes(self,
+                  num_channels: int = NUM_CHANNELS,
+                  dtype=np.bool_) -> np.ndarray:
+        """
+        Unpack the program into channel planes, see unpack_channels.
+        """
+        return unpack_channels(self.words, num_channels=num_channels, dtype=dtype)
+
+    # Operations
+    def copy(self):
+        """
+        Copy of the program that does not share its words.
+        """
+        return PackedWaveform(self.words.copy())
+
+    def concat(self,
+               *others):
+        """
+        Join this program with others, in order.
+        """
+        return self.join([self, *others])
+
+    def __add__(self, other):
+        return self.concat(other)
+
+    def repeat(self,
+               num_repeats: int):
+        """
+        Repeat the program a given number of times, the packed version of repeat_waveform.
+        """
+        if num_repeats < 0:
+            raise ValueError('num_repeats must not be negative')
+        return PackedWaveform(np.tile(self.words, num_repeats))
+
+    def __getitem__(self, index):
+        """
+        Slice the program, sharing its words, or get the word of a single sample.
+        """
+        if isinstance(index, slice):
+            return PackedWaveform(self.words[index])
+        return int(self.words[index])
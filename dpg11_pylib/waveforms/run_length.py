@@ -0,0 +1,281 @@
+# Module for the run length (edge list) representation of dpg11 waveforms
+import numpy as np
+
+
+class RunLengthWaveform:
+    """
+    Single channel waveform stored as runs of a constant value, ie a list of edges, instead of one entry per sample.
+    Pulse patterns are usually a few dozen edges across millions of samples, so joining, repeating, padding and
+    slicing them here costs time proportional to the number of runs rather than the number of samples.
+    The waveform is only expanded to samples with to_array(), or packed straight into words when it is put in the
+    wave_dict of DPG11Device.create_wave_file.
+
+    Examples
+    --------
+    >>> pulse = RunLengthWaveform.on(640).pad(6400)
+    >>> train = pulse.repeat(1000)
+    >>> len(train), train.num_runs
+    (6400000, 2000)
+    """
+
+    def __init__(self,
+                 values: np.ndarray or list,
+                 lengths: np.ndarray or list):
+        """
+        Parameters
+        ----------
+        values : np.ndarray | list
+            Value of each run, either 0 or 1.
+        lengths : np.ndarray | list
+            Number of samples in each run.
+        """
+        values = np.asarray(values, dtype=np.uint8)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if values.shape != lengths.shape or values.ndim != 1:
+            raise ValueError('values and lengths must be 1D arrays of the same length')
+        if np.any(values > 1):
+            raise ValueError('values must be either 0 or 1')
+        if np.any(lengths < 0):
+            raise ValueError('lengths must not be negative')
+
+        # Drop the empty runs and merge neighbouring runs with the same value
+        keep = lengths > 0
+        values, lengths = values[keep], lengths[keep]
+        if len(values) > 1:
+            run_starts = np.flatnonzero(np.diff(values)) + 1
+            run_starts = np.concatenate(([0], run_starts))
+            lengths = np.add.reduceat(lengths, run_starts)
+            values = values[run_starts]
+
+        self.values = values
+        self.lengths = lengths
+        self.length = int(lengths.sum())
+
+    # Constructors
+    @classmethod
+    def on(cls,
+           length: int = 64):
+        """
+        Waveform that is on for length samples, the run length version of on_array.
+        """
+        return cls([1], [length])
+
+    @classmethod
+    def off(cls,
+            length: int = 64):
+        """
+        Waveform that is off for length samples, the run length version of off_array.
+        """
+        return cls([0], [length])
+
+    @classmethod
+    def from_array(cls,
+                   waveform: np.ndarray or list):
+        """
+        Compress a waveform array of 1s and 0s into runs.
+
+        Parameters
+        ----------
+        waveform : np.ndarray | list
+            Waveform to compress. Any nonzero value is treated as on.
+
+        Returns
+        -------
+        RunLengthWaveform
+            The compressed waveform.
+        """
+        waveform = np.asarray(waveform) != 0
+        if len(waveform) == 0:
+            return cls([], [])
+        edges = np.flatnonzero(waveform[1:] != waveform[:-1]) + 1
+        run_starts = np.concatenate(([0], edges))
+        run_ends = np.concatenate((edges, [len(waveform)]))
+        return cls(waveform[run_starts], run_ends - run_starts)
+
+    @classmethod
+    def join(cls,
+             waveform_arr: list):
+        """
+        Join multiple waveforms together in the order given, the run length version of join_waveforms.
+
+        Parameters
+        ----------
+        waveform_arr : list
+            List of RunLengthWaveform to join.
+
+        Returns
+        -------
+        RunLengthWaveform
+            Joined waveform.
+        """
+        waveform_arr = [cls.coerce(waveform) for waveform in waveform_arr]
+        if len(waveform_arr) == 0:
+            return cls([], [])
+        return cls(np.concatenate([waveform.values for waveform in waveform_arr]),
+                   np.concatenate([waveform.lengths for waveform in waveform_arr]))
+
+    @classmethod
+    def coerce(cls,
+               waveform):
+        """
+        Return waveform as a RunLengthWaveform, compressing it if it is an array.
+        """
+        if isinstance(waveform, cls):
+            return waveform
+        return cls.from_array(waveform)
+
+    # Properties
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def num_runs(self) -> int:
+        """
+        Number of runs of constant value in the waveform.
+        """
+        return len(self.lengths)
+
+    @property
+    def run_starts(self) -> np.ndarray:
+        """
+        Sample index at which each run starts, ie the positions of the edges.
+        """
+        return np.concatenate(([0], np.cumsum(self.lengths)[:-1])).astype(np.int64)
+
+    def __repr__(self) -> str:
+        return f'RunLengthWaveform(length={self.length}, num_runs={self.num_runs})'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RunLengthWaveform):
+            return NotImplemented
+        return np.array_equal(self.values, other.values) and np.array_equal(self.lengths, other.lengths)
+
+    # Operations
+    def concat(self,
+               *others):
+        """
+        Join this waveform with others, in order.
+        """
+        return self.join([self, *others])
+
+    def __add__(self, other):
+        return self.concat(other)
+
+    def repeat(self,
+               num_repeats: int):
+        """
+        Repeat the waveform a given number of times, the run length version of repeat_waveform.
+
+        Parameters
+        ----------
+        num_repeats : int
+            Number of times to repeat the waveform.
+
+        Returns
+        -------
+        RunLengthWaveform
+            Repeated waveform.
+        """
+        if num_repeats < 0:
+            raise ValueError('num_repeats must not be negative')
+        return RunLengthWaveform(np.tile(self.values, num_repeats), np.tile(self.lengths, num_repeats))
+
+    def pad(self,
+            length: int,
+            pad_value: int = 0,
+            pad_side: str = 'right'):
+        """
+        Pad the waveform with either 1s or 0s to a given length, the run length version of pad_waveform.
+
+        Parameters
+        ----------
+        length : int
+            Length to pad the waveform to.
+        pad_value : int
+            Value to pad the waveform with. Default is 0.
+        pad_side : str
+            Side to pad the waveform on. Default is 'right'.
+
+        Returns
+        -------
+        RunLengthWaveform
+            Padded waveform.
+        """
+        if pad_value not in [0, 1]:
+            raise ValueError('pad_value must be either 0 or 1')
+        if length < self.length:
+            raise ValueError(f'Cannot pad a waveform of length {self.length} to length {length}')
+
+        padding = RunLengthWaveform([pad_value], [length - self.length])
+        if pad_side == 'right':
+            return self.concat(padding)
+        elif pad_side == 'left':
+            return padding.concat(self)
+        else:
+            raise ValueError('pad_side must be either "right" or "left"')
+
+    def __getitem__(self, index):
+        """
+        Slice the waveform with a slice of step 1, or get the value of a single sample.
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                raise ValueError('RunLengthWaveform only supports slices with a step of 1')
+            stop = max(start, stop)
+            run_ends = np.cumsum(self.lengths)
+            # Runs that overlap [start, stop)
+            first = np.searchsorted(run_ends, start, side='right')
+            last = np.searchsorted(run_ends, stop, side='left')
+            if start == stop:
+                return RunLengthWaveform([], [])
+            values = self.values[first:last + 1]
+            lengths = self.lengths[first:last + 1].copy()
+            run_starts = run_ends[first:last + 1] - lengths
+            # Trim the first and last runs to the slice
+            lengths[-1] = stop - run_starts[-1]
+            lengths[0] -= start - run_starts[0]
+            return RunLengthWaveform(values, lengths)
+
+        index = int(index)
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('RunLengthWaveform index out of range')
+        return int(self.values[np.searchsorted(np.cumsum(self.lengths), index, side='right')])
+
+    # Expansion
+    def to_array(self,
+                 dtype=np.uint8) -> np.ndarray:
+        """
+        Expand the waveform to one entry per sample.
+
+        Parameters
+        ----------
+        dtype : optional
+            dtype of the returned array. Default is np.uint8, like the arrays from the waveforms module.
+
+        Returns
+        -------
+        np.ndarray
+            Array of 1s and 0s of length len(self).
+        """
+        return np.repeat(self.values, self.lengths).astype(dtype, copy=False)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_array(dtype if dtype is not None else np.uint8)
+
+    def on_intervals(self) -> (np.ndarray, np.ndarray):
+        """
+        Get the sample intervals [start, end) where the waveform is on.
+
+        Returns
+        -------
+        starts : np.ndarray
+            First sample of each on interval.
+        ends : np.ndarray
+            Sample after the last sample of each on interval.
+        """
+        run_ends = np.cumsum(self.lengths)
+        is_on = self.values == 1
+        return (run_ends - self.lengths)[is_on], run_ends[is_on]
@@ -0,0 +1,399 @@
+# Module for reading and writing dpg11 wavefiles in bulk
+import io
+import os
+import tempfile
+import warnings
+
+import numpy as np
+
+from dpg11_pylib.instrumentation.recorder import add_bytes
+
+# Number of words formatted at once when writing a wavefile. Keeps the memory of the formatting bounded.
+WRITE_CHUNK_SIZE = 2 ** 20
+# Line ending of the wavefiles. Matches what writing the file in text mode gives on this platform.
+NEWLINE = os.linesep.encode()
+# Number of channels of the dpg11
+NUM_CHANNELS = 11
+# Number of words per chunk when streaming a wavefile
+READ_CHUNK_SIZE = 2 ** 20
+# Bytes read from the file per chunk of words, enough for most words to be 5 digits and a newline
+READ_BYTES_PER_WORD = 6
+# Permissions of the files written, the same as open() gives a new file. os.umask can only be read by setting it,
+# so it is read once here rather than on every write, where it would race with other threads creating files.
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+FILE_MODE = 0o666 & ~UMASK
+
+# Function to build the lookup tables used to format the words
+def word_digit_tables() -> (np.ndarray, np.ndarray):
+    """
+    Build the lookup tables of the decimal digits of every possible 16 bit word.
+
+    Returns
+    -------
+    num_digits : np.ndarray
+        uint8 array of length 2**16 with the number of decimal digits of each word.
+    digits : np.ndarray
+        uint8 array of shape (5, 2**16), where digits[j, word] is the ASCII code of the j-th digit of word
+        counting from the right.
+    """
+    values = np.arange(2 ** 16)
+    num_digits = (1 + (values >= 10).astype(np.uint8) + (values >= 100) + (values >= 1000) + (values >= 10000))
+    digits = np.stack([(values // 10 ** j) % 10 + ord('0') for j in range(5)], axis=0).astype(np.uint8)
+    return num_digits.astype(np.uint8), digits
+
+# Lookup tables of the decimal digits of every 16 bit word
+WORD_NUM_DIGITS, WORD_DIGITS = word_digit_tables()
+
+# Function to check and convert words to uint16
+def as_words(words: np.ndarray or list) -> np.ndarray:
+    """
+    Convert an array of words to uint16, checking that all of the words fit in 16 bits.
+
+    Parameters
+    ----------
+    words : np.ndarray | list
+        Array of words.
+
+    Returns
+    -------
+    words : np.ndarray
+        uint16 array of the words.
+    """
+    words = np.asarray(words)
+    if words.dtype == np.uint16:
+        return words
+    if words.size and (words.min() < 0 or words.max() > 2 ** 16 - 1):
+        raise ValueError('All words must be between 0 and 65535')
+    return words.astype(np.uint16)
+
+# Function to format words into the text of a wavefile one chunk at a time
+def iter_formatted_words(words: np.ndarray or list,
+                         chunk_size: int = WRITE_CHUNK_SIZE):
+    """
+    Format words into the text of a dpg11 wavefile, one decimal word per line with no trailing newline.
+    The text is generated in chunks of chunk_size words by scattering the digits from a lookup table of every
+    16 bit word, so no Python level formatting is done per word.
+
+    Parameters
+    ----------
+    words : np.ndarray | list
+        Array of 16 bit words.
+    chunk_size : int, optional
+        Number of words per chunk. Default is WRITE_CHUNK_SIZE.
+
+    Yields
+    ------
+    bytes
+        The formatted text of each chunk.
+    """
+    words = as_words(words)
+    newline = np.frombuffer(NEWLINE, dtype=np.uint8)
+    for start in range(0, len(words), chunk_size):
+        chunk = words[start:start + chunk_size]
+        num_digits = WORD_NUM_DIGITS[chunk]
+        # Every line is the digits followed by the newline, so the ends of the lines follow from a cumsum
+        line_ends = np.cumsum(num_digits + len(newline), dtype=np.int64)
+        digit_ends = line_ends - len(newline)
+        text = np.empty(line_ends[-1], dtype=np.uint8)
+        for j, byte in enumerate(newline):
+            text[digit_ends + j] = byte
+        # Fill in the digits from the right, only for the words that have at least j + 1 digits
+        text[digit_ends - 1] = WORD_DIGITS[0][chunk]
+        min_digits, max_digits = num_digits.min(), num_digits.max()
+        for j in range(1, max_digits):
+            if j < min_digits:
+                text[digit_ends - 1 - j] = WORD_DIGITS[j][chunk]
+            else:
+                has_digit = num_digits > j
+                text[digit_ends[has_digit] - 1 - j] = WORD_DIGITS[j][chunk[has_digit]]
+        # The last line of the wavefile does not end with a newline
+        if start + chunk_size >= len(words):
+            text = text[:-len(newline)]
+        yield text.tobytes()
+
+# Function to atomically write a file
+def write_file_atomic(path: str,
+                      chunks) -> int:
+    """
+    Write chunks of bytes to a temporary file in the same directory as path and then rename it to path, so
+    nothing reading the directory ever sees a half written file.
+
+    Parameters
+    ----------
+    path : str
+        Final path of the file.
+    chunks : iterable of bytes
+        The contents of the file.
+
+    Returns
+    -------
+    num_bytes : int
+        Number of bytes written.
+    """
+    directory, filename = os.path.split(os.path.abspath(path))
+    # The temporary file is hidden and does not end in .txt so it is never mistaken for a finished file
+    fd, temp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.tmp', dir=directory)
+    num_bytes = 0
+    try:
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temp_path, FILE_MODE)
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                num_bytes += len(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    add_bytes(num_bytes)
+    return num_bytes
+
+# Function to write the words of a wavefile
+def write_wavefile(path: str,
+                   words: np.ndarray or list) -> int:
+    """
+    Atomically write a dpg11 wavefile with one decimal word per line.
+
+    Parameters
+    ----------
+    path : str
+        Path of the wavefile.
+    words : np.ndarray | list
+        Array of 16 bit words, such as the output of pack_channels.
+
+    Returns
+    -------
+    num_bytes : int
+        Number of bytes written.
+    """
+    return write_file_atomic(path, iter_formatted_words(words))
+
+# Function to write a text file, such as a multi-wavefile
+def write_text_atomic(path: str,
+                      text: str) -> int:
+    """
+    Atomically write a text file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    text : str
+        Text to write.
+
+    Returns
+    -------
+    num_bytes : int
+        Number of bytes written.
+    """
+    return write_file_atomic(path, [text.replace('\n', os.linesep).encode()])
+
+# Function to parse the decimal text of a wavefile into words
+def parse_words(text: bytes) -> np.ndarray:
+    """
+    Parse the text of a dpg11 wavefile into its words in bulk, with the C text parser of numpy instead of
+    parsing each line in Python.
+
+    Parameters
+    ----------
+    text : bytes
+        Text of the wavefile, decimal words separated by whitespace.
+
+    Returns
+    -------
+    words : np.ndarray
+        uint16 array of the words.
+    """
+    # numpy only warns and stops at text it cannot parse, so the warning is turned into an error
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            words = np.fromstring(text, dtype=np.int64, sep=' ')
+        except (DeprecationWarning, ValueError):
+            raise ValueError('The wavefile may only contain decimal words separated by whitespace')
+    return as_words(words)
+
+# Function to get the path of the binary sidecar of a wavefile
+def sidecar_path(path: str) -> str:
+    """
+    Path of the .npy sidecar that caches the words of a wavefile, next to the wavefile with the same name.
+    """
+    return os.path.splitext(path)[0] + '.npy'
+
+# Function to read the words of a wavefile
+def read_wavefile_words(path: str,
+                        sidecar: bool = False) -> np.ndarray:
+    """
+    Read the words of a dpg11 wavefile, see parse_words.
+
+    Parameters
+    ----------
+    path : str
+        Path of the wavefile.
+    sidecar : bool, optional
+        If True, the words are cached in a binary .npy sidecar next to the wavefile (see sidecar_path), and
+        later reads load the sidecar instead of parsing the text, as long as the sidecar is not older than the
+        wavefile. Default is False.
+
+    Returns
+    -------
+    words : np.ndarray
+        uint16 array of the words.
+    """
+    if sidecar:
+        npy_path = sidecar_path(path)
+        try:
+            if os.stat(npy_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+                return np.load(npy_path)
+        except (OSError, ValueError):
+            pass
+
+    with open(path, 'rb') as f:
+        words = parse_words(f.read())
+
+    if sidecar:
+        buffer = io.BytesIO()
+        np.save(buffer, words)
+        write_file_atomic(npy_path, [buffer.getvalue()])
+    return words
+
+# Function to unpack words into one plane of bits per channel
+def unpack_channels(words: np.ndarray or list,
+                    num_channels: int = NUM_CHANNELS,
+                    dtype=np.bool_) -> np.ndarray:
+    """
+    Unpack 16 bit words into channel planes, where plane n - 1 is channel n. Each plane is filled in a single
+    vectorized pass that tests its bit of every word.
+
+    Parameters
+    ----------
+    words : np.ndarray | list
+        Array of 16 bit words.
+    num_channels : int, optional
+        Number of channels to unpack, at most 16. Default is NUM_CHANNELS.
+    dtype : data-type, optional
+        dtype of the planes, such as np.bool_ or np.uint8. Default is np.bool_.
+
+    Returns
+    -------
+    planes : np.ndarray
+        Array of shape (num_channels, len(words)).
+    """
+    if not 1 <= num_channels <= 16:
+        raise ValueError(f'num_channels must be between 1 and 16 (Received {num_channels})')
+    words = as_words(words)
+    planes = np.empty((num_channels, len(words)), dtype=dtype)
+    for channel in range(num_channels):
+        np.not_equal(words & np.uint16(1 << channel), 0, out=planes[channel], casting='unsafe')
+    return planes
+
+# Function to read a wavefile into channel planes
+def read_wavefile(path: str,
+                  num_channels: int = NUM_CHANNELS,
+                  dtype=np.bool_,
+                  sidecar: bool = False) -> np.ndarray:
+    """
+    Read a dpg11 wavefile into compact channel planes, where plane n - 1 is channel n.
+
+    Parameters
+    ----------
+    path : str
+        Path of the wavefile.
+    num_channels : int, optional
+        Number of channels to unpack, at most 16. Default is NUM_CHANNELS.
+    dtype : data-type, optional
+        dtype of the planes, such as np.bool_ or np.uint8. Default is np.bool_.
+    sidecar : bool, optional
+        If True, cache the words in a .npy sidecar for instant reloads, see read_wavefile_words. Default is False.
+
+    Returns
+    -------
+    planes : np.ndarray
+        Array of shape (num_channels, num_points).
+    """
+    return unpack_channels(read_wavefile_words(path, sidecar=sidecar), num_channels=num_channels, dtype=dtype)
+
+# Function to stream the words of a wavefile in fixed size chunks
+def iter_wavefile_words(path: str,
+                        chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Streaming counterpart of read_wavefile_words. Yields the words of a dpg11 wavefile in chunks of chunk_size
+    words (the last chunk may be shorter), reading and parsing the file a block at a time so the memory used
+    does not grow with the size of the file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the wavefile.
+    chunk_size : int, optional
+        Number of words per chunk. Default is READ_CHUNK_SIZE.
+
+    Yields
+    ------
+    np.ndarray
+        uint16 array of the words of each chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be positive (Received {chunk_size})')
+
+    pending = np.empty(0, dtype=np.uint16)
+    remainder = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_size * READ_BYTES_PER_WORD)
+            if block:
+                block = remainder + block
+                # Keep the digits at the end of the block for the next one, the word may continue there
+                cut = len(block)
+                while cut > 0 and block[cut - 1:cut].isdigit():
+                    cut -= 1
+                remainder = block[cut:]
+                block = block[:cut]
+            else:
+                block, remainder = remainder, b''
+
+            pending = np.concatenate([pending, parse_words(block)])
+            while len(pending) >= chunk_size:
+                yield pending[:chunk_size]
+                pending = pending[chunk_size:]
+            if not block and not remainder:
+                break
+
+    if len(pending):
+        yield pending
+
+# Function to stream the channel planes of a wavefile in fixed size chunks
+def iter_wavefile(path: str,
+                  chunk_size: int = READ_CHUNK_SIZE,
+                  num_channels: int = NUM_CHANNELS,
+                  dtype=np.bool_):
+    """
+    Streaming counterpart of read_wavefile and wavefile2arrays. Yields the channel planes of a dpg11 wavefile in
+    chunks of chunk_size samples, see iter_wavefile_words.
+
+    Parameters
+    ----------
+    path : str
+        Path of the wavefile.
+    chunk_size : int, optional
+        Number of samples per chunk. Default is READ_CHUNK_SIZE.
+    num_channels : int, optional
+        Number of channels to unpack, at most 16. Default is NUM_CHANNELS.
+    dtype : data-type, optional
+        dtype of the planes, such as np.bool_ or np.uint8. Default is np.bool_.
+
+    Yields
+    ------
+    np.ndarray
+        Array of shape (num_channels, chunk_size) of each chunk, where plane n - 1 is channel n.
+
+    Examples
+    --------
+    >>> duty_cycle = np.zeros(11)
+    >>> for planes in iter_wavefile(wavefile):
+    ...     duty_cycle += planes.sum(axis=1)
+    """
+    for words in iter_wavefile_words(path, chunk_size=chunk_size):
+        yield unpack_channels(words, num_channels=num_channels, dtype=dtype)
@@ -1,8 +1,81 @@
 # Module for the creation of waveforms and other nice things like that
 import numpy as np
 
+from dpg11_pylib.instrumentation.recorder import instrumented
+from dpg11_pylib.waveforms.packing import PackedWaveform
+from dpg11_pylib.waveforms.wavefile import NUM_CHANNELS, read_wavefile_words, unpack_channels
+
+# Default dtype of the waveforms. One byte per sample instead of the 8 of int64.
+WAVEFORM_DTYPE = np.uint8
+
+# Function to get the array a waveform function writes into
+def output_array(length: int,
+                 dtype=WAVEFORM_DTYPE,
+                 out: np.ndarray = None) -> np.ndarray:
+    """
+    Get the array that a waveform function writes its result into, either a new array or the out buffer.
+
+    Parameters
+    ----------
+    length : int
+        Length of the waveform.
+    dtype : data-type
+        dtype of the new array. Default is WAVEFORM_DTYPE. Ignored if out is given.
+    out : np.ndarray, optional
+        1-D buffer of length length to write into, such as a column of a preallocated program. Default is None,
+        which allocates a new array.
+
+    Returns
+    -------
+    arr : np.ndarray
+        The array to write the waveform into.
+    """
+    if out is None:
+        return np.empty(length, dtype=dtype)
+    if out.ndim != 1 or len(out) != length:
+        raise ValueError(f'out must be a 1-D array of length {length} (Received shape {out.shape})')
+    return out
+
+# Function to write a square wave into an array, starting on or off
+def fill_square_wave(arr: np.ndarray,
+                     size: int,
+                     first_value: int) -> np.ndarray:
+    """
+    Fill an array with steps of size samples, alternating between first_value and the other value, without
+    building an index array.
+
+    Parameters
+    ----------
+    arr : np.ndarray
+        1-D array to fill.
+    size : int
+        Width of the steps in samples.
+    first_value : int
+        Value of the first step, 0 or 1.
+
+    Returns
+    -------
+    arr : np.ndarray
+        The filled array.
+    """
+    if size < 1:
+        raise ValueError(f'size must be at least 1 (Received {size})')
+    period = 2 * size
+    num_periods = len(arr) // period
+    # Whole periods as a (num_periods, 2, size) view, then the partial period at the end
+    periods = arr[:num_periods * period].reshape(num_periods, 2, size)
+    periods[:, 0] = first_value
+    periods[:, 1] = 1 - first_value
+    tail = arr[num_periods * period:]
+    tail[:size] = first_value
+    tail[size:] = 1 - first_value
+    return arr
+
 # Create on array of desired length
-def on_array(length: int = 64) -> np.ndarray:
+@instrumented('waveforms.on_array')
+def on_array(length: int = 64,
+             dtype=WAVEFORM_DTYPE,
+             out: np.ndarray = None) -> np.ndarray:
     """
     Creates an array of ones of length length.
     
@@ -11,6 +84,10 @@ def on_array(length: int = 64) -> np.ndarray:
     length : int
         Length of the waveform. Default is 64. The minimum for a dpg11 waveform is 64, and things must be modulo 64,
         so ensure that it is modulo 64 if working with the dpg11.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+    out : np.ndarray, optional
+        Buffer of length length to write into instead of allocating. Default is None.
         
     Returns
     -------
@@ -18,11 +95,15 @@ def on_array(length: int = 64) -> np.ndarray:
         Array of ones of length length.
     """
     # create array of ones
-    arr = np.ones(length).astype(int)
+    arr = output_array(length, dtype, out)
+    arr[:] = 1
     return arr
 
 # Create off array of desired length
-def off_array(length: int = 64) -> np.ndarray:
+@instrumented('waveforms.off_array')
+def off_array(length: int = 64,
+              dtype=WAVEFORM_DTYPE,
+              out: np.ndarray = None) -> np.ndarray:
     """
     Creates an array of zeros of length length.
     
@@ -31,6 +112,10 @@ def off_array(length: int = 64) -> np.ndarray:
     length : int
         Length of the waveform. Default is 64. The minimum for a dpg11 waveform is 64, and things must be modulo 64,
         so ensure that it is modulo 64 if working with the dpg11.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+    out : np.ndarray, optional
+        Buffer of length length to write into instead of allocating. Default is None.
         
     Returns
     -------
@@ -38,12 +123,16 @@ def off_array(length: int = 64) -> np.ndarray:
         Array of zeros of length length.
     """
     # create array of zeros
-    arr = np.zeros(length).astype(int)
+    arr = output_array(length, dtype, out)
+    arr[:] = 0
     return arr
 
 # Create off on waveform that is a numpy array
+@instrumented('waveforms.off_on_array')
 def off_on_array(size: int = 1, 
-                 length: int = 64) -> np.ndarray:
+                 length: int = 64,
+                 dtype=WAVEFORM_DTYPE,
+                 out: np.ndarray = None) -> np.ndarray:
     """
     Creates an array of zeros and ones of length length. The width of the steps are determined by size.
     
@@ -55,16 +144,25 @@ def off_on_array(size: int = 1,
     length : int
         Length of the waveform. Default is 64. The minimum for a dpg11 waveform is 64, and things must be modulo 64,
         so ensure that it is modulo 64 if working with the dpg11.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+    out : np.ndarray, optional
+        Buffer of length length to write into instead of allocating. Default is None.
         
-    
+    Returns
+    -------
+    arr : np.ndarray
+        Array of zeros and ones of length length.
     """
     # create the array of zeros and ones
-    arr = np.array([int(np.ceil((i + 1 + size) / size) % 2) for i in range(length)])
-    return arr
+    return fill_square_wave(output_array(length, dtype, out), size, first_value=0)
 
 # Create on off waveform that is a numpy array
+@instrumented('waveforms.on_off_array')
 def on_off_array(size: int = 1, 
-                 length: int = 64) -> np.ndarray:
+                 length: int = 64,
+                 dtype=WAVEFORM_DTYPE,
+                 out: np.ndarray = None) -> np.ndarray:
     '''
     Creates an array of ones and zeros of length length. The width of the steps are determined by size.
     This is a 50% duty cycle waveform. 
@@ -77,6 +175,10 @@ def on_off_array(size: int = 1,
     length : int
         Length of the waveform. Default is 64. The minimum for a dpg11 waveform is 64, and things must be modulo 64,
         so ensure that it is modulo 64 if working with the dpg11.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+    out : np.ndarray, optional
+        Buffer of length length to write into instead of allocating. Default is None.
         
     Returns
     -------
@@ -84,8 +186,7 @@ def on_off_array(size: int = 1,
         Array of ones and zeros of length length.
     '''
     # create array of zeros and ones
-    arr = np.array([int(np.ceil((i + 1) / size) % 2) for i in range(length)])
-    return arr
+    return fill_square_wave(output_array(length, dtype, out), size, first_value=1)
 
 # Create function to get the multiplier to downconvert to the DPG11 clock frequency
 def downconvert_clock_frequency(clock_frequency: float or int,
@@ -160,10 +261,13 @@ def length_mod_64(pulse_width: int,
     return num_samples_64, duration_64
 
 # Define function to pad a given waveform (with either 1s or 0s) to a given length (on the right or left)
+@instrumented('waveforms.pad_waveform')
 def pad_waveform(waveform: np.ndarray or list,
                  length: int,
                  pad_value: int = 0,
-                 pad_side: str = 'right') -> np.ndarray:
+                 pad_side: str = 'right',
+                 dtype=WAVEFORM_DTYPE,
+                 out: np.ndarray = None) -> np.ndarray:
     """
     Pad a waveform with either 1s or 0s to a given length. 
     
@@ -177,6 +281,10 @@ def pad_waveform(waveform: np.ndarray or list,
         Value to pad the waveform with. Default is 0.
     pad_side : str
         Side to pad the waveform on. Default is 'right'.
+    dtype : data-type
+        dtype of the returned array. Default is np.uint8.
+    out : np.ndarray, optional
+        Buffer of length length to write into instead of allocating. Default is None.
         
     Returns
     -------
@@ -192,16 +300,22 @@ def pad_waveform(waveform: np.ndarray or list,
     # Raise error if wrong pad value
     if pad_value not in [0, 1]:
         raise ValueError('pad_value must be either 0 or 1')
+    if num_samples_to_pad < 0:
+        raise ValueError(f'The waveform is longer than length ({waveform_length} > {length} samples)')
     
-    # Pad the waveform
+    # Pad the waveform, writing the waveform and the padding straight into the result
     if pad_side == 'right':
-        waveform = np.pad(waveform, (pad_value, num_samples_to_pad), constant_values=pad_value).astype(int)
+        arr = output_array(length, dtype, out)
+        arr[:waveform_length] = waveform
+        arr[waveform_length:] = pad_value
     elif pad_side == 'left':
-        waveform = np.pad(waveform, (num_samples_to_pad, pad_value), constant_values=pad_value).astype(int)
+        arr = output_array(length, dtype, out)
+        arr[:num_samples_to_pad] = pad_value
+        arr[num_samples_to_pad:] = waveform
     else:
         raise ValueError('pad_side must be either "right" or "left"')
     
-    return waveform
+    return arr
 
 # Function to convert a decimal number to an 11 bit binary array (for the dpg11)
 def dec2bin_array(dec_num: int) -> np.ndarray:
@@ -229,39 +343,43 @@ def dec2bin_array(dec_num: int) -> np.ndarray:
     return np.array(bin_array)
 
 # Function to fully convert a wavefile to a list of arrays with each entry being a channel
-def wavefile2arrays(wavefile: str) -> list or np.ndarray:
+def wavefile2arrays(wavefile: str or PackedWaveform) -> list or np.ndarray:
     """
     Convert a wavefile to a list of arrays with each entry being a channel. ie wavefile_arrays[0] is channel 1.
+    See read_wavefile for compact bool or uint8 planes and a binary sidecar for faster reloads, and
+    PackedWaveform.from_wavefile to keep the wavefile packed.
     
     Parameters
     ----------
-    wavefile : str
-        Path to the wavefile to convert.
+    wavefile : str | PackedWaveform
+        Path to the wavefile to convert, or a PackedWaveform to unpack the same way.
         
     Returns
     -------
     wavefile_arrays : list | np.ndarray
         List of arrays with each entry being a channel.
     """
-    # Open the wavefile
-    dec_waveforms = np.loadtxt(wavefile).astype(int)
-        
-    # Convert each decimal waveform to binary
-    bin_waveforms = np.array([dec2bin_array(i) for i in dec_waveforms])
-    # Transpose the data
-    waveforms_arr = bin_waveforms.T
+    # Read the words in bulk and unpack them into one row per channel, with at least the 11 dpg11 channels
+    words = wavefile.words if isinstance(wavefile, PackedWaveform) else read_wavefile_words(wavefile)
+    num_channels = max(NUM_CHANNELS, int(words.max()).bit_length() if len(words) else 0)
+    waveforms_arr = unpack_channels(words, num_channels=num_channels, dtype=int)
     
     return waveforms_arr
 
 # Function to join multiple waveforms together in the order given
-def join_waveforms(waveform_arr: np.ndarray or list) -> np.ndarray:
+@instrumented('waveforms.join_waveforms')
+def join_waveforms(waveform_arr: np.ndarray or list,
+                   out: np.ndarray = None) -> np.ndarray:
     """
-    Join multiple waveforms together in the order given, creating one long waveform.
+    Join multiple waveforms together in the order given, creating one long waveform. The result keeps the dtype
+    of the waveforms.
     
     Parameters
     ----------
     waveform_arr : np.ndarray | list
         Array of waveforms to join together.
+    out : np.ndarray, optional
+        Buffer of the total length to write into instead of allocating. Default is None.
         
     Returns
     -------
@@ -269,13 +387,16 @@ def join_waveforms(waveform_arr: np.ndarray or list) -> np.ndarray:
         Joined waveform.
     """
     # Join the waveforms together
-    return np.concatenate(waveform_arr)
+    return np.concatenate(waveform_arr, out=out, casting='unsafe')
 
 # Function to repeat a waveform a given number of times and join them together into one
+@instrumented('waveforms.repeat_waveform')
 def repeat_waveform(waveform: np.ndarray or list,
-                    num_repeats: int) -> np.ndarray:
+                    num_repeats: int,
+                    out: np.ndarray = None) -> np.ndarray:
     """
-    Repeat a waveform a given number of times and join them together into one.
+    Repeat a waveform a given number of times and join them together into one. The result keeps the dtype of
+    the waveform.
     
     Parameters
     ----------
@@ -283,6 +404,8 @@ def repeat_waveform(waveform: np.ndarray or list,
         Waveform to repeat.
     num_repeats : int
         Number of times to repeat the waveform.
+    out : np.ndarray, optional
+        Buffer of length num_repeats * len(waveform) to write into instead of allocating. Default is None.
         
     Returns
     -------
@@ -290,6 +413,11 @@ def repeat_waveform(waveform: np.ndarray or list,
         Repeated waveform.
     """
     # Repeat the waveform
-    repeated_waveform = np.tile(waveform, num_repeats)
+    if out is None:
+        return np.tile(waveform, num_repeats)
+    waveform = np.asarray(waveform)
+    repeated_waveform = output_array(num_repeats * len(waveform), out=out)
+    # A 1-D buffer can always be viewed as one row per repeat, whatever its stride
+    repeated_waveform.reshape(num_repeats, len(waveform))[:] = waveform
     
     return repeated_waveform
\ No newline at end of file
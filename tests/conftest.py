@@ -0,0 +1,63 @@
+# Shared fixtures of the dpg11_pylib tests
+import os
+import threading
+import time
+
+import pytest
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.transport import MemoryTransport
+
+
+# A temporary driver directory, with the GUI executable the FileTransport looks for
+@pytest.fixture
+def driver_directory(tmp_path):
+    open(os.path.join(tmp_path, 'dax22000_GUI_64.exe'), 'w').close()
+    return str(tmp_path)
+
+
+# A device writing into a temporary driver directory
+@pytest.fixture
+def device(driver_directory):
+    return DPG11Device(driver_directory)
+
+
+# A device that keeps its scripts and files in memory
+@pytest.fixture
+def memory_device():
+    return DPG11Device('dry_run', transport=MemoryTransport())
+
+
+class FakeGUI:
+    """
+    Reads and deletes dax_cmd.txt in a background thread, like dax22000_GUI_64.exe.
+    """
+
+    def __init__(self, execute_path, delay=0.01):
+        self.execute_path = execute_path
+        self.delay = delay
+        self.scripts = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if os.path.exists(self.execute_path):
+                time.sleep(self.delay)
+                with open(self.execute_path) as f:
+                    self.scripts.append(f.read())
+                os.remove(self.execute_path)
+            time.sleep(1e-3)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+# A stand-in GUI consuming the scripts sent to the temporary driver directory
+@pytest.fixture
+def gui(driver_directory):
+    fake_gui = FakeGUI(os.path.join(driver_directory, 'dax_cmd.txt'))
+    yield fake_gui
+    fake_gui.stop()
@@ -0,0 +1,56 @@
+# Tests of the asyncio wrapper of DPG11Device
+import asyncio
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.aio import AsyncDPG11Device
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.transport import MemoryTransport
+
+
+@pytest.fixture
+def pulser(memory_device):
+    return AsyncDPG11Device(memory_device)
+
+
+def test_open_and_close_api_use_the_transport(pulser):
+    async def main():
+        await pulser.open_api()
+        await pulser.close_api()
+
+    asyncio.run(main())
+    assert pulser.device.transport.batch_files == [pulser.device.open_api_bat, pulser.device.close_api_bat]
+
+
+def test_run_single_wave_sends_one_script(pulser):
+    async def main():
+        wave_filename = await pulser.create_wave_file('test', {1: np.ones(64)})
+        return await pulser.run_single_wave(wave_filename, clock_rate=1e9)
+
+    command_list = asyncio.run(main())
+    transport = pulser.device.transport
+    assert transport.num_sent == 1
+    assert transport.commands() == command_list
+    assert command_list[2] == 'CreateSingleSegment 1 1 64 0 2047 2047 wavefiles/test_64.txt 0'
+
+
+def test_concurrent_commands_keep_their_order(pulser):
+    async def main():
+        await asyncio.gather(*[pulser.set_clk_rate(rate) for rate in (1e9, 2e9, 2.5e9)], pulser.run())
+
+    asyncio.run(main())
+    assert pulser.device.transport.commands() == ['SetClkRate 1 1000000000', 'SetClkRate 1 2000000000',
+                                                  'SetClkRate 1 2500000000', 'Run 1 true']
+    assert not any(path.endswith('.txt') and 'scripts' in path for path in pulser.device.transport.files)
+
+
+def test_redundant_commands_are_skipped():
+    pulser = AsyncDPG11Device(DPG11Device('dry_run', transport=MemoryTransport(), skip_redundant_commands=True))
+
+    async def main():
+        await pulser.set_clk_rate(1e9)
+        return await pulser.execute([pulser.device.set_clk_rate(1e9)])
+
+    assert asyncio.run(main()) == 0.0
+    assert pulser.device.transport.commands() == ['SetClkRate 1 1000000000']
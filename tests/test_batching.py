@@ -0,0 +1,68 @@
+# Tests of merging batched commands and of DPG11Device.batch
+import pytest
+
+from dpg11_pylib.driver.batching import merge_commands, parse_command
+
+
+def test_parse_command():
+    assert parse_command('SetClkRate 1 2500000000') == ('SetClkRate', 1, ['2500000000'])
+    with pytest.raises(ValueError):
+        parse_command('Stop')
+
+
+def test_repeated_idempotent_commands_are_dropped():
+    assert merge_commands(['Stop 1', 'Stop 1', 'Stop 2']) == ['Stop 1', 'Stop 2']
+
+
+def test_later_setting_replaces_an_earlier_one():
+    assert merge_commands(['SetClkRate 1 1000', 'Stop 1', 'SetClkRate 1 2000']) == ['Stop 1', 'SetClkRate 1 2000']
+
+
+def test_setting_before_a_run_is_kept():
+    commands = ['SetClkRate 1 1000', 'Run 1 true', 'SetClkRate 1 2000']
+    assert merge_commands(commands) == commands
+
+
+def test_settings_of_other_cards_are_kept():
+    commands = ['SetClkRate 1 1000', 'SetClkRate 2 2000']
+    assert merge_commands(commands) == commands
+
+
+def test_run_stopped_straight_away_is_dropped():
+    assert merge_commands(['Stop 1', 'Run 1 true', 'Stop 1', 'Run 1 true']) == ['Stop 1', 'Run 1 true']
+
+
+def test_run_is_not_idempotent():
+    assert merge_commands(['Run 1 true', 'Run 1 true']) == ['Run 1 true', 'Run 1 true']
+
+
+def test_batch_sends_one_merged_script(memory_device):
+    with memory_device.batch():
+        memory_device.stop(execute=True)
+        memory_device.stop(execute=True)
+        memory_device.set_clk_rate(1e9, execute=True)
+        memory_device.set_clk_rate(2e9, execute=True)
+        memory_device.run(execute=True)
+        assert memory_device.transport.num_sent == 0
+    assert memory_device.transport.num_sent == 1
+    assert memory_device.transport.commands() == ['Stop 1', 'SetClkRate 1 2000000000', 'Run 1 true']
+
+
+def test_nested_batches_are_sent_by_the_outermost(memory_device):
+    with memory_device.batch():
+        memory_device.stop(execute=True)
+        with memory_device.batch():
+            memory_device.run(execute=True)
+        assert memory_device.transport.num_sent == 0
+    assert memory_device.transport.commands() == ['Stop 1', 'Run 1 true']
+
+
+def test_batch_that_raises_sends_nothing(memory_device):
+    with pytest.raises(RuntimeError):
+        with memory_device.batch():
+            memory_device.stop(execute=True)
+            raise RuntimeError
+    assert memory_device.transport.num_sent == 0
+    assert memory_device.batch_commands is None
+    memory_device.stop(execute=True)
+    assert memory_device.transport.commands() == ['Stop 1']
@@ -0,0 +1,129 @@
+# Tests of the content addressed wavefile cache
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.cache import CACHED_FILENAME_PATTERN, WavefileCache
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.transport import MemoryTransport
+
+
+def test_digest_depends_on_the_contents_and_kind():
+    words = np.arange(64, dtype=np.uint16)
+    assert WavefileCache.digest(words) == WavefileCache.digest(words.astype(np.int64))
+    assert WavefileCache.digest(words) != WavefileCache.digest(words[::-1])
+    assert WavefileCache.digest('text') != WavefileCache.digest('text', kind='multi_wavefile')
+
+
+def test_cached_filenames_keep_the_number_of_points(driver_directory, device):
+    filename = WavefileCache(driver_directory, 10 ** 6).filename('wavefiles', 'wave', 'ab' * 8, 64)
+    assert filename == f'wavefiles/wave_{"ab" * 8}_64.txt'
+    assert CACHED_FILENAME_PATTERN.match(os.path.basename(filename))
+    assert device.get_data_from_fn(filename) == 64
+
+
+def test_same_words_are_written_once(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6)
+    first = device.create_wave_file('a', {1: np.ones(64)})
+    second = device.create_wave_file('b', {1: np.ones(64)})
+    assert first == second
+    assert len(os.listdir(os.path.join(driver_directory, 'wavefiles'))) == 1
+    assert (device.wavefile_cache.hits, device.wavefile_cache.misses) == (1, 1)
+    assert np.array_equal(np.loadtxt(os.path.join(driver_directory, first), dtype=int), np.ones(64))
+
+
+def test_least_recently_used_files_are_evicted(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=1)
+    first = device.create_wave_file('a', {1: np.ones(64)})
+    second = device.create_wave_file('b', {2: np.ones(64)})
+    assert not os.path.exists(os.path.join(driver_directory, first))
+    assert os.path.exists(os.path.join(driver_directory, second))
+    assert list(device.wavefile_cache.entries) == [WavefileCache.digest(np.full(64, 2, dtype=np.uint16))]
+
+
+def test_cache_survives_a_new_session(driver_directory):
+    filename = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6).create_wave_file('a', {1: np.ones(64)})
+    device = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6)
+    assert device.create_wave_file('b', {1: np.ones(64)}) == filename
+    assert device.wavefile_cache.hits == 1
+
+
+def test_files_removed_behind_the_cache_are_rewritten(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6)
+    filename = device.create_wave_file('a', {1: np.ones(64)})
+    os.remove(os.path.join(driver_directory, filename))
+    assert device.create_wave_file('a', {1: np.ones(64)}) == filename
+    assert os.path.exists(os.path.join(driver_directory, filename))
+
+
+def test_multi_wave_files_are_cached(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6)
+    wave_filename = device.create_wave_file('a', {1: np.ones(64)})
+    first = device.create_multi_wave_file('multi', [wave_filename], [1], [1])
+    assert device.create_multi_wave_file('other', [wave_filename], [1], [1]) == first
+    assert device.create_multi_wave_file('multi', [wave_filename], [2], [1]) != first
+
+
+def test_program_files_are_not_evicted_by_each_other(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=1)
+    words = np.concatenate([np.full(64, 1), np.full(64, 2), np.full(64, 1)]).astype(np.uint16)
+    command = device.create_segments_from_words('program', words, [(0, 64, 1, 0), (64, 64, 1, 0), (0, 64, 1, 0)])
+    waves_filename = command.split()[6]
+    member_filenames = device.wavefile_cache.member_filenames(waves_filename)
+    assert len(set(member_filenames)) == 2
+    for filename in [waves_filename] + member_filenames:
+        assert os.path.exists(os.path.join(driver_directory, filename))
+
+    # The next file brings the cache back under budget, but never evicts the wavefiles it lists
+    other = device.create_multi_wave_file('other', member_filenames[:1], [2], [0])
+    assert not os.path.exists(os.path.join(driver_directory, waves_filename))
+    assert [filename for filename, _ in device.wavefile_cache.entries.values()] == [member_filenames[0], other]
+
+
+def test_using_a_multi_wave_file_uses_its_wavefiles(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6)
+    first = device.create_wave_file('a', {1: np.ones(64)})
+    multi = device.create_multi_wave_file('multi', [first], [1], [1])
+    second = device.create_wave_file('b', {2: np.ones(64)})
+    sizes = {filename: size for filename, size in device.wavefile_cache.entries.values()}
+
+    # The lookup of the multi-wavefile makes its wavefile newer than the second one, which is evicted instead
+    assert device.create_multi_wave_file('multi', [first], [1], [1]) == multi
+    device.wavefile_cache.max_bytes = sum(sizes.values())
+    device.create_wave_file('c', {3: np.ones(64)})
+    assert os.path.exists(os.path.join(driver_directory, first))
+    assert not os.path.exists(os.path.join(driver_directory, second))
+
+
+def test_multi_wave_file_with_a_missing_wavefile_is_a_miss(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=10 ** 6)
+    wave_filename = device.create_wave_file('a', {1: np.ones(64)})
+    multi = device.create_multi_wave_file('multi', [wave_filename], [1], [1])
+    digest = WavefileCache.digest(f'{wave_filename} 64 1 1', kind='multi_wavefile')
+    os.remove(os.path.join(driver_directory, wave_filename))
+    assert device.wavefile_cache.lookup(digest) is None
+    assert not os.path.exists(os.path.join(driver_directory, multi))
+
+    wave_filename = device.create_wave_file('a', {1: np.ones(64)})
+    assert device.create_multi_wave_file('multi', [wave_filename], [1], [1]) == multi
+    assert os.path.exists(os.path.join(driver_directory, multi))
+
+
+def test_uncached_files_are_left_alone(driver_directory):
+    device = DPG11Device(driver_directory, wavefile_cache_size=1)
+    plain = os.path.join(driver_directory, 'wavefiles', 'plain_64.txt')
+    open(plain, 'w').close()
+    device.create_wave_file('a', {1: np.ones(64)})
+    device.wavefile_cache.clear()
+    assert os.listdir(os.path.join(driver_directory, 'wavefiles')) == ['plain_64.txt']
+
+
+def test_cache_needs_a_file_transport():
+    with pytest.raises(ValueError):
+        DPG11Device('dry_run', transport=MemoryTransport(), wavefile_cache_size=10 ** 6)
+
+
+def test_cache_size_must_be_positive(driver_directory):
+    with pytest.raises(ValueError):
+        WavefileCache(driver_directory, 0)
@@ -0,0 +1,82 @@
+# Tests of handing scripts to the GUI through dax_cmd.txt
+import os
+
+import pytest
+
+from dpg11_pylib.driver.command_queue import CommandQueue
+from dpg11_pylib.driver.dpg11 import DPG11Device
+
+
+def write_script(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+@pytest.fixture
+def execute_path(tmp_path):
+    return str(tmp_path / 'dax_cmd.txt')
+
+
+def test_send_copies_or_moves_the_script(tmp_path, execute_path):
+    command_queue = CommandQueue(execute_path)
+    kept = write_script(tmp_path, 'kept.txt', 'Stop 1')
+    command_queue.send(kept)
+    assert os.path.exists(kept)
+    with open(execute_path) as f:
+        assert f.read() == 'Stop 1'
+    assert not os.path.exists(execute_path + '.tmp')
+
+    moved = write_script(tmp_path, 'moved.txt', 'Run 1 true')
+    command_queue.send(moved, keep_script=False, wait_for_previous=False)
+    assert not os.path.exists(moved)
+    with open(execute_path) as f:
+        assert f.read() == 'Run 1 true'
+    assert command_queue.num_sent == 2
+
+
+def test_unconsumed_script_times_out(tmp_path, execute_path):
+    command_queue = CommandQueue(execute_path)
+    command_queue.send(write_script(tmp_path, 'first.txt', 'Stop 1'))
+    assert not command_queue.wait_for_consumption(timeout=0.02)
+    with pytest.raises(TimeoutError):
+        command_queue.send(write_script(tmp_path, 'second.txt', 'Run 1 true'), timeout=0.02)
+    with open(execute_path) as f:
+        assert f.read() == 'Stop 1'
+
+
+def test_scripts_are_consumed_in_order(tmp_path, execute_path, gui):
+    command_queue = CommandQueue(execute_path)
+    for i in range(5):
+        command_queue.send(write_script(tmp_path, f'script_{i}.txt', f'SetClkRate 1 {i}'), timeout=5)
+    assert command_queue.wait_for_consumption(timeout=5)
+    assert gui.scripts == [f'SetClkRate 1 {i}' for i in range(5)]
+    stats = command_queue.latency_stats()
+    assert stats['num_sent'] == 5
+    assert stats['num_measured'] == 5
+    assert stats['min'] > 0
+
+
+def test_submit_resolves_to_the_latency(tmp_path, execute_path, gui):
+    command_queue = CommandQueue(execute_path)
+    futures = [command_queue.submit(write_script(tmp_path, f'script_{i}.txt', f'Stop {i}'), timeout=5)
+               for i in range(3)]
+    latencies = [future.result(timeout=10) for future in futures]
+    assert gui.scripts == ['Stop 0', 'Stop 1', 'Stop 2']
+    assert all(latency > 0 for latency in latencies)
+
+
+def test_submit_reports_a_timeout(tmp_path, execute_path):
+    command_queue = CommandQueue(execute_path)
+    future = command_queue.submit(write_script(tmp_path, 'script.txt', 'Stop 1'), timeout=0.02)
+    with pytest.raises(TimeoutError):
+        future.result(timeout=5)
+
+
+def test_device_script_timeout(driver_directory):
+    device = DPG11Device(driver_directory, script_timeout=0.02)
+    device.stop(execute=True)
+    with pytest.raises(TimeoutError):
+        device.run(execute=True)
+    assert not device.wait_for_script(timeout=0.02)
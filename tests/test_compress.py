@@ -0,0 +1,83 @@
+# Tests of compressing repeated blocks into looped segments
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.compress import (candidate_block_sizes, compress_repetitions, find_period,
+                                         find_repeated_blocks, split_loops)
+
+BLOCK = np.arange(64, dtype=np.uint16)
+
+
+def played(words, segments):
+    # The words the segments play once through, with a continuous single segment played once
+    return np.concatenate([np.tile(words[start:start + length], max(loops, 1)) for start, length, loops in segments])
+
+
+def test_candidate_block_sizes():
+    assert candidate_block_sizes(384) == [64, 128, 192, 384]
+    with pytest.raises(ValueError):
+        candidate_block_sizes(100)
+
+
+def test_find_period():
+    assert find_period(np.tile(BLOCK, 10)) == 64
+    assert find_period(np.tile(np.arange(192), 4)) == 192
+    assert find_period(np.arange(640)) == 640
+
+
+def test_find_repeated_blocks_merges_single_blocks():
+    words = np.concatenate([np.tile(BLOCK, 3), BLOCK + 1, BLOCK + 2, np.tile(BLOCK, 2)])
+    assert find_repeated_blocks(words, 64) == [(0, 64, 3), (192, 128, 1), (320, 64, 2)]
+
+
+def test_split_loops():
+    assert split_loops([(0, 64, 5), (64, 64, 2)], 2) == [(0, 64, 2), (0, 64, 2), (0, 64, 1), (64, 64, 2)]
+
+
+def test_continuous_period_is_one_segment():
+    assert compress_repetitions(np.tile(BLOCK, 1000)) == ([(0, 64, 0)], False)
+
+
+def test_finite_period_is_one_looped_segment():
+    assert compress_repetitions(np.tile(BLOCK, 10), num_loops=3) == ([(0, 64, 30)], False)
+
+
+def test_loop_count_over_the_limit_is_split():
+    segments, loop_sequence = compress_repetitions(np.tile(BLOCK, 1000), num_loops=100)
+    assert segments == [(0, 64, 65534), (0, 64, 34466)]
+    assert not loop_sequence
+
+
+def test_loop_count_that_needs_too_many_segments_is_rejected():
+    with pytest.raises(ValueError):
+        compress_repetitions(np.tile(BLOCK, 2), num_loops=10, max_loops=1, max_segments=5)
+
+
+@pytest.mark.parametrize('num_loops', [1, 2, 5])
+def test_finite_segments_play_the_waveform(num_loops):
+    words = np.concatenate([np.tile(BLOCK, 20), BLOCK + 1, np.tile(BLOCK + 2, 7)])
+    segments, loop_sequence = compress_repetitions(words, num_loops=num_loops)
+    assert not loop_sequence
+    assert np.array_equal(played(words, segments), np.tile(words, num_loops))
+    assert len({start for start, _, _ in segments}) == 3
+
+
+def test_continuous_sequence_plays_the_waveform():
+    words = np.concatenate([np.tile(BLOCK, 20), BLOCK + 1])
+    segments, loop_sequence = compress_repetitions(words)
+    assert loop_sequence
+    assert np.array_equal(played(words, segments), words)
+
+
+def test_create_compressed_segments(device, driver_directory):
+    command = device.create_compressed_segments('clock', {1: np.tile(np.arange(64) % 2, 1000)}, num_loops=100)
+    assert command.startswith('CreateSegments')
+    # The block is stored once
+    wavefiles = os.listdir(os.path.join(driver_directory, 'wavefiles'))
+    assert len(wavefiles) == 1 and wavefiles[0].endswith('_64.txt')
+    multi_directory = os.path.join(driver_directory, 'multi_wavefiles')
+    with open(os.path.join(multi_directory, os.listdir(multi_directory)[0])) as f:
+        multi_wavefile = f.read()
+    assert [line.split()[1:3] for line in multi_wavefile.splitlines()] == [['64', '65534'], ['64', '34466']]
@@ -0,0 +1,91 @@
+# Tests of the pure-Python stand-in for the DAX GUI
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.emulator import DAXGUIEmulator, parse_bool
+from dpg11_pylib.waveforms.packing import pack_channels
+
+
+@pytest.fixture
+def gui(tmp_path):
+    return DAXGUIEmulator(str(tmp_path))
+
+
+@pytest.fixture
+def gui_device(gui):
+    return DPG11Device(gui.directory)
+
+
+def wave_dict(num_points):
+    return {1: np.arange(num_points) % 128 < 64, 3: np.arange(num_points) % 2}
+
+
+@pytest.mark.parametrize('num_points', [64, 65536])
+def test_single_wave_end_to_end(tmp_path, num_points):
+    with DAXGUIEmulator(str(tmp_path), latency=0.001) as gui:
+        device = DPG11Device(str(tmp_path), script_timeout=10)
+        device.run_single_wave(device.create_wave_file('test', wave_dict(num_points)), clock_rate=1e9)
+        assert device.wait_for_script(10)
+    gui.check()
+    card = gui.cards[1]
+    assert card.running
+    assert card.clock_rate == 1000000000
+    assert np.array_equal(gui.output_stream(), pack_channels(wave_dict(num_points)))
+
+
+def test_multi_segments_output(gui, gui_device):
+    first = gui_device.create_wave_file('first', {1: np.ones(64)})
+    second = gui_device.create_wave_file('second', {2: np.ones(128)})
+    waves_filename = gui_device.create_multi_wave_file('multi', [first, second], [3, 1], [1, 0])
+    gui.run_script('\n'.join([gui_device.create_multi_segments(waves_filename, loop=True), gui_device.run()]))
+    gui.check()
+    assert gui.cards[1].loop_sequence
+    assert [segment[2] for segment in gui.cards[1].segments] == [3, 1]
+    assert np.array_equal(gui.output_stream(), np.concatenate([np.full(192, 1), np.full(128, 2)]))
+    with pytest.raises(ValueError):
+        gui.output_stream(max_points=256)
+
+
+def test_rejected_commands_do_not_change_the_state(gui, gui_device):
+    wave_filename = gui_device.create_wave_file('test', {1: np.ones(64)})
+    gui.run_script('\n'.join(['Run 1 true',
+                              'SetClkRate 1 10',
+                              'CreateSingleSegment 1 1 128 0 2047 2047 ' + wave_filename + ' 0',
+                              'CreateSingleSegment 1 1 64 70000 2047 2047 ' + wave_filename + ' 0',
+                              'CreateSingleSegment 1 1 64 0 5000 2047 ' + wave_filename + ' 0',
+                              'Launch 1']))
+    assert len(gui.errors) == 6
+    card = gui.cards[1]
+    assert not card.running
+    assert card.clock_rate is None
+    assert card.segments == []
+    with pytest.raises(ValueError):
+        gui.check()
+
+
+def test_stop_and_power_down(gui, gui_device):
+    wave_filename = gui_device.create_wave_file('test', {1: np.ones(64)})
+    gui.run_script('\n'.join([gui_device.create_single_segment(wave_filename), 'Run 1 false', 'SelExtTrig 1 true']))
+    card = gui.cards[1]
+    assert card.running and not card.soft_trig and card.external_trigger
+    gui.run_script('Stop 1')
+    assert not card.running
+    gui.run_script('PWR_DWN 1')
+    assert not card.powered
+    assert gui.num_scripts == 3
+    gui.check()
+
+
+def test_process_pending_consumes_the_script(gui, gui_device):
+    assert not gui.process_pending()
+    gui_device.stop(execute=True)
+    assert gui.process_pending()
+    assert gui_device.wait_for_script(0)
+    assert [command for _, command in gui.log] == ['Stop 1']
+
+
+def test_parse_bool():
+    assert parse_bool('True') and not parse_bool('false')
+    with pytest.raises(ValueError):
+        parse_bool('1')
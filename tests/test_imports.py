@@ -0,0 +1,50 @@
+# Tests that the driver-only import path does not load matplotlib or qt3utils
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Repository root, where the dpg11 pulser script lives
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Top level packages that must not be loaded by the lightweight imports
+HEAVY_PACKAGES = ('matplotlib', 'qt3utils')
+# Imports of the driver-only path. dpg11 is imported by the sweep worker processes.
+LIGHTWEIGHT_IMPORTS = ['import dpg11_pylib.driver',
+                       'import dpg11_pylib.waveforms',
+                       'import dpg11_pylib.instrumentation',
+                       'import dpg11_pylib.visualization',
+                       'import dpg11']
+
+
+def run_code(code):
+    # Run the code in a fresh interpreter from the repository root
+    return subprocess.run([sys.executable, '-c', code], cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True)
+
+
+def test_driver_imports_do_not_load_the_heavy_packages():
+    result = run_code("import dpg11_pylib.driver, dpg11_pylib.waveforms, dpg11; import sys; "
+                      "assert 'matplotlib' not in sys.modules and 'qt3utils' not in sys.modules")
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize('import_statement', LIGHTWEIGHT_IMPORTS)
+def test_lightweight_imports(import_statement):
+    # A heavy package that is imported eagerly either shows up in sys.modules or fails the import when missing
+    result = run_code(f'import sys\n{import_statement}\n'
+                      f'print(" ".join(sorted({{name.split(".")[0] for name in sys.modules}} & '
+                      f'{set(HEAVY_PACKAGES)!r})))')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == []
+
+
+def test_pulser_classes_import_qt3utils_on_access():
+    # Without qt3utils installed, the first access of a pulser class is what fails to import it
+    result = run_code("import sys, dpg11\n"
+                      "assert callable(dpg11.cwodmr_wave_dict) and 'qt3utils' not in sys.modules\n"
+                      "try:\n    dpg11.missing\nexcept AttributeError:\n    pass\nelse:\n    raise AssertionError\n"
+                      "try:\n    from dpg11 import DPG11CWODMRPulser\n"
+                      "except ModuleNotFoundError as error:\n    assert error.name.startswith('qt3utils')\n"
+                      "else:\n    assert DPG11CWODMRPulser.__qualname__ == 'DPG11CWODMRPulser'\n"
+                      "    assert issubclass(DPG11CWODMRPulser, dpg11.DPG11Pulser)")
+    assert result.returncode == 0, result.stderr
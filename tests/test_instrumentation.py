@@ -0,0 +1,154 @@
+# Tests of recording the stages of the pipeline
+import json
+import os
+import threading
+
+import numpy as np
+
+from dpg11_pylib import instrumentation
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.instrumentation.recorder import Recorder, Stage, add_bytes, get_recorder, instrumented
+from dpg11_pylib.waveforms.waveforms import off_on_array, pad_waveform
+
+
+@instrumented('test.inner')
+def inner(num_bytes=0):
+    add_bytes(num_bytes)
+    return num_bytes
+
+
+@instrumented('test.outer')
+def outer(num_bytes=0):
+    add_bytes(num_bytes)
+    return inner(num_bytes) + inner(num_bytes)
+
+
+def test_nothing_is_recorded_by_default():
+    assert get_recorder() is None
+    assert outer(10) == 20
+    with Recorder() as recorder:
+        pass
+    outer(10)
+    assert recorder.records == []
+    assert get_recorder() is None
+
+
+def test_package_exports_only_the_public_api():
+    assert instrumentation.get_recorder is get_recorder
+    assert instrumentation.Recorder is Recorder
+    # The active recorder is read through get_recorder, a copy of the global would never change
+    assert not hasattr(instrumentation, 'active_recorder')
+    assert not hasattr(instrumentation, 'enter_stage')
+
+
+def test_every_call_is_recorded():
+    with Recorder() as recorder:
+        assert get_recorder() is recorder
+        for _ in range(5):
+            inner()
+    assert recorder.report()['test.inner']['calls'] == 5
+    assert inner.stage == 'test.inner'
+    assert inner.__wrapped__(3) == 3
+
+
+def test_nested_stages():
+    with Recorder() as recorder:
+        outer(10)
+    report = recorder.report()
+    assert report['test.outer']['calls'] == 1
+    assert report['test.inner']['calls'] == 2
+    # Bytes count towards every stage that was running
+    assert report['test.outer']['num_bytes'] == 30
+    assert report['test.inner']['num_bytes'] == 20
+
+    records = {record.stage: record for record in recorder.records}
+    assert records['test.outer'].depth == 0
+    assert records['test.inner'].depth == 1
+    assert records['test.outer'].self_time <= records['test.outer'].duration
+    inner_time = sum(record.duration for record in recorder.records if record.stage == 'test.inner')
+    assert np.isclose(records['test.outer'].self_time, records['test.outer'].duration - inner_time)
+    # The report is ordered by total time, longest first
+    assert list(report)[0] == 'test.outer'
+
+
+def test_stage_context_manager():
+    with Stage('test.stage'):
+        add_bytes(5)
+    with Recorder() as recorder:
+        with Stage('test.stage'):
+            add_bytes(5)
+            inner()
+    report = recorder.report()
+    assert report['test.stage']['calls'] == 1
+    assert report['test.stage']['num_bytes'] == 5
+    assert [record.depth for record in recorder.records] == [1, 0]
+
+
+def test_recorders_nest_and_restore_the_previous_one():
+    with Recorder() as first:
+        inner()
+        with Recorder() as second:
+            inner()
+        assert get_recorder() is first
+        inner()
+    assert get_recorder() is None
+    assert first.report()['test.inner']['calls'] == 2
+    assert second.report()['test.inner']['calls'] == 1
+
+
+def test_stages_of_each_thread_are_kept_apart():
+    with Recorder() as recorder:
+        threads = [threading.Thread(target=outer, args=(1,), name=f'worker{i}') for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    report = recorder.report()
+    assert report['test.outer']['calls'] == 4
+    assert report['test.outer']['num_bytes'] == 12
+    assert {record.thread for record in recorder.records} == {f'worker{i}' for i in range(4)}
+    assert all(record.depth == (record.stage == 'test.inner') for record in recorder.records)
+
+
+def test_clear_and_json(tmp_path):
+    with Recorder() as recorder:
+        outer()
+    path = str(tmp_path / 'trace.json')
+    text = recorder.to_json(path)
+    with open(path) as f:
+        assert json.load(f) == json.loads(text)
+    dumped = json.loads(text)
+    assert dumped['report']['test.inner']['calls'] == 2
+    assert [entry['stage'] for entry in dumped['trace']] == ['test.inner', 'test.inner', 'test.outer']
+    assert 'test.outer' in str(recorder)
+
+    recorder.clear()
+    assert recorder.trace() == []
+    assert repr(recorder) == 'Recorder(0 calls)'
+
+
+def test_pipeline_records_the_bytes_of_the_wavefile(device, driver_directory):
+    num_points = 2 ** 12
+    with Recorder() as recorder:
+        samples = np.arange(num_points)
+        wave_dict = {1: samples % 256 < 128,
+                     3: off_on_array(1, num_points),
+                     4: pad_waveform(np.ones(64), num_points)}
+        wave_filename = device.create_wave_file('instrumented', wave_dict)
+        device.run_single_wave(wave_filename, clock_rate=1e9)
+    report = recorder.report()
+    wavefile_size = os.path.getsize(os.path.join(driver_directory, wave_filename))
+    assert report['create_wave_file.write']['num_bytes'] == wavefile_size
+    assert report['create_wave_file']['num_bytes'] == wavefile_size
+    for stage in ['waveforms.off_on_array', 'waveforms.pad_waveform', 'waveforms.pack_channels', 'create_script',
+                  'execute_script']:
+        assert report[stage]['calls'] >= 1
+
+
+def test_instrumented_methods_match_the_undecorated_ones(memory_device):
+    command_list = [memory_device.stop(), memory_device.set_clk_rate(1e9), memory_device.run()]
+    plain = DPG11Device.create_script.__wrapped__.__get__(memory_device)
+    with Recorder() as recorder:
+        recorded = memory_device.create_script(command_list)
+    assert recorded == plain(command_list)
+    assert recorder.report()['create_script']['calls'] == 1
@@ -0,0 +1,133 @@
+# Tests of driving several cards as one logical device
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.emulator import DAXGUIEmulator
+from dpg11_pylib.driver.multi_card import CHANNELS_PER_CARD, MultiCardDevice, run_skew
+from dpg11_pylib.driver.transport import MemoryTransport
+from dpg11_pylib.waveforms.packing import pack_channels
+
+NUM_POINTS = 4096
+
+
+@pytest.fixture
+def wave_dict():
+    samples = np.arange(NUM_POINTS)
+    return {1: samples % 256 < 128,
+            2: samples % 2,
+            CHANNELS_PER_CARD + 1: samples < 64,
+            CHANNELS_PER_CARD + 3: samples % 512 >= 256}
+
+
+@pytest.fixture
+def cards():
+    return MultiCardDevice('dry_run', card_numbers=[1, 2], transport=MemoryTransport())
+
+
+def test_card_numbers_are_checked():
+    with pytest.raises(ValueError):
+        MultiCardDevice('dry_run', card_numbers=[], transport=MemoryTransport())
+    with pytest.raises(ValueError):
+        MultiCardDevice('dry_run', card_numbers=[1, 1], transport=MemoryTransport())
+
+
+def test_cards_share_the_transport_and_state(cards):
+    assert len(cards) == 2
+    assert cards.num_channels == 2 * CHANNELS_PER_CARD
+    assert cards[2].transport is cards[1].transport
+    assert cards[2].state is cards[1].state
+    assert cards[2].card_number == 2
+
+
+def test_channel_mapping(cards, wave_dict):
+    assert cards.card_channel(1) == (1, 1)
+    assert cards.card_channel(CHANNELS_PER_CARD) == (1, CHANNELS_PER_CARD)
+    assert cards.card_channel(CHANNELS_PER_CARD + 1) == (2, 1)
+    with pytest.raises(ValueError):
+        cards.card_channel(2 * CHANNELS_PER_CARD + 1)
+    split = cards.split_channels(wave_dict)
+    assert sorted(split[1]) == [1, 2]
+    assert sorted(split[2]) == [1, 3]
+    assert cards.split_channels({1: np.ones(64)})[2] == {}
+
+
+def test_wave_files_of_every_card(cards, wave_dict):
+    wave_filenames = cards.create_wave_files('odmr', wave_dict)
+    assert wave_filenames == {1: f'wavefiles/odmr_card1_{NUM_POINTS}.txt', 2: f'wavefiles/odmr_card2_{NUM_POINTS}.txt'}
+    split = cards.split_channels(wave_dict)
+    for card_number, wave_filename in wave_filenames.items():
+        words = cards.transport.files['dry_run/' + wave_filename]
+        assert np.array_equal(words, pack_channels(split[card_number]))
+
+    # A card without channels plays zeros of the same length
+    wave_filenames = cards.create_wave_files('first', {1: np.ones(128)})
+    assert np.array_equal(cards.transport.files['dry_run/' + wave_filenames[2]], np.zeros(128))
+    with pytest.raises(ValueError):
+        cards.create_wave_files('bad name', wave_dict)
+    with pytest.raises(ValueError):
+        cards.create_wave_files('short', {1: np.ones(100)})
+
+
+def test_program_sends_one_script_with_the_runs_last(cards, wave_dict):
+    wave_filenames = cards.create_wave_files('odmr', wave_dict)
+    cards.program(wave_filenames, clock_rate=1e9, triggered=0)
+    assert cards.transport.num_sent == 1
+    assert cards.transport.commands() == [
+        'Stop 1', 'SetClkRate 1 1000000000',
+        f'CreateSingleSegment 1 1 {NUM_POINTS} 0 2047 2047 {wave_filenames[1]} 0',
+        'Stop 2', 'SetClkRate 2 1000000000',
+        f'CreateSingleSegment 2 1 {NUM_POINTS} 0 2047 2047 {wave_filenames[2]} 0',
+        'Run 1 true', 'Run 2 true']
+
+    cards.stop()
+    cards.run(soft_trig=False)
+    assert cards.transport.commands()[-4:] == ['Stop 1', 'Stop 2', 'Run 1 false', 'Run 2 false']
+
+
+def test_multi_card_matches_independent_devices(tmp_path, wave_dict):
+    with DAXGUIEmulator(str(tmp_path / 'serial')) as gui:
+        for card_number in [1, 2]:
+            device = DPG11Device(gui.directory, card_number=card_number, script_timeout=5)
+            offset = (card_number - 1) * CHANNELS_PER_CARD
+            card_dict = {channel - offset: waveform for channel, waveform in wave_dict.items()
+                         if 0 < channel - offset <= CHANNELS_PER_CARD}
+            device.run_single_wave(device.create_wave_file(f'serial_card{card_number}', card_dict), clock_rate=1e9)
+            assert device.wait_for_script(5)
+    serial_words = {card_number: gui.output_stream(card_number) for card_number in [1, 2]}
+    gui.check()
+
+    with DAXGUIEmulator(str(tmp_path / 'multi')) as gui:
+        cards = MultiCardDevice(gui.directory, card_numbers=[1, 2], script_timeout=5)
+        cards.run_wave_dict('multi', wave_dict, clock_rate=1e9)
+        assert cards[1].wait_for_script(5)
+    gui.check()
+    assert gui.num_scripts == 1
+    for card_number in [1, 2]:
+        assert gui.cards[card_number].running
+        assert np.array_equal(gui.output_stream(card_number), serial_words[card_number])
+
+
+@pytest.mark.parametrize('script_timeout', [5, None])
+def test_shut_down_waits_for_the_script_before_closing(tmp_path, script_timeout):
+    with DAXGUIEmulator(str(tmp_path), latency=0.05) as gui:
+        cards = MultiCardDevice(gui.directory, card_numbers=[1, 2], script_timeout=script_timeout)
+        cards.transport.close_delay = 0.5
+        closed = []
+        cards.transport.run_batch_file = lambda bat_name: closed.append(
+            (bat_name, os.path.exists(os.path.join(gui.directory, 'dax_cmd.txt')),
+             [gui.cards[card_number].powered for card_number in [1, 2]]))
+        cards.shut_down()
+    gui.check()
+    assert closed == [(cards[1].close_api_bat, False, [False, False])]
+
+
+def test_run_skew():
+    log = [(0.0, 'Run 1 true'), (1.0, 'Stop 1'), (2.0, 'Run 1 true'), (2.5, 'Run 2 true'), (3.0, 'Run 3 true')]
+    assert run_skew(log) == 1.0
+    assert run_skew(log, [1, 2]) == 0.5
+    assert run_skew(log, [1]) == 0.0
+    with pytest.raises(ValueError):
+        run_skew(log, [4])
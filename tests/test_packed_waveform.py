@@ -0,0 +1,138 @@
+# Tests of programs stored as one uint16 word per sample
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.packing import PackedWaveform, pack_channels
+from dpg11_pylib.waveforms.run_length import RunLengthWaveform
+from dpg11_pylib.waveforms.wavefile import read_wavefile_words
+from dpg11_pylib.waveforms.waveforms import off_on_array, on_array, pad_waveform, wavefile2arrays
+
+NUM_POINTS = 640
+
+
+@pytest.fixture
+def wave_dict():
+    return {1: pad_waveform(on_array(64), NUM_POINTS),
+            2: on_array(NUM_POINTS),
+            5: off_on_array(4, NUM_POINTS)}
+
+
+def test_from_channels(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    assert program.words.dtype == np.uint16
+    assert np.array_equal(program.words, pack_channels(wave_dict))
+    assert len(program) == NUM_POINTS
+    assert program.channels == [1, 2, 5]
+    assert repr(program) == f'PackedWaveform(length={NUM_POINTS}, channels=[1, 2, 5])'
+    assert PackedWaveform.zeros(128).channels == []
+
+
+def test_uint16_words_are_not_copied():
+    words = np.arange(64, dtype=np.uint16)
+    assert PackedWaveform(words).words is words
+    with pytest.raises(ValueError):
+        PackedWaveform(np.zeros((2, 64), dtype=np.uint16))
+
+
+def test_channels_round_trip(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    for channel, waveform in wave_dict.items():
+        assert np.array_equal(program.channel(channel), waveform)
+    assert program.channel(1, dtype=np.uint8).dtype == np.uint8
+    unpacked = program.to_dict()
+    assert sorted(unpacked) == [1, 2, 5]
+    assert all(np.array_equal(unpacked[channel], wave_dict[channel]) for channel in wave_dict)
+    assert not program.to_dict(channels=[3])[3].any()
+    planes = program.to_planes()
+    assert planes.shape == (11, NUM_POINTS)
+    assert np.array_equal(planes[4], wave_dict[5])
+
+
+@pytest.mark.parametrize('channel', [0, 17])
+def test_bad_channels(channel):
+    with pytest.raises(ValueError):
+        PackedWaveform.zeros().channel(channel)
+
+
+@pytest.mark.parametrize('waveform', [off_on_array(8, NUM_POINTS),
+                                      off_on_array(8, NUM_POINTS).astype(bool),
+                                      off_on_array(8, NUM_POINTS) * 3,
+                                      RunLengthWaveform.from_array(off_on_array(8, NUM_POINTS))])
+def test_set_channel_leaves_the_others(wave_dict, waveform):
+    program = PackedWaveform.from_channels(wave_dict)
+    program.set_channel(2, waveform)
+    expected = pack_channels({**wave_dict, 2: np.asarray(waveform) != 0})
+    assert np.array_equal(program.words, expected)
+
+
+def test_set_channel_to_a_constant(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    program.set_channel(3, 1)
+    assert program.channel(3).all()
+    program.set_channel(3, 0)
+    program.clear_channel(5)
+    assert np.array_equal(program.words, pack_channels({1: wave_dict[1], 2: wave_dict[2]}))
+
+
+def test_set_channel_rejects_a_wrong_length(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    words = program.words.copy()
+    with pytest.raises(ValueError):
+        program.set_channel(1, on_array(NUM_POINTS - 64))
+    assert np.array_equal(program.words, words)
+
+
+def test_sweep_matches_repacking(wave_dict):
+    # Changing the rf channel in place gives the same words as repacking the dictionary for every point
+    program = PackedWaveform.from_channels(wave_dict)
+    for width in [64, 128, 320, NUM_POINTS]:
+        rf_pulse = pad_waveform(on_array(width, dtype=np.bool_), NUM_POINTS, dtype=np.bool_)
+        program.set_channel(1, rf_pulse)
+        assert np.array_equal(program.words, pack_channels({**wave_dict, 1: rf_pulse}))
+
+
+def test_slices_share_the_words(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    part = program[64:128]
+    part.set_channel(7, 1)
+    assert program.channel(7)[64:128].all()
+    assert program.channel(7).sum() == 64
+    assert program[0] == int(program.words[0])
+    copy = program.copy()
+    copy.clear_channel(7)
+    assert program.channel(7).any()
+    assert copy != program
+
+
+def test_join_and_repeat(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    other = PackedWaveform.zeros(64)
+    joined = PackedWaveform.join([program, wave_dict, other])
+    assert np.array_equal(joined.words, np.concatenate([program.words, program.words, other.words]))
+    assert program + other == program.concat(other)
+    assert len(PackedWaveform.join([])) == 0
+    assert np.array_equal(program.repeat(3).words, np.tile(program.words, 3))
+    with pytest.raises(ValueError):
+        program.repeat(-1)
+
+
+def test_array_interface(wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    assert np.asarray(program) is program.words
+    assert np.array(program, copy=True) is not program.words
+    assert np.asarray(program, dtype=int).dtype == int
+    assert PackedWaveform.coerce(program) is program
+    assert PackedWaveform.coerce(wave_dict) == program
+
+
+def test_create_wave_file_and_read_back(device, driver_directory, wave_dict):
+    program = PackedWaveform.from_channels(wave_dict)
+    wave_filename = device.create_wave_file('packed', program)
+    path = os.path.join(driver_directory, wave_filename)
+    assert np.array_equal(read_wavefile_words(path), program.words)
+    dict_filename = device.create_wave_file('dict', wave_dict)
+    assert np.array_equal(read_wavefile_words(os.path.join(driver_directory, dict_filename)), program.words)
+    assert PackedWaveform.from_wavefile(path) == program
+    assert np.array_equal(wavefile2arrays(program), wavefile2arrays(path))
@@ -0,0 +1,71 @@
+# Tests of packing channel waveforms into dpg11 words
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.packing import channel_dict_length, pack_channels, pack_stacked_bits
+
+
+def string_pack(wave_dict, num_points):
+    # The original string based packing of create_wave_file, one int(x, 2) per sample
+    null_array = np.zeros(num_points, dtype=int)
+    stacked_arr = np.stack([wave_dict.get(channel, null_array) for channel in range(16, 0, -1)], axis=1)
+    return np.array([int(''.join(str(int(bit)) for bit in row), 2) for row in stacked_arr])
+
+
+@pytest.mark.parametrize('channels', [[1], [1, 2, 3, 4], [2, 11], [16], list(range(1, 17))])
+def test_pack_channels_matches_string_packing(channels):
+    rng = np.random.default_rng(0)
+    wave_dict = {channel: rng.integers(0, 2, 256) for channel in channels}
+    words = pack_channels(wave_dict)
+    assert words.dtype == np.uint16
+    assert np.array_equal(words, string_pack(wave_dict, 256))
+
+
+def test_pack_channels_treats_nonzero_as_on():
+    wave_dict = {1: np.array([0, 2, -1, 0]), 2: np.array([0.0, 0.5, 0, 1]), 3: np.array([False, True, True, False])}
+    assert pack_channels(wave_dict).tolist() == [0, 7, 5, 2]
+
+
+def test_pack_channels_strided_input():
+    stack = np.zeros((128, 3), dtype=np.uint8)
+    stack[::2, 1] = 1
+    assert np.array_equal(pack_channels({2: stack[:, 1]}), (np.arange(128) % 2 == 0) * 2)
+
+
+@pytest.mark.parametrize('wave_dict', [{0: np.ones(64)}, {17: np.ones(64)}])
+def test_pack_channels_rejects_bad_channels(wave_dict):
+    with pytest.raises(ValueError):
+        pack_channels(wave_dict)
+
+
+def test_pack_channels_rejects_a_wrong_length():
+    with pytest.raises(ValueError):
+        pack_channels({1: np.ones(64)}, num_points=128)
+
+
+def test_channel_dict_length():
+    assert channel_dict_length({1: np.ones(64), 3: np.zeros(64)}) == 64
+    with pytest.raises(ValueError):
+        channel_dict_length({1: np.ones(64), 3: np.zeros(128)})
+    with pytest.raises(ValueError):
+        channel_dict_length({})
+
+
+@pytest.mark.parametrize('dtype', [int, np.uint8, bool, float])
+def test_pack_stacked_bits_is_the_weighted_sum(dtype):
+    stack_arr = np.random.default_rng(1).integers(0, 2, (500, 11)).astype(dtype)
+    weights = 2 ** np.arange(10, -1, -1)
+    assert np.array_equal(pack_stacked_bits(stack_arr), stack_arr.astype(np.int64) @ weights)
+
+
+def test_create_wave_file_matches_string_packing(device):
+    wave_dict = {1: np.random.default_rng(2).integers(0, 2, 128), 4: np.ones(128, dtype=int)}
+    wave_filename = device.create_wave_file('packed', wave_dict)
+    with open(f'{device.directory}/{wave_filename}') as f:
+        words = [int(line) for line in f.read().split()]
+    assert words == string_pack(wave_dict, 128).tolist()
+
+
+def test_create_decimal_array(device):
+    stack_arr = np.array([[0] * 10 + [1], [1] + [0] * 10, [1] * 11])
+    assert device.create_decimal_array(stack_arr).tolist() == [1, 1024, 2047]
@@ -0,0 +1,163 @@
+# Tests of planning programs against the device limits and of writing planned segments
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.planner import ProgramPlan, num_points_from_filename, split_segments
+from dpg11_pylib.waveforms.packing import pack_channels
+
+BLOCK = np.arange(64, dtype=np.uint16)
+
+
+def played(words, segments):
+    # The words the segments play once through
+    return np.concatenate([np.tile(words[start:start + length], max(loops, 1)) for start, length, loops in segments])
+
+
+def test_num_points_from_filename():
+    assert num_points_from_filename('wavefiles/test_4096.txt') == 4096
+    assert num_points_from_filename('C:/dax/wavefiles/odmr_ab12_64.txt') == 64
+    with pytest.raises(ValueError):
+        num_points_from_filename('wavefiles/test.txt')
+
+
+def test_plan_from_files_that_fits():
+    plan = ProgramPlan.from_files(['wavefiles/a_4096.txt', 'wavefiles/b_64.txt', 'wavefiles/a_4096.txt'],
+                                  [1, 100, 2], [1, 0, 0])
+    assert plan.fits
+    assert plan.num_segments == 3
+    assert plan.stored_points == 4096 + 64
+    assert plan.played_points == 3 * 4096 + 6400
+    assert plan.usage()['loops'] == (100, 65534)
+    plan.check()
+    with pytest.raises(ValueError):
+        ProgramPlan.from_files(['wavefiles/a_4096.txt'], [1, 2], [1])
+
+
+def test_plan_lists_every_problem():
+    plan = ProgramPlan([('a', 100, 70000, 2), ('b', 32, 1, 0)] + [('c', 64, 1, 0)] * 60,
+                       pad_begin=5000, memory_limits=(48, 8e6))
+    problems = plan.problems()
+    assert len(problems) == 7
+    assert not plan.fits
+    assert plan.played_points == 100 * 70000 + 32 + 60 * 64
+    with pytest.raises(ValueError, match='does not fit'):
+        plan.check()
+    assert 'segments' in str(plan)
+    assert ProgramPlan([('a', 64, 0, 0)]).played_points is None
+    assert ProgramPlan([]).problems() == ['The program has no segments']
+
+
+def test_short_waveform_is_one_segment():
+    words = np.arange(128, dtype=np.uint16)
+    assert split_segments(words, num_loops=3) == ([(0, 128, 3)], False)
+    assert split_segments(words) == ([(0, 128, 0)], False)
+    with pytest.raises(ValueError):
+        split_segments(words[:100])
+    with pytest.raises(ValueError):
+        split_segments(words, max_segment_points=32)
+
+
+def test_periodic_waveform_is_one_looped_segment():
+    words = np.tile(np.arange(192, dtype=np.uint16), 100)
+    segments, loop_sequence = split_segments(words, num_loops=2, max_segment_points=1000)
+    assert segments == [(0, 960, 40)]
+    assert not loop_sequence
+    assert split_segments(np.tile(BLOCK, 100), num_loops=1000, max_segment_points=64) == \
+        ([(0, 64, 65534), (0, 64, 34466)], False)
+
+
+def test_long_waveform_is_split_into_distinct_blocks():
+    words = np.concatenate([np.tile(BLOCK, 4), np.tile(BLOCK + 1, 4), np.tile(BLOCK, 4)])
+    segments, loop_sequence = split_segments(words, max_segment_points=256)
+    assert segments == [(0, 256, 1), (256, 256, 1), (0, 256, 1)]
+    assert loop_sequence
+    assert np.array_equal(played(words, segments), words)
+
+
+def test_finite_plays_merge_the_last_block_into_the_next_play():
+    words = np.concatenate([np.tile(BLOCK, 4), np.tile(BLOCK + 1, 4), np.tile(BLOCK, 4)])
+    segments, loop_sequence = split_segments(words, num_loops=3, max_segment_points=256)
+    assert not loop_sequence
+    assert segments == [(0, 256, 1), (256, 256, 1), (0, 256, 2), (256, 256, 1), (0, 256, 2), (256, 256, 1),
+                        (0, 256, 1)]
+    assert np.array_equal(played(words, segments), np.tile(words, 3))
+
+
+def test_finite_plays_are_written_out_when_they_fit():
+    words = np.concatenate([np.tile(BLOCK, 4), np.tile(BLOCK + 1, 4)])
+    segments, loop_sequence = split_segments(words, num_loops=5, max_segment_points=256)
+    assert not loop_sequence
+    assert len(segments) == 10
+    assert np.array_equal(played(words, segments), np.tile(words, 5))
+
+
+def test_finite_plays_over_the_sequence_limit_are_rejected():
+    words = np.concatenate([np.tile(BLOCK, 4), np.tile(BLOCK + 1, 4)])
+    with pytest.raises(ValueError, match='more than the limit of 60'):
+        split_segments(words, num_loops=65534, max_segment_points=256)
+
+
+def test_plan_segments_rejects_a_waveform_over_the_memory(memory_device):
+    plan = memory_device.plan_segments({1: np.ones(9000064)})
+    assert plan.fits
+    plan = memory_device.plan_segments(np.random.default_rng(0).integers(0, 2 ** 11, 9000064))
+    assert not plan.fits
+    assert plan.usage()['memory'][0] == 9000064
+    assert memory_device.transport.files == {}
+
+
+def test_create_planned_segments_writes_nothing_when_it_does_not_fit(memory_device):
+    with pytest.raises(ValueError, match='does not fit'):
+        memory_device.create_planned_segments('oversized', {1: np.random.default_rng(0).integers(0, 2, 9000064)})
+    assert memory_device.transport.files == {}
+
+
+def test_create_planned_segments_loops_a_periodic_waveform(memory_device):
+    wave_dict = {1: np.tile(np.arange(2048) % 256 < 64, 6000)}
+    command = memory_device.create_planned_segments('periodic', wave_dict, num_loops=1)
+    assert command.startswith('CreateSingleSegment')
+    wave_filename, num_loops = command.split()[7], int(command.split()[4])
+    words = memory_device.transport.files['dry_run/' + wave_filename]
+    assert np.array_equal(np.tile(words, num_loops), pack_channels(wave_dict))
+
+
+def test_create_planned_segments_splits_a_long_waveform(memory_device):
+    wave_dict = {1: np.arange(4096) % 3 == 0}
+    command = memory_device.create_planned_segments('long', wave_dict, num_loops=2, max_segment_points=1024)
+    assert command.startswith('CreateSegments')
+    multi_wavefile = next(text for path, text in memory_device.transport.files.items() if 'multi_wavefiles' in path)
+    played_words = []
+    for line in multi_wavefile.splitlines():
+        wave_filename, _, loops, _ = line.split()
+        played_words.append(np.tile(memory_device.transport.files['dry_run/' + wave_filename], int(loops)))
+    assert np.array_equal(np.concatenate(played_words), np.tile(pack_channels(wave_dict), 2))
+    # The last block of the first play is the first block of the second one, so they are one segment
+    assert [line.split()[2] for line in multi_wavefile.splitlines()] == ['1', '1', '1', '2', '1', '1', '1']
+    assert [line.split()[3] for line in multi_wavefile.splitlines()] == ['1'] + ['0'] * 6
+
+
+def test_create_segments_from_words_writes_each_block_once(memory_device):
+    words = np.concatenate([BLOCK, BLOCK + 1])
+    command = memory_device.create_segments_from_words('program', words,
+                                                       [(0, 64, 5, 1), (64, 64, 1, 0), (0, 64, 2, 0)],
+                                                       loop_sequence=True)
+    assert command == 'CreateSegments 1 1 3 2047 2047 multi_wavefiles/program_3.txt true'
+    files = memory_device.transport.files
+    assert sorted(path for path in files if 'wavefiles/program_' in path and 'multi' not in path) == \
+        ['dry_run/wavefiles/program_0_64.txt', 'dry_run/wavefiles/program_1_64.txt']
+    assert files['dry_run/multi_wavefiles/program_3.txt'].splitlines() == ['wavefiles/program_0_64.txt 64 5 1',
+                                                                         'wavefiles/program_1_64.txt 64 1 0',
+                                                                         'wavefiles/program_0_64.txt 64 2 0']
+
+
+def test_create_segments_from_words_single_segment(memory_device):
+    command = memory_device.create_segments_from_words('single', BLOCK, [(0, 64, 0, 1)])
+    assert command == 'CreateSingleSegment 1 1 64 0 2047 2047 wavefiles/single_64.txt 1'
+
+
+def test_create_segments_from_words_checks_the_memory_first(memory_device):
+    memory_device.memory_limits = [48, 100]
+    with pytest.raises(ValueError, match='memory limit'):
+        memory_device.create_segments_from_words('program', np.arange(128, dtype=np.uint16),
+                                                 [(0, 64, 1, 1), (64, 64, 1, 0)])
+    assert memory_device.transport.files == {}
@@ -0,0 +1,95 @@
+# Tests of the run length waveforms
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.packing import pack_channels
+from dpg11_pylib.waveforms.run_length import RunLengthWaveform
+
+
+def random_waveform(length, seed=0):
+    # Random runs of 1 to 20 samples
+    rng = np.random.default_rng(seed)
+    return np.repeat(rng.integers(0, 2, length), rng.integers(1, 20, length))[:length]
+
+
+def test_runs_are_merged():
+    waveform = RunLengthWaveform([1, 1, 0, 0, 1], [2, 3, 0, 4, 1])
+    assert waveform.values.tolist() == [1, 0, 1]
+    assert waveform.lengths.tolist() == [5, 4, 1]
+    assert len(waveform) == 10
+    assert waveform.run_starts.tolist() == [0, 5, 9]
+
+
+@pytest.mark.parametrize('values, lengths', [([2], [1]), ([1], [-1]), ([1, 0], [1])])
+def test_bad_runs_are_rejected(values, lengths):
+    with pytest.raises(ValueError):
+        RunLengthWaveform(values, lengths)
+
+
+def test_round_trip():
+    array = random_waveform(1000)
+    waveform = RunLengthWaveform.from_array(array)
+    assert np.array_equal(waveform.to_array(), array)
+    assert np.array_equal(np.asarray(waveform), array)
+    assert RunLengthWaveform.from_array([]) == RunLengthWaveform([], [])
+
+
+def test_operations_match_the_arrays():
+    a, b = random_waveform(100, 1), random_waveform(50, 2)
+    run_a, run_b = RunLengthWaveform.from_array(a), RunLengthWaveform.from_array(b)
+    assert np.array_equal((run_a + run_b).to_array(), np.concatenate([a, b]))
+    assert np.array_equal(RunLengthWaveform.join([run_a, b]).to_array(), np.concatenate([a, b]))
+    assert np.array_equal(run_a.repeat(3).to_array(), np.tile(a, 3))
+    assert np.array_equal(run_b.pad(64, pad_value=1).to_array(), np.pad(b, (0, 14), constant_values=1))
+    assert np.array_equal(run_b.pad(64, pad_side='left').to_array(), np.pad(b, (14, 0)))
+
+
+def test_slicing_matches_the_array():
+    array = random_waveform(300, 3)
+    waveform = RunLengthWaveform.from_array(array)
+    for start, stop in [(0, 300), (5, 17), (100, 100), (-40, None), (250, 400)]:
+        assert np.array_equal(waveform[start:stop].to_array(), array[start:stop])
+    assert [waveform[i] for i in [0, 99, -1]] == [array[0], array[99], array[-1]]
+    with pytest.raises(IndexError):
+        waveform[300]
+    with pytest.raises(ValueError):
+        waveform[::2]
+
+
+def test_pad_errors():
+    with pytest.raises(ValueError):
+        RunLengthWaveform.on(64).pad(32)
+    with pytest.raises(ValueError):
+        RunLengthWaveform.on(64).pad(128, pad_value=2)
+    with pytest.raises(ValueError):
+        RunLengthWaveform.on(64).pad(128, pad_side='middle')
+
+
+def test_on_intervals():
+    starts, ends = RunLengthWaveform([0, 1, 0, 1], [2, 3, 4, 5]).on_intervals()
+    assert starts.tolist() == [2, 9]
+    assert ends.tolist() == [5, 14]
+
+
+def test_packing_run_length_channels_matches_the_arrays():
+    arrays = {1: random_waveform(640, 4), 3: random_waveform(640, 5), 16: random_waveform(640, 6)}
+    mixed = {1: RunLengthWaveform.from_array(arrays[1]), 3: arrays[3], 16: RunLengthWaveform.from_array(arrays[16])}
+    assert np.array_equal(pack_channels(mixed), pack_channels(arrays))
+
+
+def test_create_wave_file_with_run_length_channels(device, driver_directory):
+    train = RunLengthWaveform.on(64).pad(128).repeat(10)
+    filename = device.create_wave_file('train', {1: train})
+    words = np.loadtxt(os.path.join(driver_directory, filename), dtype=int)
+    assert np.array_equal(words, train.to_array())
+
+
+def test_expands_to_uint8_like_the_waveforms_module():
+    waveform = RunLengthWaveform([1, 0], [3, 61])
+    assert waveform.to_array().dtype == np.uint8
+    assert np.asarray(waveform).dtype == np.uint8
+    assert np.asarray(waveform, dtype=bool).dtype == bool
+    assert waveform.to_array(int).dtype == int
+    assert np.array_equal(np.asarray(waveform), np.repeat([1, 0], [3, 61]))
@@ -0,0 +1,141 @@
+# Tests of the runner of the asv style benchmark suite
+import json
+import os
+import types
+
+import pytest
+
+from benchmarks import run_suite
+
+
+class TimeFake:
+    params = [[64, 128], ['a', 'b']]
+    param_names = ['num_points', 'name']
+    calls = []
+
+    def setup(self, num_points, name):
+        self.calls.append(('setup', num_points, name))
+
+    def teardown(self, num_points, name):
+        self.calls.append(('teardown', num_points, name))
+
+    def time_call(self, num_points, name):
+        self.calls.append(('call', num_points, name))
+
+    def helper(self):
+        pass
+
+
+class TimeSingle:
+    params = [1, 2]
+    param_names = ['value']
+
+    def time_value(self, value):
+        pass
+
+
+class TimeNoParams:
+    def time_nothing(self):
+        pass
+
+
+@pytest.fixture
+def fake_suite(monkeypatch, tmp_path):
+    # A suite of the fake benchmark classes, storing its results in a temporary directory
+    module = types.ModuleType('suite_fake')
+    for benchmark_class in [TimeFake, TimeSingle, TimeNoParams]:
+        setattr(module, benchmark_class.__name__, type(benchmark_class.__name__, (benchmark_class,),
+                                                       {'__module__': 'suite_fake'}))
+    monkeypatch.setattr(run_suite, 'load_suite', lambda: [module])
+    monkeypatch.setattr(run_suite, 'RESULTS_DIRECTORY', str(tmp_path / 'results'))
+    monkeypatch.setattr(run_suite, 'MIN_SAMPLE_TIME', 1e-4)
+    TimeFake.calls = []
+    return module
+
+
+def write_results(path, results):
+    with open(path, 'w') as f:
+        json.dump({'commit': 'abc', 'results': results}, f)
+
+
+def test_param_combinations():
+    assert run_suite.param_combinations(TimeFake) == [(64, 'a'), (64, 'b'), (128, 'a'), (128, 'b')]
+    assert run_suite.param_combinations(TimeSingle) == [(1,), (2,)]
+    assert run_suite.param_combinations(TimeNoParams) == [()]
+
+
+def test_iter_benchmarks(fake_suite):
+    names = [name for name, _, _, _ in run_suite.iter_benchmarks([fake_suite])]
+    assert names == ["suite_fake.TimeFake.time_call(64, 'a')",
+                     "suite_fake.TimeFake.time_call(64, 'b')",
+                     "suite_fake.TimeFake.time_call(128, 'a')",
+                     "suite_fake.TimeFake.time_call(128, 'b')",
+                     'suite_fake.TimeNoParams.time_nothing',
+                     'suite_fake.TimeSingle.time_value(1)',
+                     'suite_fake.TimeSingle.time_value(2)']
+
+
+def test_time_benchmark_sets_up_and_tears_down():
+    TimeFake.calls = []
+    seconds = run_suite.time_benchmark(TimeFake, 'time_call', (64, 'a'), quick=True)
+    assert seconds >= 0
+    assert TimeFake.calls == [('setup', 64, 'a'), ('call', 64, 'a'), ('teardown', 64, 'a')]
+
+
+def test_time_raw_runs_the_code_in_a_fresh_interpreter():
+    assert run_suite.time_raw('import dpg11_pylib.waveforms', quick=True) > 0
+    with pytest.raises(Exception):
+        run_suite.time_raw('raise RuntimeError', quick=True)
+
+
+def test_format_time():
+    assert run_suite.format_time(2.5) == '2.500 s'
+    assert run_suite.format_time(2.5e-3) == '2.500 ms'
+    assert run_suite.format_time(2.5e-6) == '2.500 us'
+    assert run_suite.format_time(2.5e-9) == '2.5 ns'
+
+
+def test_results_are_stored(fake_suite, capsys):
+    assert run_suite.main(['--quick', '-b', 'TimeSingle|TimeNoParams']) == 0
+    paths = os.listdir(run_suite.RESULTS_DIRECTORY)
+    assert len(paths) == 1
+    with open(os.path.join(run_suite.RESULTS_DIRECTORY, paths[0])) as f:
+        run = json.load(f)
+    assert sorted(run['results']) == ['suite_fake.TimeNoParams.time_nothing',
+                                      'suite_fake.TimeSingle.time_value(1)',
+                                      'suite_fake.TimeSingle.time_value(2)']
+    assert run['quick'] is True
+    assert 'Results stored in' in capsys.readouterr().out
+    assert run_suite.latest_results() == os.path.join(run_suite.RESULTS_DIRECTORY, paths[0])
+
+
+def test_max_points_skips_the_large_benchmarks(fake_suite):
+    run_suite.main(['--quick', '--no-save', '--max-points', '64', '-b', 'TimeFake'])
+    assert {num_points for _, num_points, _ in TimeFake.calls} == {64}
+    assert not os.path.exists(run_suite.RESULTS_DIRECTORY)
+
+
+def test_regressions_fail_the_run(fake_suite, tmp_path, capsys):
+    # Every fake benchmark takes far more than a nanosecond
+    previous = str(tmp_path / 'previous.json')
+    write_results(previous, {'suite_fake.TimeNoParams.time_nothing': 1e-12})
+    assert run_suite.main(['--quick', '--no-save', '-b', 'TimeNoParams', '--compare', previous]) == 1
+    out = capsys.readouterr().out
+    assert 'REGRESSION' in out
+    assert '1 regressions' in out
+
+
+def test_faster_benchmarks_pass(fake_suite, tmp_path, capsys):
+    previous = str(tmp_path / 'previous.json')
+    write_results(previous, {'suite_fake.TimeNoParams.time_nothing': 1e3,
+                             'suite_fake.TimeSingle.time_value(1)': 1e3})
+    assert run_suite.main(['--quick', '--no-save', '-b', 'TimeNoParams|TimeSingle', '--compare', previous]) == 0
+    out = capsys.readouterr().out
+    assert out.count('x faster') == 2
+    assert '0 regressions' in out
+
+
+def test_suite_runs_at_the_smallest_size(monkeypatch, tmp_path):
+    # Every benchmark of the waveforms and driver suites runs, without storing or comparing results
+    monkeypatch.setattr(run_suite, 'RESULTS_DIRECTORY', str(tmp_path / 'results'))
+    assert run_suite.main(['--quick', '--no-save', '--max-points', '64', '-b', 'suite_(waveforms|driver)']) == 0
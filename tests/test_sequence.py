@@ -0,0 +1,124 @@
+# Tests of compiling nested sequences of blocks and repeats into segments
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.sequence import Block, FlattenedRepeat, Repeat, compile_sequence
+
+
+@pytest.fixture
+def blocks():
+    pulse = Block({1: np.ones(64, dtype=np.uint8)}, triggered=1)
+    wait = Block({1: np.zeros(128, dtype=np.uint8)})
+    clock = Block({2: np.tile([1, 0], 32)})
+    return pulse, wait, clock
+
+
+def played(segments):
+    # The words the compiled segments play once through
+    return np.concatenate([np.tile(leaf.words, loops) for leaf, loops in segments])
+
+
+def test_block_length_must_be_modulo_64():
+    with pytest.raises(ValueError):
+        Block({1: np.ones(100, dtype=np.uint8)})
+
+
+def test_repeat_checks_its_children(blocks):
+    pulse, _, _ = blocks
+    with pytest.raises(ValueError):
+        Repeat(-1, pulse)
+    with pytest.raises(ValueError):
+        Repeat(2)
+    with pytest.raises(TypeError):
+        Repeat(2, pulse.words)
+    with pytest.raises(ValueError):
+        Repeat(2, Repeat(0, pulse))
+
+
+def test_repeat_length_and_body(blocks):
+    pulse, wait, clock = blocks
+    repeat = Repeat(3, pulse, Repeat(2, clock))
+    assert len(repeat) == 3 * (64 + 128)
+    assert np.array_equal(repeat.body_words(), np.concatenate([pulse.words, clock.words, clock.words]))
+    assert len(Repeat(0, wait)) == 128
+
+
+def test_single_block_is_one_segment(blocks):
+    pulse, _, _ = blocks
+    assert compile_sequence(pulse) == ([(pulse, 1)], False)
+
+
+def test_repeat_of_one_block_is_a_loop_count(blocks):
+    _, _, clock = blocks
+    assert compile_sequence(Repeat(4, Repeat(5, clock))) == ([(clock, 20)], False)
+
+
+def test_repeat_of_a_triggered_block_waits_for_every_trigger(blocks):
+    pulse, _, _ = blocks
+    assert compile_sequence(Repeat(3, pulse)) == ([(pulse, 1)] * 3, False)
+    assert compile_sequence(Repeat(2, Repeat(2, pulse))) == ([(pulse, 1)] * 4, False)
+    with pytest.raises(ValueError):
+        compile_sequence(Repeat(61, pulse))
+
+
+def test_continuous_repeat_of_one_block_loops_with_zero(blocks):
+    _, _, clock = blocks
+    assert compile_sequence(Repeat(0, Repeat(5, clock))) == ([(clock, 0)], False)
+
+
+def test_repeat_of_several_blocks_is_unrolled(blocks):
+    pulse, wait, clock = blocks
+    sequence = Repeat(10, pulse, wait, Repeat(50, clock))
+    segments, loop_sequence = compile_sequence(sequence)
+    assert not loop_sequence
+    assert segments == [(pulse, 1), (wait, 1), (clock, 50)] * 10
+    assert np.array_equal(played(segments), np.tile(sequence.body_words(), 10))
+
+
+def test_continuous_sequence_loops_the_segments(blocks):
+    pulse, wait, _ = blocks
+    assert compile_sequence(Repeat(0, pulse, wait)) == ([(pulse, 1), (wait, 1)], True)
+
+
+def test_loop_counts_over_the_limit_are_split(blocks):
+    _, wait, clock = blocks
+    segments, _ = compile_sequence(Repeat(3, wait, Repeat(100000, clock)))
+    assert segments == [(wait, 1), (clock, 65534), (clock, 34466)] * 3
+
+
+def test_too_many_segments_flattens_the_repeat(blocks):
+    pulse, wait, clock = blocks
+    sequence = Repeat(10000, wait, Repeat(50, clock))
+    segments, loop_sequence = compile_sequence(sequence)
+    assert not loop_sequence
+    assert len(segments) == 1
+    leaf, loops = segments[0]
+    assert isinstance(leaf, FlattenedRepeat)
+    assert loops == 10000
+    assert leaf.triggered == wait.triggered
+    assert np.array_equal(leaf.words, sequence.body_words())
+
+    # A flattened repeat that starts with a triggered block still needs a segment per trigger
+    with pytest.raises(ValueError):
+        compile_sequence(Repeat(10000, pulse, wait, Repeat(50, clock)))
+    segments, _ = compile_sequence(Repeat(3, pulse, wait, Repeat(50, clock)), max_segments=3)
+    assert [(type(leaf), loops) for leaf, loops in segments] == [(FlattenedRepeat, 1)] * 3
+
+
+def test_sequence_that_cannot_fit_is_rejected(blocks):
+    pulse, wait, _ = blocks
+    with pytest.raises(ValueError):
+        compile_sequence(Repeat(200000, pulse, wait), max_segments=2)
+
+
+def test_create_sequence_writes_each_block_once(device, driver_directory, blocks):
+    pulse, wait, clock = blocks
+    command = device.create_sequence('odmr', Repeat(10, pulse, wait, Repeat(50, clock)))
+    assert command.startswith('CreateSegments')
+    wavefiles = os.listdir(os.path.join(driver_directory, 'wavefiles'))
+    assert sorted(device.get_data_from_fn(filename) for filename in wavefiles) == [64, 64, 128]
+    multi_directory = os.path.join(driver_directory, 'multi_wavefiles')
+    with open(os.path.join(multi_directory, os.listdir(multi_directory)[0])) as f:
+        assert len(f.read().splitlines()) == 30
@@ -0,0 +1,88 @@
+# Tests of the shadow device state and of skipping redundant commands
+import numpy as np
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.state import DeviceState
+from dpg11_pylib.driver.transport import MemoryTransport
+
+SEGMENT = 'CreateSingleSegment 1 1 64 0 2047 2047 wavefiles/test_64.txt 0'
+
+
+def test_unknown_state_sends_everything():
+    state = DeviceState()
+    assert state.changed_commands(['Stop 1', 'SetClkRate 1 1000', 'SelExtTrig 1 false']) == \
+        ['Stop 1', 'SetClkRate 1 1000', 'SelExtTrig 1 false']
+
+
+def test_settings_that_do_not_change_are_dropped():
+    state = DeviceState()
+    state.apply(['Stop 1', 'SetClkRate 1 1000', 'SelExtTrig 1 false'])
+    assert state.changed_commands(['Stop 1', 'SetClkRate 1 1000', 'SetClkRate 1 2000', 'SelExtTrig 1 true',
+                                   'SetClkRate 2 1000']) == \
+        ['SetClkRate 1 2000', 'SelExtTrig 1 true', 'SetClkRate 2 1000']
+    # changed_commands does not apply the commands
+    assert state.cards[1].clock_rate == 1000
+
+
+def test_run_and_power_down_are_never_redundant():
+    state = DeviceState()
+    state.apply(['Run 1 true', 'PWR_DWN 1'])
+    assert state.changed_commands(['Run 1 true', 'Run 1 true', 'PWR_DWN 1']) == ['Run 1 true', 'Run 1 true',
+                                                                                 'PWR_DWN 1']
+    assert state.cards[1].powered is False
+
+
+def test_segments_need_known_contents():
+    state = DeviceState()
+    state.apply([SEGMENT])
+    assert state.changed_commands([SEGMENT]) == [SEGMENT]
+    state.file_written('wavefiles/test_64.txt', 'abc')
+    state.apply([SEGMENT])
+    assert state.changed_commands([SEGMENT]) == []
+    state.file_written('wavefiles/test_64.txt', 'def')
+    assert state.changed_commands([SEGMENT]) == [SEGMENT]
+    state.file_written('wavefiles/test_64.txt', None)
+    state.apply([SEGMENT])
+    assert state.changed_commands([SEGMENT]) == [SEGMENT]
+
+
+def test_multi_segments_check_every_member():
+    command = 'CreateSegments 1 1 2 2047 2047 multi_wavefiles/multi_2.txt false'
+    state = DeviceState()
+    state.file_written('wavefiles/a_64.txt', 'a')
+    state.file_written('wavefiles/b_64.txt', 'b')
+    state.file_written('multi_wavefiles/multi_2.txt', 'm', members=['wavefiles/a_64.txt', 'wavefiles/b_64.txt'])
+    state.apply([command])
+    assert state.changed_commands([command]) == []
+    state.file_written('wavefiles/b_64.txt', 'c')
+    assert state.changed_commands([command]) == [command]
+
+
+def test_unknown_commands_and_reset_forget_the_card():
+    state = DeviceState()
+    state.apply(['SetClkRate 1 1000', 'Launch 1'])
+    assert state.changed_commands(['SetClkRate 1 1000']) == ['SetClkRate 1 1000']
+    state.apply(['SetClkRate 1 1000'])
+    state.reset()
+    assert state.changed_commands(['SetClkRate 1 1000']) == ['SetClkRate 1 1000']
+
+
+def test_device_skips_a_repeated_point():
+    device = DPG11Device('dry_run', transport=MemoryTransport(), skip_redundant_commands=True)
+    for _ in range(2):
+        wave_filename = device.create_wave_file('test', {1: np.ones(64)})
+        device.run_single_wave(wave_filename, clock_rate=1e9)
+    assert device.transport.commands() == ['Stop 1', 'SetClkRate 1 1000000000', SEGMENT, 'Run 1 true',
+                                           'Stop 1', 'Run 1 true']
+
+    # New contents under the same name are loaded again
+    device.create_wave_file('test', {1: np.zeros(64)})
+    device.run_single_wave(wave_filename, clock_rate=1e9)
+    assert device.transport.commands()[-3:] == ['Stop 1', SEGMENT, 'Run 1 true']
+
+
+def test_device_sends_everything_by_default(memory_device):
+    wave_filename = memory_device.create_wave_file('test', {1: np.ones(64)})
+    memory_device.run_single_wave(wave_filename, clock_rate=1e9)
+    memory_device.run_single_wave(wave_filename, clock_rate=1e9)
+    assert len(memory_device.transport.commands()) == 8
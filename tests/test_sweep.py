@@ -0,0 +1,76 @@
+# Tests of precompiling the wavefiles of a sweep
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.sweep import build_sweep_wavefile, precompile_sweep
+from dpg11_pylib.driver.transport import MemoryTransport
+from dpg11_pylib.waveforms.packing import pack_channels
+
+POINTS = [64, 128, 64, 192]
+
+
+def build_wave_dict(pulse_samples, num_points=1024):
+    samples = np.arange(num_points)
+    return {1: samples % (2 * pulse_samples) < pulse_samples, 3: samples % 2}
+
+
+def test_build_sweep_wavefile(tmp_path):
+    wave_filename, digest, words = build_sweep_wavefile(build_wave_dict, 64, 'sweep')
+    assert np.array_equal(words, pack_channels(build_wave_dict(64)))
+    assert wave_filename == f'wavefiles/sweep_{digest}_1024.txt'
+
+    os.makedirs(tmp_path / 'wavefiles')
+    assert build_sweep_wavefile(build_wave_dict, 64, 'sweep', str(tmp_path)) == (wave_filename, digest, None)
+    assert np.array_equal(np.loadtxt(tmp_path / wave_filename, dtype=np.uint16), words)
+
+    with pytest.raises(ValueError):
+        build_sweep_wavefile(functools.partial(build_wave_dict, num_points=100), 64, 'sweep')
+
+
+def test_pool_matches_create_wave_file(device):
+    manifest = precompile_sweep(device, build_wave_dict, POINTS, max_workers=2)
+    assert [entry[0] for entry in manifest] == POINTS
+    assert len(manifest.wave_filenames()) == 3
+    for point, wave_filename, _ in manifest:
+        serial_filename = device.create_wave_file(f'serial_{point}', build_wave_dict(point))
+        with open(os.path.join(device.directory, serial_filename)) as f, \
+                open(os.path.join(device.directory, wave_filename)) as g:
+            assert f.read() == g.read()
+
+
+def test_memory_transport_gets_the_words(memory_device):
+    with ThreadPoolExecutor() as executor:
+        manifest = precompile_sweep(memory_device, build_wave_dict, POINTS, executor=executor)
+    for point, wave_filename, _ in manifest:
+        words = memory_device.transport.files[memory_device.directory + '/' + wave_filename]
+        assert np.array_equal(words, pack_channels(build_wave_dict(point)))
+
+
+def test_manifest_programs_a_point(memory_device):
+    with ThreadPoolExecutor() as executor:
+        manifest = precompile_sweep(memory_device, build_wave_dict, POINTS, clock_rate=1e9, run=True, num_loops=5,
+                                    triggered=0, executor=executor)
+    assert len(manifest) == 4
+    wave_filename, command_list = manifest.lookup(128)
+    assert command_list == ['Stop 1', 'SetClkRate 1 1000000000',
+                            f'CreateSingleSegment 1 1 1024 5 2047 2047 {wave_filename} 0', 'Run 1 true']
+    assert manifest.index(64) == 0
+    with pytest.raises(KeyError):
+        manifest.lookup(256)
+
+    manifest.program(memory_device, 1)
+    assert memory_device.transport.commands() == command_list
+
+
+def test_repeated_points_are_skipped_with_the_shadow_state():
+    device = DPG11Device('dry_run', transport=MemoryTransport(), skip_redundant_commands=True)
+    with ThreadPoolExecutor() as executor:
+        manifest = precompile_sweep(device, build_wave_dict, POINTS, clock_rate=1e9, executor=executor)
+    manifest.program(device, 0)
+    manifest.program(device, 2)
+    assert device.transport.num_sent == 1
@@ -0,0 +1,84 @@
+# Tests of the file and in-memory transports
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.dpg11 import DPG11Device
+from dpg11_pylib.driver.transport import FileTransport, MemoryTransport
+
+
+def program(device):
+    # A single wave and a multi-wave program, returning the wavefile names
+    first = device.create_wave_file('first', {1: np.ones(64), 3: np.arange(64) % 2})
+    second = device.create_wave_file('second', {2: np.ones(128)})
+    waves_filename = device.create_multi_wave_file('multi', [first, second], [2, 1], [1, 0])
+    device.run_single_wave(first, clock_rate=1e9)
+    device.run_multi_wave(waves_filename, clock_rate=2e9, loop=True)
+    return [first, second], waves_filename
+
+
+def test_file_transport_needs_the_driver(tmp_path):
+    with pytest.raises(ValueError):
+        FileTransport(str(tmp_path))
+    transport = FileTransport(str(tmp_path), check_driver=False)
+    for subdirectory in ['scripts', 'wavefiles', 'multi_wavefiles']:
+        assert os.path.isdir(os.path.join(transport.directory, subdirectory))
+
+
+def test_memory_transport_does_not_touch_the_disk(tmp_path):
+    directory = str(tmp_path / 'missing')
+    device = DPG11Device(directory, transport=MemoryTransport())
+    program(device)
+    assert not os.path.exists(directory)
+
+
+def test_memory_transport_matches_the_file_transport(driver_directory):
+    file_device = DPG11Device(driver_directory)
+    memory_device = DPG11Device(driver_directory, transport=MemoryTransport())
+    wave_filenames, waves_filename = program(file_device)
+    # The file transport leaves the last script at dax_cmd.txt since no GUI consumes it
+    with open(os.path.join(driver_directory, 'dax_cmd.txt')) as f:
+        last_script = f.read()
+    assert program(memory_device) == (wave_filenames, waves_filename)
+
+    transport = memory_device.transport
+    assert transport.scripts[-1] == last_script
+    assert transport.num_sent == 2
+    for wave_filename in wave_filenames:
+        path = os.path.join(driver_directory, wave_filename)
+        assert np.array_equal(transport.files[path], np.loadtxt(path, dtype=np.uint16))
+    path = os.path.join(driver_directory, waves_filename)
+    with open(path) as f:
+        assert transport.files[path] == f.read()
+
+
+def test_memory_transport_log():
+    transport = MemoryTransport()
+    transport.write_script('a.txt', 'Stop 1\n\nRun 1 true')
+    transport.send('a.txt', keep_script=False)
+    assert 'a.txt' not in transport.files
+    transport.write_script('b.txt', 'Stop 1')
+    assert transport.submit('b.txt').result() == 0.0
+    assert transport.exists('b.txt')
+    assert transport.wait_for_consumption()
+    assert transport.commands() == ['Stop 1', 'Run 1 true', 'Stop 1']
+    times = [sent_time for sent_time, _ in transport.log]
+    assert times == sorted(times)
+
+    transport.clear()
+    assert transport.files == {} and transport.commands() == [] and transport.scripts == []
+
+
+def test_memory_transport_submit_reports_errors():
+    future = MemoryTransport().submit('missing.txt')
+    with pytest.raises(KeyError):
+        future.result()
+
+
+def test_wavefile_copies_are_kept():
+    transport = MemoryTransport()
+    words = np.arange(64, dtype=np.uint16)
+    transport.write_wavefile('w.txt', words)
+    words[:] = 0
+    assert np.array_equal(transport.files['w.txt'], np.arange(64))
@@ -0,0 +1,73 @@
+# Tests of the argument type checks
+import numpy as np
+import pytest
+
+from dpg11_pylib.driver.validation import set_validation, validate_arguments, validation_disabled
+from dpg11_pylib.waveforms.packing import PackedWaveform
+
+
+@validate_arguments
+def command(clock_rate: float,
+            num_loops: int = 0,
+            execute: bool = False,
+            wave_dict: dict = None,
+            *,
+            name: str = 'test',
+            anything=None):
+    return clock_rate, num_loops, execute, wave_dict, name, anything
+
+
+@pytest.mark.parametrize('clock_rate', [1e9, 1000000000, np.float32(1e9), np.int64(1000000000)])
+def test_numbers_are_accepted_as_floats(clock_rate):
+    assert command(clock_rate)[0] == clock_rate
+
+
+@pytest.mark.parametrize('num_loops', [1, np.int32(1), np.uint16(1)])
+def test_integers_are_accepted(num_loops):
+    assert command(1e9, num_loops)[1] == 1
+
+
+@pytest.mark.parametrize('args, kwargs', [(('1e9',), {}),
+                                          ((True,), {}),
+                                          ((1e9, 1.5), {}),
+                                          ((1e9,), {'num_loops': np.bool_(True)}),
+                                          ((1e9,), {'execute': 1}),
+                                          ((1e9,), {'wave_dict': [1, 0]}),
+                                          ((1e9,), {'name': 1})])
+def test_wrong_types_are_rejected(args, kwargs):
+    with pytest.raises(TypeError):
+        command(*args, **kwargs)
+
+
+def test_bool_and_packed_waveforms_are_accepted():
+    packed = PackedWaveform.from_channels({1: np.ones(64)})
+    assert command(1e9, execute=np.bool_(True), wave_dict=packed)[3] is packed
+    assert command(1e9, wave_dict={1: np.ones(64)}, anything=object())[0] == 1e9
+
+
+def test_unannotated_arguments_are_not_checked():
+    assert [check[0] for check in command.checks] == ['clock_rate', 'num_loops', 'execute', 'wave_dict', 'name']
+    assert command.checks[-1][1] is None
+
+
+def test_checks_can_be_turned_off():
+    with validation_disabled():
+        assert command('1e9')[0] == '1e9'
+        with validation_disabled():
+            pass
+        assert command('1e9')[0] == '1e9'
+    with pytest.raises(TypeError):
+        command('1e9')
+    set_validation(False)
+    try:
+        assert command('1e9')[0] == '1e9'
+    finally:
+        set_validation(True)
+
+
+def test_device_commands_are_checked(memory_device):
+    with pytest.raises(TypeError):
+        memory_device.set_clk_rate('1e9')
+    with pytest.raises(TypeError):
+        memory_device.create_single_segment(64)
+    assert memory_device.set_clk_rate(np.float64(1e9)) == 'SetClkRate 1 1000000000'
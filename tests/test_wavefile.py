@@ -0,0 +1,77 @@
+# Tests of reading and writing dpg11 wavefiles
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.wavefile import (as_words, iter_formatted_words, write_file_atomic, write_text_atomic,
+                                            write_wavefile)
+
+
+def loop_text(words):
+    # The text the original create_wave_file loop wrote, one line per word and no trailing newline
+    return os.linesep.join(str(int(word)) for word in words).encode()
+
+
+@pytest.mark.parametrize('words', [[0], [65535], [0, 1, 9, 10, 99, 100, 999, 1000, 9999, 10000, 65535],
+                                   np.random.default_rng(0).integers(0, 2 ** 16, 1000)])
+def test_write_wavefile_matches_the_loop(tmp_path, words):
+    path = os.path.join(tmp_path, 'wave_64.txt')
+    num_bytes = write_wavefile(path, words)
+    with open(path, 'rb') as f:
+        text = f.read()
+    assert text == loop_text(words)
+    assert num_bytes == len(text)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1000])
+def test_formatting_in_chunks(chunk_size):
+    words = np.random.default_rng(1).integers(0, 2 ** 16, 100)
+    assert b''.join(iter_formatted_words(words, chunk_size=chunk_size)) == loop_text(words)
+
+
+def test_write_wavefile_leaves_no_temporary_files(tmp_path):
+    write_wavefile(os.path.join(tmp_path, 'wave_64.txt'), np.arange(64))
+    assert os.listdir(tmp_path) == ['wave_64.txt']
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = os.path.join(tmp_path, 'wave_64.txt')
+    write_wavefile(path, np.arange(64))
+
+    def failing_chunks():
+        yield b'1'
+        raise RuntimeError('disk full')
+
+    with pytest.raises(RuntimeError):
+        write_file_atomic(path, failing_chunks())
+    assert os.listdir(tmp_path) == ['wave_64.txt']
+    with open(path, 'rb') as f:
+        assert f.read() == loop_text(np.arange(64))
+
+
+def test_written_files_get_the_permissions_of_open(tmp_path):
+    with open(os.path.join(tmp_path, 'reference.txt'), 'w'):
+        pass
+    write_wavefile(os.path.join(tmp_path, 'wave_64.txt'), np.arange(64))
+    modes = [stat.S_IMODE(os.stat(os.path.join(tmp_path, filename)).st_mode)
+             for filename in ('reference.txt', 'wave_64.txt')]
+    assert modes[1] == modes[0]
+
+
+def test_write_text_atomic_uses_the_platform_line_ending(tmp_path):
+    path = os.path.join(tmp_path, 'multi.txt')
+    write_text_atomic(path, 'a\nb')
+    with open(path, 'rb') as f:
+        assert f.read() == f'a{os.linesep}b'.encode()
+
+
+def test_as_words():
+    words = np.arange(4, dtype=np.uint16)
+    assert as_words(words) is words
+    assert as_words([1, 2]).dtype == np.uint16
+    with pytest.raises(ValueError):
+        as_words([-1])
+    with pytest.raises(ValueError):
+        as_words([2 ** 16])
@@ -0,0 +1,101 @@
+# Tests of comparing wavefiles channel by channel
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.diff import diff_wavefiles, iter_source_words, main
+from dpg11_pylib.waveforms.packing import pack_channels
+from dpg11_pylib.waveforms.wavefile import write_wavefile
+from dpg11_pylib.waveforms.waveforms import wavefile2arrays
+
+NUM_POINTS = 4096
+# Samples and channels to flip in the copy
+FLIPS = [(1234, 1), (2000, 1), (4095, 3), (65, 11)]
+
+
+@pytest.fixture
+def wave_dict():
+    samples = np.arange(NUM_POINTS)
+    return {1: samples % 256 < 128,
+            2: np.ones(NUM_POINTS, dtype=bool),
+            3: np.random.default_rng(0).integers(0, 2, NUM_POINTS),
+            4: samples < 64}
+
+
+@pytest.fixture
+def paths(tmp_path, wave_dict):
+    words = pack_channels(wave_dict)
+    flipped = words.copy()
+    for sample, channel in FLIPS:
+        flipped[sample] ^= 1 << (channel - 1)
+    path_a = str(tmp_path / f'a_{NUM_POINTS}.txt')
+    path_b = str(tmp_path / f'b_{NUM_POINTS}.txt')
+    write_wavefile(path_a, words)
+    write_wavefile(path_b, flipped)
+    return path_a, path_b
+
+
+@pytest.mark.parametrize('chunk_size', [7, 1000, 10 ** 6])
+def test_diff_matches_the_channel_arrays(paths, chunk_size):
+    path_a, path_b = paths
+    diff = diff_wavefiles(path_a, path_b, chunk_size=chunk_size)
+    arrays_a, arrays_b = wavefile2arrays(path_a), wavefile2arrays(path_b)
+    for channel in range(1, 12):
+        mismatches = np.flatnonzero(arrays_a[channel - 1] != arrays_b[channel - 1])
+        assert diff[channel].first_mismatch == (int(mismatches[0]) if len(mismatches) else None)
+        assert diff[channel].num_mismatches == len(mismatches)
+    assert not diff.match
+    assert diff.mismatched_channels() == [1, 3, 11]
+    assert diff.first_mismatch() == 65
+    assert diff.num_mismatched_words == 4
+    assert diff.num_samples == (NUM_POINTS, NUM_POINTS)
+
+
+def test_wavefile_matches_its_wave_dict(paths, wave_dict):
+    diff = diff_wavefiles(paths[0], wave_dict)
+    assert diff.match
+    assert diff.first_mismatch() is None
+    assert diff_wavefiles(pack_channels(wave_dict), wave_dict, chunk_size=100).match
+
+
+def test_only_the_chosen_channels_are_compared(paths):
+    diff = diff_wavefiles(*paths, channels=[2, 3])
+    assert list(diff.channels) == [2, 3]
+    assert diff.mismatched_channels() == [3]
+    # The words still differ on channels that were not compared
+    assert not diff.match
+    with pytest.raises(ValueError):
+        diff_wavefiles(*paths, channels=[17])
+
+
+def test_different_lengths_do_not_match():
+    words = np.arange(128, dtype=np.uint16)
+    diff = diff_wavefiles(words, words[:64], chunk_size=50)
+    assert diff.num_samples == (128, 64)
+    assert diff.num_mismatched_words == 0
+    assert diff.mismatched_channels() == []
+    assert not diff.match
+
+
+def test_iter_source_words(paths, wave_dict):
+    words = pack_channels(wave_dict)
+    for source in [paths[0], wave_dict, words, list(words)]:
+        chunks = list(iter_source_words(source, chunk_size=1000))
+        assert [len(chunk) for chunk in chunks] == [1000, 1000, 1000, 1000, 96]
+        assert np.array_equal(np.concatenate(chunks), words)
+
+
+def test_report_lists_every_channel(paths):
+    lines = str(diff_wavefiles(*paths, channels=[1, 2])).splitlines()
+    assert lines[0] == f'samples: {NUM_POINTS} vs {NUM_POINTS}'
+    assert lines[2].split() == ['1', 'False', '1234', '2']
+    assert lines[3].split() == ['2', 'True', '-', '0']
+
+
+def test_command_line(paths, capsys):
+    path_a, path_b = paths
+    assert main([path_a, path_a]) == 0
+    assert capsys.readouterr().out.endswith('The wavefiles match\n')
+    assert main([path_a, path_b, '-c', '1', '3']) == 1
+    assert capsys.readouterr().out.endswith('The wavefiles differ, first at sample 1234\n')
+    assert main([path_a, path_b, '--quiet', '--chunk-size', '100']) == 1
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,103 @@
+# Tests of reading wavefiles back into words and channel planes
+import os
+import time
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.visualization import plotting
+from dpg11_pylib.waveforms.wavefile import (parse_words, read_wavefile, read_wavefile_words, sidecar_path,
+                                            unpack_channels, write_wavefile)
+from dpg11_pylib.waveforms.waveforms import dec2bin_array, wavefile2arrays
+
+
+def legacy_read(path):
+    # The reader wavefile2arrays used before read_wavefile
+    dec_waveforms = np.loadtxt(path).astype(int)
+    return np.array([dec2bin_array(i) for i in dec_waveforms]).T
+
+
+@pytest.fixture
+def wavefile(tmp_path):
+    path = str(tmp_path / 'test_4096.txt')
+    words = np.random.default_rng(0).integers(0, 2 ** 11, 4096)
+    write_wavefile(path, words)
+    return path, words
+
+
+def test_read_matches_the_original_reader(wavefile):
+    path, words = wavefile
+    planes = read_wavefile(path)
+    assert planes.dtype == np.bool_
+    assert planes.shape == (11, 4096)
+    assert np.array_equal(planes, legacy_read(path).astype(bool))
+    assert np.array_equal(read_wavefile(path, dtype=np.uint8), legacy_read(path))
+    assert np.array_equal(wavefile2arrays(path), legacy_read(path))
+    assert np.array_equal(read_wavefile_words(path), words)
+
+
+def test_wavefile2arrays_keeps_the_high_bits(tmp_path):
+    path = str(tmp_path / 'high_2.txt')
+    write_wavefile(path, [1 << 12, 1])
+    arrays = wavefile2arrays(path)
+    assert arrays.shape == (13, 2)
+    assert arrays[12].tolist() == [1, 0]
+
+
+def test_parse_words():
+    assert parse_words(b'1\r\n2\n65535').tolist() == [1, 2, 65535]
+    assert parse_words(b'').tolist() == []
+    with pytest.raises(ValueError):
+        parse_words(b'1\n2\nthree')
+    with pytest.raises(ValueError):
+        parse_words(b'1\n65536')
+
+
+def test_unpack_channels():
+    planes = unpack_channels([0b101, 0b010], num_channels=3, dtype=np.uint8)
+    assert planes.tolist() == [[1, 0], [0, 1], [1, 0]]
+    with pytest.raises(ValueError):
+        unpack_channels([1], num_channels=17)
+
+
+def test_sidecar_is_written_and_reused(wavefile):
+    path, words = wavefile
+    assert np.array_equal(read_wavefile_words(path, sidecar=True), words)
+    npy_path = sidecar_path(path)
+    assert npy_path == path[:-len('.txt')] + '.npy'
+    assert np.array_equal(np.load(npy_path), words)
+
+    # A sidecar that is not older than the wavefile is loaded instead of the text
+    np.save(npy_path, words[::-1])
+    assert np.array_equal(read_wavefile_words(path, sidecar=True), words[::-1])
+    assert np.array_equal(read_wavefile_words(path), words)
+
+
+def test_stale_sidecar_is_replaced(wavefile):
+    path, words = wavefile
+    read_wavefile_words(path, sidecar=True)
+    write_wavefile(path, words[:64])
+    stale = time.time() - 10
+    os.utime(sidecar_path(path), (stale, stale))
+    assert np.array_equal(read_wavefile_words(path, sidecar=True), words[:64])
+    assert np.array_equal(np.load(sidecar_path(path)), words[:64])
+
+
+def test_corrupt_sidecar_is_replaced(wavefile):
+    path, words = wavefile
+    with open(sidecar_path(path), 'wb') as f:
+        f.write(b'not a npy file')
+    assert np.array_equal(read_wavefile(path, sidecar=True), read_wavefile(path))
+
+
+def test_plot_dpg11_wavefile_labels(wavefile, monkeypatch):
+    path, _ = wavefile
+    plotted = []
+    monkeypatch.setattr(plotting, 'plot_waveforms', lambda waves, labels, **kwargs: plotted.append((waves, labels)))
+    plotting.plot_dpg11_wavefile(path)
+    plotting.plot_dpg11_wavefile(path, plot_channels=[1, 3])
+    (all_waves, all_labels), (waves, labels) = plotted
+    assert all_labels == [f'Ch. {i}' for i in range(11)]
+    assert np.array_equal(all_waves, legacy_read(path))
+    assert labels == ['Ch. 1', 'Ch. 3']
+    assert np.array_equal(waves, legacy_read(path)[[0, 2]])
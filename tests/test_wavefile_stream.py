@@ -0,0 +1,63 @@
+# Tests of streaming wavefiles in fixed size chunks
+import os
+
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.wavefile import iter_wavefile, iter_wavefile_words, read_wavefile, write_wavefile
+
+
+@pytest.fixture
+def wavefile(tmp_path):
+    path = str(tmp_path / 'test_5000.txt')
+    # Every word length, so chunks of the file are cut in the middle of words
+    words = np.random.default_rng(0).integers(0, 2 ** 16, 5000).astype(np.uint16)
+    words[:5] = [0, 9, 99, 999, 65535]
+    write_wavefile(path, words)
+    return path, words
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 4999, 5000, 10 ** 6])
+def test_chunks_add_up_to_the_words(wavefile, chunk_size):
+    path, words = wavefile
+    chunks = list(iter_wavefile_words(path, chunk_size=chunk_size))
+    assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= chunk_size
+    assert np.array_equal(np.concatenate(chunks), words)
+
+
+@pytest.mark.parametrize('newline', [b'\n', b'\r\n'])
+def test_line_endings_and_trailing_newline(tmp_path, newline):
+    path = str(tmp_path / 'test.txt')
+    with open(path, 'wb') as f:
+        f.write(newline.join([b'12345', b'6', b'789']) + newline)
+    assert [chunk.tolist() for chunk in iter_wavefile_words(path, chunk_size=2)] == [[12345, 6], [789]]
+
+
+def test_empty_wavefile(tmp_path):
+    path = str(tmp_path / 'empty.txt')
+    open(path, 'w').close()
+    assert list(iter_wavefile_words(path)) == []
+
+
+def test_chunk_size_must_be_positive(wavefile):
+    with pytest.raises(ValueError):
+        next(iter_wavefile_words(wavefile[0], chunk_size=0))
+
+
+def test_bad_text_is_rejected(tmp_path):
+    path = str(tmp_path / 'bad.txt')
+    with open(path, 'w') as f:
+        f.write(os.linesep.join(['1', '2', 'x']))
+    with pytest.raises(ValueError):
+        list(iter_wavefile_words(path, chunk_size=1))
+
+
+@pytest.mark.parametrize('chunk_size', [64, 1000])
+def test_planes_match_read_wavefile(wavefile, chunk_size):
+    path, _ = wavefile
+    chunks = list(iter_wavefile(path, chunk_size=chunk_size, num_channels=16, dtype=np.uint8))
+    assert all(chunk.shape == (16, chunk_size) for chunk in chunks[:-1])
+    assert np.array_equal(np.concatenate(chunks, axis=1), read_wavefile(path, num_channels=16, dtype=np.uint8))
+    counts = sum(planes.sum(axis=1) for planes in iter_wavefile(path, chunk_size=chunk_size))
+    assert np.array_equal(counts, read_wavefile(path).sum(axis=1))
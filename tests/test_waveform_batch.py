@@ -0,0 +1,82 @@
+# Tests of the batched 2-D waveform builders
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.batch import (lengths_mod_64, off_on_arrays, on_off_arrays, pack_channel_batch,
+                                         pad_waveforms, pulse_arrays)
+from dpg11_pylib.waveforms.packing import pack_channels
+from dpg11_pylib.waveforms.waveforms import length_mod_64, off_on_array, on_off_array, pad_waveform
+
+SIZES = [1, 2, 3, 7, 64]
+
+
+def test_square_waves_match_the_single_builders():
+    assert np.array_equal(on_off_arrays(SIZES, 256), np.stack([on_off_array(size, 256) for size in SIZES]))
+    assert np.array_equal(off_on_arrays(SIZES, 256), np.stack([off_on_array(size, 256) for size in SIZES]))
+    assert on_off_arrays(SIZES).dtype == np.uint8
+    assert off_on_arrays(SIZES, dtype=bool).dtype == bool
+
+
+def test_pulses_match_pad_waveform():
+    widths = [0, 1, 64, 4096]
+    assert np.array_equal(pulse_arrays(widths, 4096), np.stack([pad_waveform(np.ones(width), 4096)
+                                                                for width in widths]))
+
+
+def test_pulse_delays():
+    arr = pulse_arrays([2, 3], 8, delays=[1, 5])
+    assert arr.tolist() == [[0, 1, 1, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 1, 1, 1]]
+    assert np.array_equal(pulse_arrays([2, 3], 8, delays=1), pulse_arrays([2, 3], 8, delays=[1, 1]))
+    with pytest.raises(ValueError):
+        pulse_arrays([4], 8, delays=5)
+    with pytest.raises(ValueError):
+        pulse_arrays([-1], 8)
+
+
+@pytest.mark.parametrize('pad_value', [0, 1])
+@pytest.mark.parametrize('pad_side', ['right', 'left'])
+def test_pad_waveforms(pad_value, pad_side):
+    waveforms = [np.array([1, 0, 1]), np.array([], dtype=int), np.arange(8) % 2]
+    pad_width = {'right': lambda waveform: (0, 8 - len(waveform)), 'left': lambda waveform: (8 - len(waveform), 0)}
+    expected = np.stack([np.pad(waveform, pad_width[pad_side](waveform), constant_values=pad_value)
+                         for waveform in waveforms])
+    assert np.array_equal(pad_waveforms(waveforms, 8, pad_value, pad_side), expected)
+
+
+def test_pad_waveforms_checks_its_arguments():
+    with pytest.raises(ValueError):
+        pad_waveforms([np.ones(9)], 8)
+    with pytest.raises(ValueError):
+        pad_waveforms([np.ones(2)], 8, pad_value=2)
+    with pytest.raises(ValueError):
+        pad_waveforms([np.ones(2)], 8, pad_side='middle')
+    assert pad_waveforms([], 8).shape == (0, 8)
+
+
+def test_lengths_mod_64_matches_length_mod_64():
+    widths = [1e-9, 64e-9, 100e-9, 1e-6]
+    num_samples, durations = lengths_mod_64(widths, int(1e9))
+    expected = [length_mod_64(width, int(1e9)) for width in widths]
+    assert num_samples.tolist() == [samples for samples, _ in expected]
+    assert np.allclose(durations, [duration for _, duration in expected])
+
+
+def test_batched_sweep_matches_the_looped_sweep():
+    widths = np.linspace(0, 2048, 50).astype(int)
+    loop_words = np.stack([pack_channels({1: pad_waveform(np.ones(width), 4096),
+                                          3: off_on_array(size=4, length=4096),
+                                          4: pad_waveform(np.ones(64), 4096)}) for width in widths])
+    batch_words = pack_channel_batch({1: pulse_arrays(widths, 4096),
+                                      3: off_on_arrays([4], 4096)[0],
+                                      4: pulse_arrays([64], 4096)[0]})
+    assert batch_words.dtype == np.uint16
+    assert np.array_equal(batch_words, loop_words)
+
+
+def test_pack_channel_batch_checks_its_arguments():
+    with pytest.raises(ValueError):
+        pack_channel_batch({})
+    with pytest.raises(ValueError):
+        pack_channel_batch({17: np.ones((2, 64))})
+    with pytest.raises(ValueError):
+        pack_channel_batch({1: np.ones((2, 64)), 2: np.ones((3, 64))})
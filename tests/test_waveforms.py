@@ -0,0 +1,121 @@
+# Tests of the waveform primitives, their uint8 default and their out buffers
+import numpy as np
+import pytest
+
+from dpg11_pylib.waveforms.packing import pack_channels
+from dpg11_pylib.waveforms.waveforms import (WAVEFORM_DTYPE, fill_square_wave, join_waveforms, off_array,
+                                             off_on_array, on_array, on_off_array, output_array, pad_waveform,
+                                             repeat_waveform)
+
+
+def square_wave(size, length, first_value):
+    # Reference square wave, one sample at a time
+    return np.array([first_value if (i // size) % 2 == 0 else 1 - first_value for i in range(length)])
+
+
+def test_output_array():
+    arr = output_array(10)
+    assert arr.dtype == WAVEFORM_DTYPE == np.uint8
+    assert len(arr) == 10
+    assert output_array(10, dtype=bool).dtype == bool
+    out = np.zeros(10, dtype=int)
+    assert output_array(10, dtype=bool, out=out) is out
+    for bad in [np.zeros(9), np.zeros((2, 5))]:
+        with pytest.raises(ValueError):
+            output_array(10, out=bad)
+
+
+@pytest.mark.parametrize('size, length', [(1, 64), (3, 64), (4, 70), (64, 64), (100, 64)])
+@pytest.mark.parametrize('first_value', [0, 1])
+def test_fill_square_wave(size, length, first_value):
+    arr = fill_square_wave(np.empty(length, dtype=np.uint8), size, first_value)
+    assert np.array_equal(arr, square_wave(size, length, first_value))
+
+
+def test_fill_square_wave_rejects_empty_steps():
+    with pytest.raises(ValueError):
+        fill_square_wave(np.empty(64), 0, 1)
+
+
+@pytest.mark.parametrize('size', [1, 4, 7])
+def test_step_arrays(size):
+    assert np.array_equal(on_off_array(size, 128), square_wave(size, 128, 1))
+    assert np.array_equal(off_on_array(size, 128), square_wave(size, 128, 0))
+    assert np.array_equal(on_array(128), np.ones(128))
+    assert np.array_equal(off_array(128), np.zeros(128))
+
+
+@pytest.mark.parametrize('func, args', [(on_array, (64,)), (off_array, (64,)), (on_off_array, (2, 64)),
+                                        (off_on_array, (2, 64)), (pad_waveform, (np.ones(10), 64))])
+def test_dtype_and_out(func, args):
+    default = func(*args)
+    assert default.dtype == np.uint8
+    assert func(*args, dtype=int).dtype == int
+    assert func(*args, dtype=bool).dtype == bool
+
+    # Writing into a row of a preallocated program gives the same samples without allocating
+    program = np.full((3, 64), 7, dtype=np.uint8)
+    result = func(*args, out=program[1])
+    assert np.shares_memory(result, program)
+    assert np.array_equal(program[1], default)
+    assert np.all(program[[0, 2]] == 7)
+
+
+def test_pad_waveform():
+    waveform = np.array([1, 0, 1])
+    assert pad_waveform(waveform, 6).tolist() == [1, 0, 1, 0, 0, 0]
+    assert pad_waveform(waveform, 6, pad_value=1).tolist() == [1, 0, 1, 1, 1, 1]
+    assert pad_waveform(waveform, 6, pad_side='left').tolist() == [0, 0, 0, 1, 0, 1]
+    assert pad_waveform([1, 1], 2).tolist() == [1, 1]
+
+
+@pytest.mark.parametrize('kwargs', [{'length': 2}, {'length': 6, 'pad_value': 2}, {'length': 6, 'pad_side': 'up'}])
+def test_pad_waveform_errors(kwargs):
+    with pytest.raises(ValueError):
+        pad_waveform(np.array([1, 0, 1]), **kwargs)
+
+
+def test_join_and_repeat_keep_the_dtype():
+    a = on_array(64)
+    b = off_on_array(2, 128)
+    joined = join_waveforms([a, b])
+    assert joined.dtype == np.uint8
+    assert np.array_equal(joined, np.concatenate([np.ones(64), square_wave(2, 128, 0)]))
+    repeated = repeat_waveform(b, 3)
+    assert repeated.dtype == np.uint8
+    assert np.array_equal(repeated, np.tile(b, 3))
+
+
+def test_join_and_repeat_into_out():
+    a = on_array(64)
+    b = off_on_array(2, 128)
+    out = np.zeros(192, dtype=bool)
+    assert join_waveforms([a, b], out=out) is out
+    assert np.array_equal(out, np.concatenate([a, b]))
+
+    # A strided column of a program, one sample per row
+    program = np.zeros((384, 2), dtype=np.uint8)
+    repeat_waveform(b, 3, out=program[:, 1])
+    assert np.array_equal(program[:, 1], np.tile(b, 3))
+    assert not program[:, 0].any()
+    with pytest.raises(ValueError):
+        repeat_waveform(b, 3, out=np.zeros(100))
+
+
+def test_compact_program_packs_like_the_int64_program(memory_device):
+    # The uint8 waveforms written into one buffer give the same words as int64 waveforms stacked into 16 columns
+    num_points = 4096
+    program = np.empty((6, num_points), dtype=np.uint8)
+    stack_arr = np.zeros((num_points, 16), dtype=int)
+    for row, (func, args) in enumerate([(on_array, (num_points,)),
+                                        (off_on_array, (4, num_points)),
+                                        (on_off_array, (64, num_points)),
+                                        (on_off_array, (1000, num_points)),
+                                        (off_array, (num_points,))]):
+        func(*args, out=program[row])
+        stack_arr[:, 15 - row] = func(*args, dtype=int)
+    pad_waveform(on_array(64), num_points, pad_side='left', out=program[5])
+    stack_arr[:, 10] = pad_waveform(on_array(64, dtype=int), num_points, pad_side='left', dtype=int)
+
+    words = pack_channels({channel: program[channel - 1] for channel in range(1, 7)})
+    assert np.array_equal(words, memory_device.create_decimal_array(stack_arr))